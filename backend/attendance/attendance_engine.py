@@ -1,26 +1,31 @@
 import os
-import cv2
-import time
 import pandas as pd
 from datetime import datetime
 import threading
 
 # Import dependencies from sibling microservices
 # Note: These assume the backend package structure is maintained
-from ..inference.face_detect import detect_faces_yolo
-from ..inference.embeddings import get_face_embedding
 from ..recognition.faculty_manager import search_faculty, search_faculty_specific
-from ..recognition.faiss_store import load_faculty_database
+from ..recognition.faiss_store import get_faculty_gallery
+from .pipeline import StreamingAttendancePipeline
+from .camera_manager import camera_manager, DEFAULT_CAMERA
+from .motion_gate import MotionGate
+from .tracker import FaceTracker
+from ..config.config_store import get_setting
 
 # Path relative to the backend directory (attendance/../)
 _BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 LOG_FILE = os.path.join(_BACKEND_DIR, "attendance_log.csv")
+LOG_COLUMNS = ["timestamp", "status", "name", "confidence", "period", "mode", "room"]
+
+# Rooms check concurrently; serialize the read-append-write of the CSV
+_log_lock = threading.Lock()
 
 # Initialize log file if it doesn't exist
 if not os.path.exists(LOG_FILE):
-    pd.DataFrame(columns=["timestamp", "status", "name", "confidence", "period", "mode"]).to_csv(LOG_FILE, index=False)
+    pd.DataFrame(columns=LOG_COLUMNS).to_csv(LOG_FILE, index=False)
 
-def log_attendance(status, name, confidence, period_info, mode):
+def log_attendance(status, name, confidence, period_info, mode, room=DEFAULT_CAMERA):
     """Logs an attendance entry to the CSV file."""
     ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
@@ -33,140 +38,94 @@ def log_attendance(status, name, confidence, period_info, mode):
             period_str = str(period_info)
     
     try:
-        # Read, append, and save to avoid file corruption
-        try:
-            df = pd.read_csv(LOG_FILE)
-        except pd.errors.EmptyDataError:
-            df = pd.DataFrame(columns=["timestamp", "status", "name", "confidence", "period", "mode"])
+        with _log_lock:
+            # Read, append, and save to avoid file corruption
+            try:
+                df = pd.read_csv(LOG_FILE)
+            except pd.errors.EmptyDataError:
+                df = pd.DataFrame(columns=LOG_COLUMNS)
 
-        row = {
-            "timestamp": ts, 
-            "status": status, 
-            "name": name, 
-            "confidence": f"{confidence:.4f}",
-            "period": period_str,
-            "mode": mode
-        }
+            row = {
+                "timestamp": ts, 
+                "status": status, 
+                "name": name, 
+                "confidence": f"{confidence:.4f}",
+                "period": period_str,
+                "mode": mode,
+                "room": room
+            }
         
-        # Use concat instead of loc for robustness
-        new_row_df = pd.DataFrame([row])
-        df = pd.concat([df, new_row_df], ignore_index=True)
+            # Use concat instead of loc for robustness
+            new_row_df = pd.DataFrame([row])
+            df = pd.concat([df, new_row_df], ignore_index=True)
         
-        df.to_csv(LOG_FILE, index=False)
+            df.to_csv(LOG_FILE, index=False)
     except Exception as e:
         print(f"Failed to save to log: {e}")
         pass
 
-def perform_attendance_check(yolo_model, insightface_app, config=None, target_faculty=None, period_info=None, mode="manual"):
+def perform_attendance_check(yolo_model, insightface_app, config=None, target_faculty=None, period_info=None, mode="manual",
+                             camera_name=DEFAULT_CAMERA, detect_func=None, embed_func=None):
     """
-    Performs a non-UI attendance check.
+    Performs a non-UI attendance check on one camera (the room's camera for room checks).
     Returns (matched, matched_name, matched_conf)
     """
     if config is None:
         config = {'detection_time': 5, 'threshold': 0.6} # Default config
 
-    # Load latest database state
-    faculty_data, faculty_index = load_faculty_database()
+    # Latest database state (served from the in-memory gallery cache)
+    gallery = get_faculty_gallery()
     
-    cap = cv2.VideoCapture(0, cv2.CAP_DSHOW) if os.name == "nt" else cv2.VideoCapture(0)
-    if not cap.isOpened(): cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        log_attendance("Error", target_faculty or "Unknown", 0.0, period_info, mode)
-        return False, "Camera Error", 0.0
-
-    start_t = time.time()
     detection_time = config.get('detection_time', 30)
     threshold = config.get('threshold', 0.6)
-    
-    try:
-        while time.time() - start_t < detection_time:
-            ok, frame = cap.read()
-            if not ok: break
-            
-            faces = detect_faces_yolo(yolo_model, frame)
-            
-            for face in faces:
-                embedding = get_face_embedding(insightface_app, frame, face['bbox'])
-                if embedding is None: continue
-                
-                is_match = False
-                name = None
-                conf = 0.0
 
-                if target_faculty:
-                    is_match, name, conf = search_faculty_specific(
-                        faculty_index, faculty_data['names'], 
-                        embedding, target_faculty, threshold=threshold
-                    )
-                else:
-                    is_match, name, conf = search_faculty(
-                        faculty_index, faculty_data['names'], 
-                        embedding, threshold=threshold
-                    )
-                
-                if is_match:
-                    cap.release()
-                    log_attendance("Present", name, conf, period_info, mode)
-                    return True, name, conf
-            
-            time.sleep(0.1) # Brief pause
-            
-    finally:
-        if cap.isOpened():
-            cap.release()
-    
-    # If loop finishes without match
-    log_attendance("Absent", target_faculty or "Unknown", 0.0, period_info, mode)
-    return False, None, 0.0
+    aggregation = get_setting("match_aggregation")
 
-# --- Auto Attendance Loop Logic ---
-_stop_event = threading.Event()
-_auto_thread = None
+    def match(embedding):
+        if target_faculty:
+            return search_faculty_specific(gallery, embedding, target_faculty, threshold=threshold, aggregation=aggregation)
+        return search_faculty(gallery, embedding, threshold=threshold, aggregation=aggregation)
 
-def start_auto_attendance_loop(yolo_model, insightface_app, get_current_period_func):
-    """Starts the background thread for automated attendance"""
-    global _auto_thread, _stop_event
-    
-    if _auto_thread and _auto_thread.is_alive():
-        return False, "Already running"
+    tracker = FaceTracker(max_embeds=get_setting("max_embeds_per_track"))
 
-    _stop_event.clear()
-    
-    def _loop():
-        print("Auto-Attendance Started")
-        while not _stop_event.is_set():
-            # 1. Get current period
-            period = get_current_period_func()
-            
-            if period:
-                print(f"Checking attendance for: {period}")
-                # 2. Perform check
-                perform_attendance_check(
-                    yolo_model, 
-                    insightface_app, 
-                    config={'detection_time': 10, 'threshold': 0.6},
-                    target_faculty=period.get('faculty'),
-                    period_info=period,
-                    mode="auto"
-                )
-                # 3. Wait before next check (e.g., 5 minutes or until next period)
-                # For demo purposes, we wait 60 seconds to avoid spamming logs
-                for _ in range(60): 
-                    if _stop_event.is_set(): break
-                    time.sleep(1)
-            else:
-                # No active period, check again in 30 seconds
-                for _ in range(30):
-                    if _stop_event.is_set(): break
-                    time.sleep(1)
-        print("Auto-Attendance Stopped")
+    # Only unattended (auto/room) checks are gated; a manual check is short and every frame counts
+    motion_gate = None
+    if mode != "manual" and get_setting("motion_gate_enabled"):
+        # A closed gate must neither outlast a good part of the check nor let tracks expire
+        refresh_interval = min(
+            float(get_setting("motion_refresh_interval")),
+            tracker.max_age / 2.0,
+            detection_time / 4.0
+        )
+        motion_gate = MotionGate(
+            sensitivity=get_setting("motion_sensitivity"),
+            refresh_interval=refresh_interval
+        )
 
-    _auto_thread = threading.Thread(target=_loop, daemon=True)
-    _auto_thread.start()
-    return True, "Started"
+    # Shared, already-open camera; concurrent checks read the same frames
+    with camera_manager.session(camera_name) as camera:
+        if camera is None:
+            log_attendance("Error", target_faculty or "Unknown", 0.0, period_info, mode, camera_name)
+            return False, "Camera Error", 0.0
+
+        # Capture, detection and recognition run as decoupled stages
+        pipeline = StreamingAttendancePipeline(
+            camera, yolo_model, insightface_app, match,
+            detect_func=detect_func, embed_func=embed_func, motion_gate=motion_gate, tracker=tracker,
+            min_quality=get_setting("min_face_quality")
+        )
+        try:
+            result = pipeline.run(detection_time)
+        except Exception:
+            # A failed check is an error, not an absence
+            log_attendance("Error", target_faculty or "Unknown", 0.0, period_info, mode, camera_name)
+            raise
 
-def stop_auto_attendance_loop():
-    """Stops the background thread"""
-    global _stop_event
-    _stop_event.set()
-    return True, "Stopping..."
\ No newline at end of file
+    if result is not None:
+        name, conf = result
+        log_attendance("Present", name, conf, period_info, mode, camera_name)
+        return True, name, conf
+    
+    # If loop finishes without match
+    log_attendance("Absent", target_faculty or "Unknown", 0.0, period_info, mode, camera_name)
+    return False, None, 0.0
@@ -0,0 +1,188 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+import cv2
+
+from .pipeline import LatestFrameGrabber
+from ..config.config_store import load_config, DEFAULT_CONFIG
+
+DEFAULT_CAMERA = "default"
+
+def open_capture(source):
+    """Opens a device index (int / digit string) or an RTSP/HTTP/file URL."""
+    if isinstance(source, int) or str(source).isdigit():
+        index = int(source)
+        cap = cv2.VideoCapture(index, cv2.CAP_DSHOW) if os.name == "nt" else cv2.VideoCapture(index)
+        if not cap.isOpened(): cap = cv2.VideoCapture(index)
+    else:
+        cap = cv2.VideoCapture(source)
+    return cap
+
+# --- SHARED CAMERA SESSION ---
+class CameraSession:
+    """
+    A capture source that stays open across checks. One grabber thread keeps
+    the newest frame; any number of consumers read it concurrently.
+    """
+
+    def __init__(self, name, source):
+        self.name = name
+        self.source = source
+        self._cap = None
+        self._grabber = None
+        self._users = 0
+        self.last_used = time.time()
+        self.opened_at = None
+        self._open_lock = threading.Lock()
+        # Set when the session is replaced/closed while in use; the last user closes it
+        self.close_when_released = False
+
+    @property
+    def running(self):
+        return self._grabber is not None and self._grabber.running
+
+    @property
+    def users(self):
+        return self._users
+
+    def open(self):
+        """Opens the device if needed; returns False if it cannot be opened."""
+        with self._open_lock:
+            if self.running:
+                return True
+            self.close()
+            cap = open_capture(self.source)
+            if not cap.isOpened():
+                return False
+            self._cap = cap
+            self._grabber = LatestFrameGrabber(cap).start()
+            self.opened_at = time.time()
+            return True
+
+    def close(self):
+        if self._grabber is not None:
+            self._grabber.stop()
+            self._grabber = None
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+        self.opened_at = None
+
+    def read(self, after_seq=0, timeout=1.0):
+        """Same contract as LatestFrameGrabber.read: (seq, frame) or (after_seq, None)."""
+        self.last_used = time.time()
+        grabber = self._grabber
+        if grabber is None:
+            return after_seq, None
+        return grabber.read(after_seq, timeout)
+
+    def status(self):
+        return {
+            "name": self.name,
+            "source": self.source,
+            "open": self.running,
+            "users": self._users,
+            "idle_seconds": round(time.time() - self.last_used, 1)
+        }
+
+# --- CAMERA MANAGER ---
+class CameraManager:
+    """
+    Keeps named capture sources open and shares them between consumers
+    (auto loop, manual checks, preview). Devices with no users are closed
+    after idle_timeout seconds.
+    """
+
+    def __init__(self, idle_timeout=60.0):
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._reaper = threading.Thread(target=self._reap_loop, daemon=True, name="camera-reaper")
+        self._reaper.start()
+
+    def register(self, name, source):
+        """
+        Defines (or redefines) a named source. A replaced session is closed
+        now if idle, otherwise as soon as its last user releases it.
+        """
+        with self._lock:
+            session = self._sessions.get(name)
+            if session is not None and session.source == source:
+                return
+            if session is not None:
+                self._close_or_defer(session)
+            self._sessions[name] = CameraSession(name, source)
+
+    def _close_or_defer(self, session):
+        """Closes an idle session, or marks a busy one to close on its last release (call with _lock held)."""
+        if session.users == 0:
+            session.close()
+        else:
+            session.close_when_released = True
+
+    def acquire(self, name):
+        """Returns an open CameraSession (counting one more user), or None if the device cannot be opened."""
+        with self._lock:
+            session = self._sessions.get(name)
+            if session is None:
+                return None
+            # Counted before opening so the reaper leaves it alone
+            session._users += 1
+            session.last_used = time.time()
+
+        # Opening a device can take seconds; don't hold the manager lock for it
+        if not session.open():
+            self.release(session)
+            return None
+        return session
+
+    def release(self, session):
+        with self._lock:
+            session._users = max(0, session._users - 1)
+            session.last_used = time.time()
+            if session.users == 0 and session.close_when_released:
+                session.close_when_released = False
+                session.close()
+
+    @contextmanager
+    def session(self, name):
+        """with manager.session("default") as camera: ... (camera is None if unavailable)"""
+        session = self.acquire(name)
+        try:
+            yield session
+        finally:
+            if session is not None:
+                self.release(session)
+
+    def close(self, name):
+        """
+        Unregisters a named source and closes its device; if a check is using
+        it, closing waits for its last user. Acquiring the name afterwards
+        returns None until it is registered again.
+        """
+        with self._lock:
+            session = self._sessions.pop(name, None)
+            if session is not None:
+                self._close_or_defer(session)
+
+    def status(self):
+        with self._lock:
+            return [session.status() for session in self._sessions.values()]
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(max(1.0, min(self.idle_timeout / 4, 10.0)))
+            now = time.time()
+            with self._lock:
+                for session in self._sessions.values():
+                    if session.users == 0 and session.running and now - session.last_used > self.idle_timeout:
+                        print(f"Closing idle camera '{session.name}'")
+                        session.close()
+
+# Process-wide manager with the local webcam registered as the default source
+camera_manager = CameraManager(
+    idle_timeout=load_config().get("camera_idle_timeout", DEFAULT_CONFIG["camera_idle_timeout"])
+)
+camera_manager.register(DEFAULT_CAMERA, 0)
@@ -0,0 +1,49 @@
+import time
+
+import cv2
+import numpy as np
+
+# --- MOTION / SCENE-CHANGE GATE ---
+class MotionGate:
+    """
+    Cheap pre-filter run before face detection. Compares a small, blurred
+    grayscale copy of each frame with the last frame that was processed and
+    only lets frames through when enough pixels changed, or when
+    refresh_interval seconds passed since the last processed frame.
+    """
+
+    def __init__(self, sensitivity=0.01, refresh_interval=5.0, width=160, pixel_threshold=25):
+        self.sensitivity = sensitivity          # fraction of changed pixels that counts as motion
+        self.refresh_interval = refresh_interval
+        self.width = width
+        self.pixel_threshold = pixel_threshold  # per-pixel gray-level difference that counts as changed
+        self._reference = None
+        self._last_processed = 0.0
+        self.frames_passed = 0
+        self.frames_skipped = 0
+
+    def _thumbnail(self, frame):
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, int(h * self.width / w))), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        # Blur so sensor noise and compression artifacts don't count as motion
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def should_process(self, frame):
+        """True if the frame differs enough from the last processed one (or a refresh is due)."""
+        thumb = self._thumbnail(frame)
+        now = time.time()
+
+        changed = True
+        if self._reference is not None and self._reference.shape == thumb.shape \
+                and now - self._last_processed < self.refresh_interval:
+            diff = cv2.absdiff(thumb, self._reference)
+            changed = np.count_nonzero(diff > self.pixel_threshold) >= self.sensitivity * diff.size
+
+        if changed:
+            self._reference = thumb
+            self._last_processed = now
+            self.frames_passed += 1
+        else:
+            self.frames_skipped += 1
+        return changed
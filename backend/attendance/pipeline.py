@@ -0,0 +1,192 @@
+import time
+import queue
+import threading
+
+import cv2
+
+from ..inference.face_detect import detect_faces_yolo
+from ..inference.embeddings import get_face_embeddings_batch, trusts_face_boxes
+from ..inference.face_quality import annotate_quality
+from .tracker import FaceTracker, face_score
+
+# --- PIPELINE HELPERS ---
+def put_latest(q, item):
+    """Puts into a bounded queue, dropping the oldest entries instead of blocking."""
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+
+# --- CAPTURE STAGE ---
+class LatestFrameGrabber:
+    """
+    Reads a VideoCapture continuously on its own thread and keeps only the
+    newest frame, so driver buffers never hand out stale frames and capture
+    never waits on inference.
+    """
+
+    def __init__(self, cap):
+        self._cap = cap
+        # Ask the driver not to queue frames (ignored by some backends)
+        self._cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._running = False
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="frame-grabber")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def _loop(self):
+        while self._running:
+            ok, frame = self._cap.read()
+            if not ok:
+                break
+            with self._cond:
+                self._frame = frame
+                self._seq += 1
+                self._cond.notify_all()
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+    def read(self, after_seq=0, timeout=1.0):
+        """Waits for a frame newer than after_seq; returns (seq, frame) or (after_seq, None)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > after_seq or not self._running, timeout=timeout)
+            if self._seq > after_seq:
+                return self._seq, self._frame
+            return after_seq, None
+
+# --- DETECT + RECOGNIZE STAGES ---
+class StreamingAttendancePipeline:
+    """
+    capture (frame source) -> detection thread -> recognition (caller thread),
+    connected by a bounded drop-oldest queue. Detection always works on the
+    newest frame and recognition always on the newest detections; nothing
+    sleeps between frames.
+    """
+
+    def __init__(self, frame_source, yolo_model, insightface_app, match_func, queue_size=2, detect_func=None,
+                 motion_gate=None, tracker=None, min_quality=0.0, embed_func=None):
+        self._source = frame_source
+        self._yolo_model = yolo_model
+        # Lets several rooms share one detector (e.g. the micro-batcher) instead of calling YOLO directly
+        self._detect = detect_func or (lambda frame: detect_faces_yolo(self._yolo_model, frame))
+        # Same for recognition (e.g. the inference pool); (frame, bboxes, landmarks) -> embeddings,
+        # or None when the embedder is unavailable and the faces should be retried on a later frame
+        self._embed = embed_func or (
+            lambda frame, bboxes, landmarks: get_face_embeddings_batch(
+                self._insightface_app, frame, bboxes, landmarks=landmarks
+            )
+        )
+        # Optional MotionGate: unchanged frames skip detection entirely
+        self._motion_gate = motion_gate
+        # Tracks faces across frames so each person is embedded once, not once per frame
+        self._tracker = tracker or FaceTracker()
+        # Crops scoring below this (blurry, tiny, dark, turned away) are never embedded
+        self._min_quality = min_quality
+        self._insightface_app = insightface_app
+        self._match = match_func
+        self._detections = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self.frames_detected = 0
+        self.frames_recognized = 0
+        self.faces_embedded = 0
+        # Exception that stopped the detection thread, re-raised by run()
+        self._error = None
+
+    def _detect_loop(self):
+        seq = 0
+        try:
+            while not self._stop.is_set():
+                seq, frame = self._source.read(seq, timeout=0.5)
+                if frame is None:
+                    if not self._source.running:
+                        break  # capture ended
+                    continue
+                if self._motion_gate is not None and not self._motion_gate.should_process(frame):
+                    continue
+                faces = self._detect(frame)
+                self.frames_detected += 1
+                if faces:
+                    annotate_quality(frame, faces, trusts_face_boxes(self._insightface_app))
+                    put_latest(self._detections, (frame, faces))
+        except Exception as e:
+            self._error = e
+        finally:
+            # Wake the recognition stage so it notices the end of the stream
+            put_latest(self._detections, None)
+
+    def run(self, timeout):
+        """
+        Runs until a face matches or timeout seconds pass.
+        Returns (name, confidence) of the first match, or None.
+        Re-raises an error of the detection stage instead of reporting no match.
+        """
+        detector = threading.Thread(target=self._detect_loop, daemon=True, name="attendance-detect")
+        detector.start()
+        deadline = time.time() + timeout
+        try:
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                try:
+                    item = self._detections.get(timeout=remaining)
+                except queue.Empty:
+                    return None
+                if item is None:
+                    if self._error is not None:
+                        raise self._error
+                    return None
+
+                frame, faces = item
+                pending = [
+                    (track, face) for track, face, needs in self._tracker.update(faces)
+                    if needs and face['quality'] >= self._min_quality
+                ]
+                self.frames_recognized += 1
+                if not pending:
+                    continue
+
+                # One recognition forward pass for every new/improved track in the frame
+                face_embeddings = self._embed(
+                    frame, [face['bbox'] for _, face in pending],
+                    [face.get('landmarks') for _, face in pending]
+                )
+                if face_embeddings is None:
+                    continue
+
+                for (track, face), embedding in zip(pending, face_embeddings):
+                    if embedding is None:
+                        # Count the failed attempt so a face the embedder rejects (or a
+                        # non-face box) is throttled like any other, not retried every frame
+                        track.record(face_score(face), False, None, 0.0)
+                        continue
+                    self.faces_embedded += 1
+                    is_match, name, conf = self._match(embedding)
+                    track.record(face_score(face), is_match, name, conf)
+                    if is_match:
+                        return name, conf
+        finally:
+            self._stop.set()
+            detector.join(timeout=2)
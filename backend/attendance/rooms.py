@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from fastapi import HTTPException
+
+from . import scheduler
+from .attendance_engine import perform_attendance_check
+from .camera_manager import camera_manager, DEFAULT_CAMERA
+from ..inference.router import MODELS
+from ..inference.face_detect import detect_faces_yolo
+from ..inference.embeddings import get_face_embeddings_batch
+from ..inference.worker_pool import run_inference_blocking, PoolSaturatedError
+from ..inference import batcher
+from ..config.config_store import load_config, DEFAULT_CONFIG
+
+# Path relative to the backend directory (attendance/../)
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOMS_FILE = os.path.join(_BACKEND_DIR, "rooms.json")
+
+# The legacy single-camera setup: webcam 0 driven by schedule.json
+DEFAULT_ROOM = {"room_id": DEFAULT_CAMERA, "source": 0, "schedule": None}
+
+# Same cadence as the original auto loop
+CHECK_CONFIG = {'detection_time': 10, 'threshold': 0.6}
+RECHECK_INTERVAL = 60   # seconds after a check before the room is checked again
+IDLE_POLL_INTERVAL = 30 # seconds between schedule polls when no period is active
+SHARED_INFERENCE_TIMEOUT = 10  # seconds a check waits for shared detection/recognition before dropping the frame
+
+# --- ROOM REGISTRY ---
+def load_rooms():
+    """Returns {room_id: room}; the default room is always present."""
+    rooms = {DEFAULT_ROOM["room_id"]: dict(DEFAULT_ROOM)}
+    if os.path.exists(ROOMS_FILE):
+        try:
+            with open(ROOMS_FILE, 'r') as f:
+                for room in json.load(f):
+                    rooms[room["room_id"]] = room
+        except (IOError, OSError, json.JSONDecodeError, KeyError) as e:
+            print(f"Warning: Could not load rooms file: {e}")
+    return rooms
+
+def save_rooms(rooms):
+    with open(ROOMS_FILE, 'w') as f:
+        json.dump(list(rooms.values()), f, indent=4)
+    return True
+
+def room_schedule(room):
+    """A room's own schedule, or schedule.json when it has none."""
+    return room.get("schedule") if room.get("schedule") is not None else scheduler.load_schedule()
+
+def register_cameras():
+    for room in load_rooms().values():
+        camera_manager.register(room["room_id"], room["source"])
+
+# --- SHARED INFERENCE ---
+def _pooled(fn, *args, **kwargs):
+    """Runs fn in the inference pool; None if the pool is saturated or too slow"""
+    try:
+        return run_inference_blocking(fn, *args, timeout=SHARED_INFERENCE_TIMEOUT, **kwargs)
+    except PoolSaturatedError:
+        return None
+    except FutureTimeoutError:
+        print(f"Warning: Inference timed out after {SHARED_INFERENCE_TIMEOUT}s; dropping frame")
+        return None
+
+def shared_detect(frame):
+    """
+    Detection for attendance checks. With micro-batching enabled all checks feed
+    the same batcher, so concurrent rooms share YOLO runs; otherwise detection
+    runs in the inference pool, which bounds it together with the API requests.
+    """
+    if batcher.batching_enabled():
+        try:
+            future = batcher.get_detection_batcher(lambda: MODELS["yolo"]).submit(frame)
+        except HTTPException:
+            return []  # detector saturated: drop this frame
+        try:
+            return future.result(timeout=SHARED_INFERENCE_TIMEOUT)
+        except FutureTimeoutError:
+            future.cancel()
+            print(f"Warning: Batched detection timed out after {SHARED_INFERENCE_TIMEOUT}s; dropping frame")
+            return []
+    return _pooled(detect_faces_yolo, MODELS["yolo"], frame) or []
+
+def shared_embed(frame, bboxes, landmarks):
+    """
+    Recognition for attendance checks, run in the inference pool. None when the
+    pool is saturated, so the pipeline retries the faces on a later frame.
+    """
+    return _pooled(get_face_embeddings_batch, MODELS["insightface"], frame, bboxes, landmarks=landmarks)
+
+# --- MULTI-ROOM SCHEDULER ---
+class RoomState:
+    def __init__(self, room_id):
+        self.room_id = room_id
+        self.running = False
+        self.busy = False
+        self.next_check_at = 0.0
+        self.current_period = None
+        self.last_result = None
+        self.last_check_at = None
+
+    def status(self):
+        return {
+            "room_id": self.room_id,
+            "running": self.running,
+            "checking": self.busy,
+            "current_period": self.current_period,
+            "last_result": self.last_result,
+            "last_check_at": self.last_check_at,
+            "next_check_in": max(0.0, round(self.next_check_at - time.time(), 1)) if self.running else None
+        }
+
+class RoomScheduler:
+    """
+    One driver thread for all rooms. Due checks run on a small shared pool and
+    their detection and recognition on the inference pool (or the detection
+    batcher), so the number of rooms does not dictate the number of inference threads.
+    """
+
+    def __init__(self, max_concurrent_checks):
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_checks, thread_name_prefix="room-check")
+        self._states = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def _state(self, room_id):
+        if room_id not in self._states:
+            self._states[room_id] = RoomState(room_id)
+        return self._states[room_id]
+
+    def start_room(self, room_id):
+        rooms = load_rooms()
+        if room_id not in rooms:
+            return False, f"Room '{room_id}' not found"
+        with self._lock:
+            state = self._state(room_id)
+            if state.running:
+                return False, "Already running"
+            camera_manager.register(room_id, rooms[room_id]["source"])
+            state.running = True
+            state.next_check_at = 0.0
+            self._ensure_thread()
+        self._wakeup.set()
+        return True, "Started"
+
+    def stop_room(self, room_id):
+        with self._lock:
+            state = self._states.get(room_id)
+            if state is None or not state.running:
+                return False, "Not running"
+            state.running = False
+        return True, "Stopping..."
+
+    def remove_room(self, room_id):
+        """Stops a room and forgets its state (a running check still finishes)"""
+        with self._lock:
+            state = self._states.pop(room_id, None)
+            if state is not None:
+                state.running = False
+
+    def status(self, room_id=None):
+        """Status of one room (idle if it was never started) or of every started room"""
+        with self._lock:
+            if room_id is not None:
+                state = self._states.get(room_id)
+                return (state or RoomState(room_id)).status()
+            return [state.status() for state in self._states.values()]
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, daemon=True, name="room-scheduler")
+            self._thread.start()
+
+    def _loop(self):
+        print("Room scheduler started")
+        while True:
+            self._tick()
+            self._wakeup.wait(timeout=1.0)
+            self._wakeup.clear()
+
+    def _tick(self):
+        now = time.time()
+        rooms = None
+        with self._lock:
+            for state in self._states.values():
+                if not state.running or state.busy or now < state.next_check_at:
+                    continue
+                rooms = rooms or load_rooms()
+                room = rooms.get(state.room_id)
+                if room is None:
+                    state.running = False
+                    continue
+
+                period = scheduler.get_current_period(room_schedule(room))
+                state.current_period = period
+                if period:
+                    state.busy = True
+                    self._executor.submit(self._run_check, state, period)
+                else:
+                    state.next_check_at = now + IDLE_POLL_INTERVAL
+
+    def _run_check(self, state, period):
+        try:
+            print(f"[{state.room_id}] Checking attendance for: {period}")
+            matched, name, confidence = perform_attendance_check(
+                MODELS["yolo"],
+                MODELS["insightface"],
+                config=CHECK_CONFIG,
+                target_faculty=period.get('faculty'),
+                period_info=period,
+                mode="auto",
+                camera_name=state.room_id,
+                detect_func=shared_detect,
+                embed_func=shared_embed
+            )
+            state.last_result = {"matched": matched, "name": name, "confidence": confidence}
+        except Exception as e:
+            print(f"[{state.room_id}] Attendance check failed: {e}")
+            state.last_result = {"matched": False, "name": None, "confidence": 0.0, "error": str(e)}
+        finally:
+            with self._lock:
+                state.last_check_at = time.strftime("%Y-%m-%d %H:%M:%S")
+                state.next_check_at = time.time() + RECHECK_INTERVAL
+                state.busy = False
+
+room_scheduler = RoomScheduler(
+    max_concurrent_checks=int(load_config().get("room_check_workers", DEFAULT_CONFIG["room_check_workers"]))
+)
+register_cameras()
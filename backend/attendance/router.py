@@ -1,11 +1,15 @@
 import os
+import asyncio
 import pandas as pd
-from typing import Optional, List
-from fastapi import APIRouter, HTTPException, Body
+from typing import Optional, List, Union
+import cv2
+from fastapi import APIRouter, HTTPException, Body, Response
 from pydantic import BaseModel
 
 from . import attendance_engine
 from . import scheduler
+from . import rooms
+from .camera_manager import camera_manager
 
 # Import global models from inference service to pass to engine
 from ..inference.router import MODELS, ensure_models_loaded
@@ -15,6 +19,12 @@ router = APIRouter()
 # --- Pydantic Models ---
 class ManualCheckPayload(BaseModel):
     target_faculty: Optional[str] = None
+    room_id: str = rooms.DEFAULT_ROOM["room_id"]
+
+class RoomPayload(BaseModel):
+    room_id: str
+    source: Union[int, str]  # device index or RTSP/HTTP/file URL
+    schedule: Optional[List[dict]] = None  # None = use schedule.json
 
 class ScheduleUpdatePayload(BaseModel):
     schedule: List[dict]
@@ -23,17 +33,33 @@ class ScheduleUpdatePayload(BaseModel):
 
 @router.post("/attendance/manual")
 async def manual_attendance_check(payload: ManualCheckPayload):
-    """Trigger a single immediate attendance check."""
-    ensure_models_loaded()
+    """Trigger a single immediate attendance check (default room unless room_id is given)."""
+    room = rooms.load_rooms().get(payload.room_id)
+    if room is None:
+        raise HTTPException(status_code=404, detail=f"Room '{payload.room_id}' not found")
+
+    # May trigger a lazy model load, so keep it off the event loop
+    await asyncio.to_thread(ensure_models_loaded)
     
-    matched, name, confidence = attendance_engine.perform_attendance_check(
-        yolo_model=MODELS["yolo"],
-        insightface_app=MODELS["insightface"],
-        config={'detection_time': 5}, # Fast check for manual trigger
-        target_faculty=payload.target_faculty,
-        period_info=scheduler.get_current_period(),
-        mode="manual"
-    )
+    # The capture loop runs for seconds, so it gets its own thread; only its
+    # detection and recognition calls take inference pool slots
+    try:
+        matched, name, confidence = await asyncio.to_thread(
+            attendance_engine.perform_attendance_check,
+            yolo_model=MODELS["yolo"],
+            insightface_app=MODELS["insightface"],
+            config={'detection_time': 5}, # Fast check for manual trigger
+            target_faculty=payload.target_faculty,
+            period_info=scheduler.get_current_period(rooms.room_schedule(room)),
+            mode="manual",
+            camera_name=payload.room_id,
+            detect_func=rooms.shared_detect,
+            embed_func=rooms.shared_embed
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Attendance check failed: {e}")
     
     return {
         "matched": matched,
@@ -44,13 +70,10 @@ async def manual_attendance_check(payload: ManualCheckPayload):
 @router.post("/attendance/auto/start")
 async def start_auto_attendance():
     """Start the background automated attendance loop."""
-    ensure_models_loaded()
+    await asyncio.to_thread(ensure_models_loaded)
     
-    success, message = attendance_engine.start_auto_attendance_loop(
-        yolo_model=MODELS["yolo"],
-        insightface_app=MODELS["insightface"],
-        get_current_period_func=scheduler.get_current_period
-    )
+    # The single-camera auto mode is the default room of the multi-room scheduler
+    success, message = rooms.room_scheduler.start_room(rooms.DEFAULT_ROOM["room_id"])
     
     if not success:
         raise HTTPException(status_code=400, detail=message)
@@ -60,7 +83,7 @@ async def start_auto_attendance():
 @router.post("/attendance/auto/stop")
 async def stop_auto_attendance():
     """Stop the background automated attendance loop."""
-    success, message = attendance_engine.stop_auto_attendance_loop()
+    success, message = rooms.room_scheduler.stop_room(rooms.DEFAULT_ROOM["room_id"])
     return {"status": "success", "message": message}
 
 @router.get("/attendance/logs")
@@ -82,11 +105,96 @@ async def clear_logs():
     """Clear the attendance log file."""
     try:
         # Re-initialize empty file
-        pd.DataFrame(columns=["timestamp", "status", "name", "confidence", "period", "mode"]).to_csv(attendance_engine.LOG_FILE, index=False)
+        pd.DataFrame(columns=attendance_engine.LOG_COLUMNS).to_csv(attendance_engine.LOG_FILE, index=False)
         return {"status": "success", "message": "Logs cleared"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error clearing logs: {str(e)}")
 
+# --- Room Endpoints ---
+
+@router.get("/rooms")
+async def list_rooms():
+    """All registered rooms with their camera source, schedule and scheduler status."""
+    registry = rooms.load_rooms()
+    return {
+        "rooms": [
+            dict(room, status=rooms.room_scheduler.status(room_id))
+            for room_id, room in registry.items()
+        ]
+    }
+
+@router.post("/rooms")
+async def add_or_update_room(payload: RoomPayload):
+    """Register a room (camera source + optional own schedule), or update an existing one."""
+    registry = rooms.load_rooms()
+    registry[payload.room_id] = payload.dict()
+    rooms.save_rooms(registry)
+    camera_manager.register(payload.room_id, payload.source)
+    return {"status": "success", "message": f"Room '{payload.room_id}' saved"}
+
+@router.delete("/rooms/{room_id}")
+async def delete_room(room_id: str):
+    """Stop and remove a room."""
+    if room_id == rooms.DEFAULT_ROOM["room_id"]:
+        raise HTTPException(status_code=400, detail="The default room cannot be removed")
+    registry = rooms.load_rooms()
+    if room_id not in registry:
+        raise HTTPException(status_code=404, detail=f"Room '{room_id}' not found")
+
+    rooms.room_scheduler.remove_room(room_id)
+    del registry[room_id]
+    rooms.save_rooms(registry)
+    camera_manager.close(room_id)
+    return {"status": "success", "message": f"Room '{room_id}' removed"}
+
+@router.post("/rooms/{room_id}/start")
+async def start_room(room_id: str):
+    """Start scheduled attendance checks for one room."""
+    await asyncio.to_thread(ensure_models_loaded)
+    success, message = rooms.room_scheduler.start_room(room_id)
+    if not success:
+        status = 404 if "not found" in message else 400
+        raise HTTPException(status_code=status, detail=message)
+    return {"status": "success", "message": message}
+
+@router.post("/rooms/{room_id}/stop")
+async def stop_room(room_id: str):
+    """Stop scheduled attendance checks for one room."""
+    success, message = rooms.room_scheduler.stop_room(room_id)
+    return {"status": "success", "message": message}
+
+@router.get("/rooms/{room_id}/status")
+async def room_status(room_id: str):
+    """Scheduler state of one room (running, checking, current period, last result)."""
+    if room_id not in rooms.load_rooms():
+        raise HTTPException(status_code=404, detail=f"Room '{room_id}' not found")
+    return rooms.room_scheduler.status(room_id)
+
+# --- Camera Endpoints ---
+
+@router.get("/cameras")
+async def list_cameras():
+    """Status of the shared camera sessions (open, users, idle time)."""
+    return {"cameras": camera_manager.status()}
+
+@router.get("/cameras/{name}/preview")
+async def camera_preview(name: str):
+    """Latest frame of a shared camera as JPEG (opens the device if it is closed)."""
+    def _grab():
+        with camera_manager.session(name) as camera:
+            if camera is None:
+                return None
+            _, frame = camera.read(0, timeout=5.0)
+            if frame is None:
+                return None
+            ok, buffer = cv2.imencode(".jpg", frame)
+            return buffer.tobytes() if ok else None
+
+    jpeg = await asyncio.to_thread(_grab)
+    if jpeg is None:
+        raise HTTPException(status_code=503, detail=f"Camera '{name}' unavailable")
+    return Response(content=jpeg, media_type="image/jpeg")
+
 # --- Schedule Endpoints ---
 
 @router.get("/schedule/current")
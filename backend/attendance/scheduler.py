@@ -32,9 +32,10 @@ def save_schedule(schedule_data):
         json.dump(schedule_data, f, indent=4)
     return True
 
-def get_current_period():
-    """Returns the current period dict if active, else None."""
-    schedule = load_schedule()
+def get_current_period(schedule=None):
+    """Returns the current period dict if active, else None. Uses schedule.json unless a schedule is given."""
+    if schedule is None:
+        schedule = load_schedule()
     now = datetime.now()
     current_time_str = now.strftime("%H:%M")
     
@@ -53,9 +54,10 @@ def get_current_period():
             
     return None
 
-def get_next_period():
-    """Returns the next upcoming period dict, else None."""
-    schedule = load_schedule()
+def get_next_period(schedule=None):
+    """Returns the next upcoming period dict, else None. Uses schedule.json unless a schedule is given."""
+    if schedule is None:
+        schedule = load_schedule()
     now = datetime.now()
     current_time_str = now.strftime("%H:%M")
     curr = datetime.strptime(current_time_str, "%H:%M").time()
@@ -0,0 +1,122 @@
+import time
+import itertools
+
+import numpy as np
+
+# --- FACE TRACKER ---
+def iou_matrix(boxes_a, boxes_b):
+    """Pairwise IoU between two (N, 4) / (M, 4) arrays of [x1, y1, x2, y2] boxes."""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return inter / np.maximum(union, 1e-6)
+
+def face_score(face):
+    """Score used to decide whether a new crop of a track is worth embedding."""
+    return face.get('quality', face.get('confidence', 0.0))
+
+class Track:
+    def __init__(self, track_id, face, now):
+        self.id = track_id
+        self.bbox = list(face['bbox'])
+        self.last_seen = now
+        self.hits = 1
+        self.best_score = -1.0   # score of the best crop embedded so far
+        self.embed_count = 0
+        self.identity = None     # (name, confidence) once a crop matched
+
+    def centroid(self):
+        x1, y1, x2, y2 = self.bbox
+        return (x1 + x2) / 2.0, (y1 + y2) / 2.0
+
+    def record(self, score, is_match, name, conf):
+        """Stores the outcome of embedding one crop of this track (also called when embedding failed)."""
+        self.embed_count += 1
+        self.best_score = max(self.best_score, score)
+        if is_match and (self.identity is None or conf > self.identity[1]):
+            self.identity = (name, conf)
+
+class FaceTracker:
+    """
+    Associates detections across frames (IoU first, centroid distance as a
+    fallback for fast movement) so a face is embedded when its track is new
+    or when a clearly better crop of it shows up, not on every frame.
+    """
+
+    def __init__(self, iou_threshold=0.3, centroid_ratio=0.5, max_age=2.0, min_improvement=0.05, max_embeds=3):
+        self.iou_threshold = iou_threshold
+        self.centroid_ratio = centroid_ratio    # max centroid shift as a fraction of the track's box width
+        self.max_age = max_age                  # seconds a track survives without detections
+        self.min_improvement = min_improvement  # score gain needed to re-embed a track
+        self.max_embeds = max_embeds            # embeddings per track (its best crops so far)
+        self.tracks = []
+        self._ids = itertools.count(1)
+
+    def _associate(self, faces):
+        """Greedy one-to-one matching; returns {face_index: track}."""
+        assigned = {}
+        if not self.tracks or not faces:
+            return assigned
+
+        ious = iou_matrix([t.bbox for t in self.tracks], [f['bbox'] for f in faces])
+        free_tracks = set(range(len(self.tracks)))
+        for flat in np.argsort(-ious, axis=None):
+            ti, fi = np.unravel_index(flat, ious.shape)
+            if ious[ti, fi] < self.iou_threshold:
+                break
+            if ti in free_tracks and fi not in assigned:
+                assigned[fi] = self.tracks[ti]
+                free_tracks.discard(ti)
+
+        # Centroid fallback for faces that moved too far for any overlap
+        for fi, face in enumerate(faces):
+            if fi in assigned or not free_tracks:
+                continue
+            x1, y1, x2, y2 = face['bbox']
+            cx, cy = (x1 + x2) / 2.0, (y1 + y2) / 2.0
+            best, best_dist = None, None
+            for ti in free_tracks:
+                track = self.tracks[ti]
+                tx, ty = track.centroid()
+                dist = np.hypot(cx - tx, cy - ty)
+                if dist <= self.centroid_ratio * (track.bbox[2] - track.bbox[0]) and (best_dist is None or dist < best_dist):
+                    best, best_dist = ti, dist
+            if best is not None:
+                assigned[fi] = self.tracks[best]
+                free_tracks.discard(best)
+        return assigned
+
+    def update(self, faces, now=None):
+        """
+        Feeds one frame's detections. Returns [(track, face, needs_embedding)]
+        in the order of faces.
+        """
+        now = time.time() if now is None else now
+        self.tracks = [t for t in self.tracks if now - t.last_seen <= self.max_age]
+
+        assigned = self._associate(faces)
+        results = []
+        for fi, face in enumerate(faces):
+            track = assigned.get(fi)
+            if track is None:
+                track = Track(next(self._ids), face, now)
+                self.tracks.append(track)
+            else:
+                track.bbox = list(face['bbox'])
+                track.last_seen = now
+                track.hits += 1
+            # Identified tracks are done; others re-embed only on a clearly better crop
+            needs_embedding = (
+                track.identity is None
+                and track.embed_count < self.max_embeds
+                and face_score(face) >= track.best_score + self.min_improvement
+            )
+            results.append((track, face, needs_embedding))
+        return results
@@ -13,7 +13,32 @@ DEFAULT_CONFIG = {
     "sender_email": "",
     "sender_password": "",
     "email_receiver": DEFAULT_RECEIVER,
-    "notification_mode": "Absent Only" # "All (Present & Absent)", "Absent Only", "None"
+    "notification_mode": "Absent Only", # "All (Present & Absent)", "Absent Only", "None"
+    "insightface_modules": None, # subset of detection/recognition/landmark_2d_106/landmark_3d_68/genderage; None = detection+recognition, or recognition only with a face detector
+    "detector_face_model": False, # True if the YOLO weights detect faces (e.g. yolov8-face); the default yolov8s.pt is a COCO model
+    "det_size": 640, # InsightFace detector input size (only used if "detection" is loaded)
+    "model_init_mode": "lazy", # "lazy" (load on first use) or "eager" (load at startup); env MODEL_INIT_MODE overrides
+    "model_warmup": True, # run a synthetic inference after loading; env MODEL_WARMUP overrides
+    "inference_workers": 0, # inference thread pool size, 0 = min(4, CPU count); env INFERENCE_WORKERS overrides
+    "inference_queue_limit": 16, # max running + queued inference jobs before 503; env INFERENCE_QUEUE_LIMIT overrides
+    "detect_batch_window_ms": 10, # /detect-faces micro-batch window, 0 disables; env DETECT_BATCH_WINDOW_MS overrides
+    "detect_batch_max_size": 8, # max images per YOLO batch; env DETECT_BATCH_MAX_SIZE overrides
+    "detector_backend": "ultralytics", # "ultralytics" (PyTorch) or "onnx" (onnxruntime, exported once next to the weights)
+    "onnx_intra_op_threads": 0, # onnxruntime threads inside one op, 0 = auto
+    "onnx_inter_op_threads": 0, # onnxruntime threads across independent ops, 0 = auto
+    "model_precision": "fp32", # "fp32", "int8-dynamic" or "int8-static" (INT8 needs detector_backend "onnx")
+    "camera_idle_timeout": 60, # seconds a shared camera stays open with no users
+    "room_check_workers": 4, # rooms checked concurrently by the multi-room scheduler
+    "motion_gate_enabled": True, # skip detection on frames with no scene change (auto/room checks only)
+    "motion_sensitivity": 0.01, # fraction of (downscaled) pixels that must change to run detection
+    "motion_refresh_interval": 5.0, # seconds after which a frame is processed even without change; capped at half the tracker max age and a quarter of the check
+    "min_face_quality": 0.3, # 0..1 crop quality below which faces are not embedded or enrolled
+    "max_embeds_per_track": 3, # best crops embedded per tracked face
+    "match_aggregation": "max", # per-person score over enrolled images: "max", "mean" or "centroid"
+    "faiss_index_type": "auto", # "flat", "hnsw", "ivf_flat", "ivf_pq" or "auto" (by gallery size)
+    "faiss_ef_search": 64, # HNSW search breadth (higher = better recall, slower)
+    "faiss_ef_construction": 200, # HNSW build breadth
+    "faiss_nprobe": 16 # IVF lists scanned per query
 }
 
 # --- CONFIG MANAGEMENT ---
@@ -29,6 +54,27 @@ def load_config():
     # Return default config if file doesn't exist or error occurs
     return DEFAULT_CONFIG.copy()
 
+# Parsed config reused by get_setting until the file changes
+_cached_config = None
+_cached_stamp = None
+
+def get_setting(key):
+    """
+    Returns one config value (or its default) for per-request hot paths.
+    The parsed file is cached and only re-read when its mtime/size change.
+    """
+    global _cached_config, _cached_stamp
+    try:
+        st = os.stat(CONFIG_FILE)
+        stamp = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        stamp = None
+    config = _cached_config
+    if config is None or stamp != _cached_stamp:
+        config = load_config()
+        _cached_config, _cached_stamp = config, stamp
+    return config.get(key, DEFAULT_CONFIG[key])
+
 def save_config(config):
     """Save system configuration"""
     try:
@@ -1,11 +1,18 @@
 from fastapi import APIRouter, HTTPException, Body
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Literal, Optional
 
 from . import config_store
 
 router = APIRouter()
 
+# Allowed values of the enum settings (mirroring the checks in the modules that read them)
+ModelInitMode = Literal["lazy", "eager"]
+DetectorBackend = Literal["ultralytics", "onnx"]
+ModelPrecision = Literal["fp32", "int8-dynamic", "int8-static"]
+MatchAggregation = Literal["max", "mean", "centroid"]
+FaissIndexType = Literal["auto", "flat", "hnsw", "ivf_flat", "ivf_pq"]
+
 # --- Pydantic Models ---
 
 class ConfigModel(BaseModel):
@@ -15,6 +22,31 @@ class ConfigModel(BaseModel):
     sender_password: str
     email_receiver: str
     notification_mode: str
+    insightface_modules: Optional[List[str]] = config_store.DEFAULT_CONFIG["insightface_modules"]
+    detector_face_model: bool = config_store.DEFAULT_CONFIG["detector_face_model"]
+    det_size: int = config_store.DEFAULT_CONFIG["det_size"]
+    model_init_mode: ModelInitMode = config_store.DEFAULT_CONFIG["model_init_mode"]
+    model_warmup: bool = config_store.DEFAULT_CONFIG["model_warmup"]
+    inference_workers: int = config_store.DEFAULT_CONFIG["inference_workers"]
+    inference_queue_limit: int = config_store.DEFAULT_CONFIG["inference_queue_limit"]
+    detect_batch_window_ms: float = config_store.DEFAULT_CONFIG["detect_batch_window_ms"]
+    detect_batch_max_size: int = config_store.DEFAULT_CONFIG["detect_batch_max_size"]
+    detector_backend: DetectorBackend = config_store.DEFAULT_CONFIG["detector_backend"]
+    onnx_intra_op_threads: int = config_store.DEFAULT_CONFIG["onnx_intra_op_threads"]
+    onnx_inter_op_threads: int = config_store.DEFAULT_CONFIG["onnx_inter_op_threads"]
+    model_precision: ModelPrecision = config_store.DEFAULT_CONFIG["model_precision"]
+    camera_idle_timeout: float = config_store.DEFAULT_CONFIG["camera_idle_timeout"]
+    room_check_workers: int = config_store.DEFAULT_CONFIG["room_check_workers"]
+    motion_gate_enabled: bool = config_store.DEFAULT_CONFIG["motion_gate_enabled"]
+    motion_sensitivity: float = config_store.DEFAULT_CONFIG["motion_sensitivity"]
+    motion_refresh_interval: float = config_store.DEFAULT_CONFIG["motion_refresh_interval"]
+    min_face_quality: float = config_store.DEFAULT_CONFIG["min_face_quality"]
+    max_embeds_per_track: int = config_store.DEFAULT_CONFIG["max_embeds_per_track"]
+    match_aggregation: MatchAggregation = config_store.DEFAULT_CONFIG["match_aggregation"]
+    faiss_index_type: FaissIndexType = config_store.DEFAULT_CONFIG["faiss_index_type"]
+    faiss_ef_search: int = config_store.DEFAULT_CONFIG["faiss_ef_search"]
+    faiss_ef_construction: int = config_store.DEFAULT_CONFIG["faiss_ef_construction"]
+    faiss_nprobe: int = config_store.DEFAULT_CONFIG["faiss_nprobe"]
 
 class PartialConfigModel(BaseModel):
     detection_time: Optional[int] = None
@@ -23,6 +55,31 @@ class PartialConfigModel(BaseModel):
     sender_password: Optional[str] = None
     email_receiver: Optional[str] = None
     notification_mode: Optional[str] = None
+    insightface_modules: Optional[List[str]] = None
+    detector_face_model: Optional[bool] = None
+    det_size: Optional[int] = None
+    model_init_mode: Optional[ModelInitMode] = None
+    model_warmup: Optional[bool] = None
+    inference_workers: Optional[int] = None
+    inference_queue_limit: Optional[int] = None
+    detect_batch_window_ms: Optional[float] = None
+    detect_batch_max_size: Optional[int] = None
+    detector_backend: Optional[DetectorBackend] = None
+    onnx_intra_op_threads: Optional[int] = None
+    onnx_inter_op_threads: Optional[int] = None
+    model_precision: Optional[ModelPrecision] = None
+    camera_idle_timeout: Optional[float] = None
+    room_check_workers: Optional[int] = None
+    motion_gate_enabled: Optional[bool] = None
+    motion_sensitivity: Optional[float] = None
+    motion_refresh_interval: Optional[float] = None
+    min_face_quality: Optional[float] = None
+    max_embeds_per_track: Optional[int] = None
+    match_aggregation: Optional[MatchAggregation] = None
+    faiss_index_type: Optional[FaissIndexType] = None
+    faiss_ef_search: Optional[int] = None
+    faiss_ef_construction: Optional[int] = None
+    faiss_nprobe: Optional[int] = None
 
 # --- Endpoints ---
 
@@ -0,0 +1,195 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import Future, InvalidStateError
+
+from fastapi import HTTPException
+
+from .face_detect import detect_faces_yolo_batch
+from .worker_pool import run_inference_blocking, PoolSaturatedError, RETRY_AFTER_SECONDS
+from ..config.config_store import load_config, DEFAULT_CONFIG
+
+# Number of recent batches kept for the rolling metrics
+METRICS_WINDOW = 500
+
+# --- DYNAMIC MICRO-BATCHING ---
+class DetectionBatcher:
+    """
+    Collects concurrent detect requests for up to window_ms (or until
+    max_batch_size images are waiting), runs YOLO once on the batch and
+    fans the results back out to each waiting request.
+    Each batch runs as one job of the inference pool, so detection counts
+    against the same concurrency bound (and /metrics pool counters) as
+    every other inference.
+    """
+
+    def __init__(self, get_model, window_ms=10, max_batch_size=8, max_queue=64):
+        self._get_model = get_model
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self._queue = queue.Queue(maxsize=max_queue)
+
+        self._metrics_lock = threading.Lock()
+        self._batch_sizes = deque(maxlen=METRICS_WINDOW)
+        self._queue_waits = deque(maxlen=METRICS_WINDOW)
+        self._batch_latencies = deque(maxlen=METRICS_WINDOW)
+        self._batches = 0
+        self._images = 0
+
+        # Started last: the first batch may be recorded as soon as it runs
+        self._thread = threading.Thread(target=self._run, daemon=True, name="detect-batcher")
+        self._thread.start()
+
+    def submit(self, image):
+        """Queues one image; returns a Future resolving to its list of faces."""
+        future = Future()
+        try:
+            self._queue.put_nowait((image, future, time.perf_counter()))
+        except queue.Full:
+            raise HTTPException(
+                status_code=503,
+                detail="Detection queue is full. Retry later.",
+                headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+            )
+        return future
+
+    async def detect(self, image):
+        return await asyncio.wrap_future(self.submit(image))
+
+    def _collect(self):
+        """Blocks for the first request, then gathers more until the window closes or the batch is full."""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        # This is the only batcher thread: nothing may escape the loop, or every
+        # later submit() would wait forever
+        while True:
+            try:
+                self._run_batch(self._collect())
+            except Exception as e:
+                print(f"Error: Detection batch failed: {e}")
+
+    def _run_batch(self, batch):
+        # Skip requests cancelled while queued (e.g. the client disconnected);
+        # the rest are marked running so they can no longer be cancelled
+        batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        started = time.perf_counter()
+        images = [item[0] for item in batch]
+        try:
+            results = run_inference_blocking(detect_faces_yolo_batch, self._get_model(), images)
+            if len(results) != len(batch):
+                raise RuntimeError(f"Detector returned {len(results)} results for {len(batch)} images")
+        except PoolSaturatedError:
+            for _, future, _ in batch:
+                _settle(future.set_exception, HTTPException(
+                    status_code=503,
+                    detail="Inference queue is full. Retry later.",
+                    headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+                ))
+            return
+        except Exception as e:
+            for _, future, _ in batch:
+                _settle(future.set_exception, e)
+            return
+        finished = time.perf_counter()
+
+        for (_, future, _), faces in zip(batch, results):
+            _settle(future.set_result, faces)
+        self._record(batch, started, finished)
+
+    def _record(self, batch, started, finished):
+        with self._metrics_lock:
+            self._batches += 1
+            self._images += len(batch)
+            self._batch_sizes.append(len(batch))
+            self._batch_latencies.append(finished - started)
+            for _, _, enqueued in batch:
+                self._queue_waits.append(started - enqueued)
+
+    def metrics(self):
+        """
+        Rolling batch size, queue wait and per-batch latency (ms, including
+        the wait for a pool worker) over recent batches.
+        """
+        def summary(values, scale=1.0):
+            if not values:
+                return {"avg": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+            ordered = sorted(values)
+            pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * scale
+            return {
+                "avg": sum(ordered) / len(ordered) * scale,
+                "p50": pick(0.50),
+                "p95": pick(0.95),
+                "max": ordered[-1] * scale
+            }
+
+        with self._metrics_lock:
+            return {
+                "window_ms": self.window * 1000.0,
+                "max_batch_size": self.max_batch_size,
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "images": self._images,
+                "batch_size": summary(self._batch_sizes),
+                "queue_wait_ms": summary(self._queue_waits, 1000.0),
+                "batch_latency_ms": summary(self._batch_latencies, 1000.0)
+            }
+
+def _settle(setter, value):
+    """Resolves a future, ignoring one that is already done"""
+    try:
+        setter(value)
+    except InvalidStateError:
+        pass
+
+_batcher = None
+_enabled = None
+_batcher_lock = threading.Lock()
+
+def _setting(env_name, config_key, cast):
+    value = os.environ.get(env_name)
+    if value is None:
+        value = load_config().get(config_key, DEFAULT_CONFIG[config_key])
+    return cast(value)
+
+def batching_enabled():
+    """
+    Micro-batching is used when the window (DETECT_BATCH_WINDOW_MS / detect_batch_window_ms)
+    is > 0. Read once per process, like the worker pool size.
+    """
+    global _enabled
+    if _enabled is None:
+        _enabled = _setting("DETECT_BATCH_WINDOW_MS", "detect_batch_window_ms", float) > 0
+    return _enabled
+
+def get_detection_batcher(get_model):
+    """Returns the process-wide batcher, created on first use from env/config."""
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = DetectionBatcher(
+                    get_model,
+                    window_ms=_setting("DETECT_BATCH_WINDOW_MS", "detect_batch_window_ms", float),
+                    max_batch_size=_setting("DETECT_BATCH_MAX_SIZE", "detect_batch_max_size", int),
+                    max_queue=_setting("INFERENCE_QUEUE_LIMIT", "inference_queue_limit", int) * 4
+                )
+    return _batcher
+
+def get_batcher_metrics():
+    return _batcher.metrics() if _batcher is not None else None
@@ -1,8 +1,34 @@
 import cv2
+import numpy as np
+from insightface.utils import face_align
+
+ARCFACE_INPUT_SIZE = 112
+# Context added around a non-face box (e.g. a COCO person box) when looking for the face inside it
+FACE_SEARCH_MARGIN = 0.3
+
+_warned_untrusted_boxes = False
 
 # --- FACE ENCODING ---
-def get_face_embedding(insightface_app, image, bbox, margin_ratio=0.3):
-    """Extracts a face embedding from a bounding box."""
+def get_face_embedding(insightface_app, image, bbox, margin_ratio=None, landmarks=None):
+    """
+    Extracts a face embedding from a bounding box.
+    With a recognition model available this goes through the batched path,
+    which only skips InsightFace's face detector when the box is known to
+    be a face (see get_face_embeddings_batch).
+    margin_ratio overrides the context added around the box; by default
+    each path keeps its own (0.1 for the square crop, 0.3 for the legacy
+    pipeline), so results match the batched endpoints and enrollment.
+    """
+    margin = {} if margin_ratio is None else {'margin_ratio': margin_ratio}
+    if get_recognition_model(insightface_app) is not None:
+        return get_face_embeddings_batch(
+            insightface_app, image, [bbox],
+            landmarks=[landmarks] if landmarks is not None else None, **margin
+        )[0]
+    return _get_face_embedding_full_pipeline(insightface_app, image, bbox, **margin)
+
+def _get_face_embedding_full_pipeline(insightface_app, image, bbox, margin_ratio=0.3):
+    """Legacy path: crop, then run the full FaceAnalysis pipeline (detect + align + embed)."""
     h, w = image.shape[:2]
     x1, y1, x2, y2 = bbox
     margin = int(max(x2 - x1, y2 - y1) * margin_ratio)
@@ -21,4 +47,143 @@ def get_face_embedding(insightface_app, image, bbox, margin_ratio=0.3):
     faces = insightface_app.get(face_rgb)
     if len(faces) > 0:
         return faces[0].embedding
-    return None
\ No newline at end of file
+    return None
+
+# --- BATCHED FACE ENCODING ---
+def get_recognition_model(insightface_app):
+    """Returns the ArcFace recognition model of a FaceAnalysis app, or None."""
+    models = getattr(insightface_app, 'models', None)
+    if isinstance(models, dict):
+        return models.get('recognition')
+    return None
+
+def get_detection_model(insightface_app):
+    """Returns the face detector of a FaceAnalysis app, or None."""
+    models = getattr(insightface_app, 'models', None)
+    if isinstance(models, dict):
+        return models.get('detection')
+    return None
+
+def trusts_face_boxes(insightface_app):
+    """True if the app was loaded next to a YOLO model whose boxes are faces (set by model_loader)"""
+    return bool(getattr(insightface_app, 'face_boxes', False))
+
+def locate_face_landmarks(det_model, image, bbox, margin_ratio=FACE_SEARCH_MARGIN):
+    """
+    Runs InsightFace's face detector inside a padded box and returns the
+    5 landmarks of the most prominent face in image coordinates, or None.
+    """
+    h, w = image.shape[:2]
+    x1, y1, x2, y2 = [int(c) for c in bbox]
+    margin = int(max(x2 - x1, y2 - y1) * margin_ratio)
+    cx1, cy1 = max(0, x1 - margin), max(0, y1 - margin)
+    cx2, cy2 = min(w, x2 + margin), min(h, y2 + margin)
+    if cx2 - cx1 < 20 or cy2 - cy1 < 20:
+        return None  # too small
+
+    _, kpss = det_model.detect(image[cy1:cy2, cx1:cx2], max_num=1)
+    if kpss is None or len(kpss) == 0:
+        return None
+    return kpss[0] + np.array([cx1, cy1], dtype='float32')
+
+def align_face_crop(image, bbox, margin_ratio=0.1, size=ARCFACE_INPUT_SIZE):
+    """
+    Cuts a square crop centred on the bbox (padding at the image border)
+    and resizes it to the ArcFace input size. Returns None if too small.
+    """
+    x1, y1, x2, y2 = [int(c) for c in bbox]
+    if x2 - x1 < 20 or y2 - y1 < 20:
+        return None  # too small
+
+    side = int(max(x2 - x1, y2 - y1) * (1 + 2 * margin_ratio))
+    cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
+    sx1, sy1 = cx - side // 2, cy - side // 2
+    sx2, sy2 = sx1 + side, sy1 + side
+
+    h, w = image.shape[:2]
+    crop = image[max(0, sy1):min(h, sy2), max(0, sx1):min(w, sx2)]
+    pad = (max(0, -sy1), max(0, sy2 - h), max(0, -sx1), max(0, sx2 - w))
+    if any(pad):
+        crop = cv2.copyMakeBorder(crop, *pad, cv2.BORDER_CONSTANT, value=0)
+
+    return cv2.resize(crop, (size, size))
+
+def align_face_landmarks(image, bbox, landmarks, size=ARCFACE_INPUT_SIZE):
+    """Similarity-transforms the face onto the ArcFace template using 5 landmarks."""
+    x1, y1, x2, y2 = [int(c) for c in bbox]
+    if x2 - x1 < 20 or y2 - y1 < 20:
+        return None  # too small
+    kps = np.asarray(landmarks, dtype='float32').reshape(5, 2)
+    return face_align.norm_crop(image, landmark=kps, image_size=size)
+
+def get_face_embeddings_batch(insightface_app, image, bboxes, margin_ratio=0.1, landmarks=None):
+    """
+    Extracts embeddings for all bboxes of one frame with a single forward
+    pass of the recognition model (N x 3 x 112 x 112).
+    Faces with 5-point landmarks (from a keypoint detector) are aligned on
+    them. Boxes from a face detector without keypoints are square-cropped.
+    Boxes from a generic detector (e.g. COCO yolov8s person boxes) first go
+    through InsightFace's face detector to find the face and its landmarks.
+    Returns a list aligned with bboxes; entries are None for faces too small
+    or boxes with no face in them.
+    """
+    if len(bboxes) == 0:
+        return []
+
+    rec_model = get_recognition_model(insightface_app)
+    if rec_model is None:
+        # Old InsightFace API without model access: fall back to per-face pipeline
+        return [_get_face_embedding_full_pipeline(insightface_app, image, bbox) for bbox in bboxes]
+
+    crops, positions = prepare_face_crops(insightface_app, image, bboxes, margin_ratio, landmarks)
+    results = [None] * len(bboxes)
+    if not crops:
+        return results
+
+    for pos, feat in zip(positions, embed_face_crops(insightface_app, crops)):
+        results[pos] = feat
+    return results
+
+def embed_face_crops(insightface_app, crops):
+    """Embeds prepared 112x112 BGR crops with one forward pass of the recognition model"""
+    # get_feat builds one BGR->RGB blob for the whole list
+    return np.asarray(get_recognition_model(insightface_app).get_feat(crops), dtype='float32')
+
+def prepare_face_crops(insightface_app, image, bboxes, margin_ratio=0.1, landmarks=None, return_landmarks=False):
+    """
+    The crop/alignment step of get_face_embeddings_batch: returns the
+    112x112 BGR crops to embed and the bbox index of each. Also used to
+    calibrate and benchmark quantized recognition models on exactly the
+    crops production embeds, and to score enrollment quality on them.
+    With return_landmarks=True also returns the landmarks each crop was
+    aligned on (None for square crops).
+    """
+    global _warned_untrusted_boxes
+    det_model = None
+    if not trusts_face_boxes(insightface_app):
+        det_model = get_detection_model(insightface_app)
+        if det_model is None and not _warned_untrusted_boxes:
+            _warned_untrusted_boxes = True
+            print("⚠️ YOLO model is not a face detector and InsightFace 'detection' is not loaded; "
+                  "embedding raw YOLO boxes. Load 'detection' or set detector_face_model.")
+
+    crops = []
+    positions = []
+    crop_landmarks = []
+    for i, bbox in enumerate(bboxes):
+        kps = landmarks[i] if landmarks is not None else None
+        if kps is None and det_model is not None:
+            kps = locate_face_landmarks(det_model, image, bbox)
+            if kps is None:
+                continue  # no face inside this box
+        if kps is not None:
+            crop = align_face_landmarks(image, bbox, kps)
+        else:
+            crop = align_face_crop(image, bbox, margin_ratio)
+        if crop is not None:
+            crops.append(crop)
+            positions.append(i)
+            crop_landmarks.append(kps)
+    if return_landmarks:
+        return crops, positions, crop_landmarks
+    return crops, positions
@@ -1,15 +1,40 @@
+from .onnx_detector import OnnxYoloDetector
+
 # --- FACE DETECTION ---
 def detect_faces_yolo(yolo_model, image):
     """Detect faces using YOLOv8 and return bounding boxes"""
+    if isinstance(yolo_model, OnnxYoloDetector):
+        return yolo_model.detect(image, conf=0.5)
     results = yolo_model(image, conf=0.5, verbose=False)
+    if len(results) > 0:
+        return _parse_result(results[0])
+    return []
+
+def detect_faces_yolo_batch(yolo_model, images):
+    """Detect faces in several images with one YOLO call; returns one face list per image"""
+    if len(images) == 0:
+        return []
+    if isinstance(yolo_model, OnnxYoloDetector):
+        return yolo_model.detect_batch(images, conf=0.5)
+    results = yolo_model(list(images), conf=0.5, verbose=False)
+    return [_parse_result(result) for result in results]
+
+def _parse_result(result):
+    """Converts one Ultralytics result into [{'bbox', 'confidence'[, 'landmarks']}]"""
     faces = []
     
-    if len(results) > 0 and len(results[0].boxes) > 0:
-        boxes = results[0].boxes.xyxy.cpu().numpy()
-        confidences = results[0].boxes.conf.cpu().numpy()
+    if len(result.boxes) > 0:
+        boxes = result.boxes.xyxy.cpu().numpy()
+        confidences = result.boxes.conf.cpu().numpy()
+        # Face-pose models (e.g. yolov8-face) also return 5 facial keypoints
+        keypoints = getattr(result, 'keypoints', None)
+        kps = keypoints.xy.cpu().numpy() if keypoints is not None else None
         
-        for box, conf in zip(boxes, confidences):
+        for i, (box, conf) in enumerate(zip(boxes, confidences)):
             x1, y1, x2, y2 = box.astype(int)
-            faces.append({'bbox': [x1, y1, x2, y2], 'confidence': float(conf)})
+            face = {'bbox': [x1, y1, x2, y2], 'confidence': float(conf)}
+            if kps is not None and kps.shape[1] == 5:
+                face['landmarks'] = kps[i].tolist()
+            faces.append(face)
     
-    return faces
\ No newline at end of file
+    return faces
@@ -0,0 +1,109 @@
+import cv2
+import numpy as np
+
+from .embeddings import prepare_face_crops
+
+# --- FACE QUALITY SCORING ---
+QUALITY_CROP_SIZE = 112   # crops are scored at the ArcFace input size
+SHARPNESS_REF = 150.0     # Laplacian variance treated as fully sharp
+FACE_SIZE_REF = 80        # face height (px) treated as full resolution
+CONTRAST_REF = 50.0       # gray-level std treated as full contrast
+EYE_DISTANCE_REF = 32.0   # inter-ocular distance (px) of a full-resolution face
+
+QUALITY_WEIGHTS = {'sharpness': 0.35, 'size': 0.25, 'exposure': 0.2, 'pose': 0.2}
+
+def _face_crop(image, bbox):
+    h, w = image.shape[:2]
+    x1, y1, x2, y2 = [int(c) for c in bbox]
+    x1, y1, x2, y2 = max(0, x1), max(0, y1), min(w, x2), min(h, y2)
+    if x2 - x1 < 2 or y2 - y1 < 2:
+        return None
+    return image[y1:y2, x1:x2]
+
+def pose_score(landmarks):
+    """
+    Frontalness from 5 landmarks (eyes, nose, mouth corners): 1.0 when the
+    nose sits between the eyes and above the mouth centre, falling towards
+    0 as the head turns.
+    """
+    kps = np.asarray(landmarks, dtype=np.float32).reshape(5, 2)
+    left_eye, right_eye, nose, mouth_l, mouth_r = kps
+    eye_dist = np.linalg.norm(right_eye - left_eye)
+    if eye_dist < 1e-3:
+        return 0.0
+    eye_mid = (left_eye + right_eye) / 2.0
+    mouth_mid = (mouth_l + mouth_r) / 2.0
+    yaw = abs(nose[0] - eye_mid[0]) / eye_dist
+    # Nose should sit roughly halfway between the eye line and the mouth
+    face_h = mouth_mid[1] - eye_mid[1]
+    pitch = abs((nose[1] - eye_mid[1]) / face_h - 0.5) if face_h > 1e-3 else 1.0
+    return float(np.clip(1.0 - 2.0 * yaw - pitch, 0.0, 1.0))
+
+def _crop_scores(crop):
+    """Sharpness and exposure of a face crop, measured at the ArcFace input size"""
+    gray = cv2.cvtColor(cv2.resize(crop, (QUALITY_CROP_SIZE, QUALITY_CROP_SIZE)), cv2.COLOR_BGR2GRAY)
+    sharpness = min(cv2.Laplacian(gray, cv2.CV_64F).var() / SHARPNESS_REF, 1.0)
+    mean, std = float(gray.mean()), float(gray.std())
+    brightness = 1.0 - abs(mean - 128.0) / 128.0
+    contrast = min(std / CONTRAST_REF, 1.0)
+    return {'sharpness': sharpness, 'exposure': brightness * contrast}
+
+def _weighted(scores):
+    total_weight = sum(QUALITY_WEIGHTS[k] for k in scores)
+    return float(sum(QUALITY_WEIGHTS[k] * v for k, v in scores.items()) / total_weight)
+
+def score_face(image, face, face_box=True):
+    """
+    Returns a 0..1 quality score for one detected face combining sharpness
+    (Laplacian variance), size, brightness/contrast and, when landmarks are
+    present, pose.
+    With face_box=False (boxes from a generic detector, e.g. COCO person
+    boxes) the box height is not a face height, so the size and pose terms
+    are left out.
+    """
+    crop = _face_crop(image, face['bbox'])
+    if crop is None:
+        return 0.0
+
+    scores = _crop_scores(crop)
+    if face_box:
+        scores['size'] = min(crop.shape[0] / FACE_SIZE_REF, 1.0)
+        if face.get('landmarks') is not None:
+            scores['pose'] = pose_score(face['landmarks'])
+    return _weighted(scores)
+
+def score_aligned_face(crop, landmarks=None):
+    """
+    Returns a 0..1 quality score for a landmark-aligned 112x112 crop (as
+    prepare_face_crops produces it). Size and pose come from the landmarks
+    in the source image, since the crop itself is always the same size.
+    """
+    scores = _crop_scores(crop)
+    if landmarks is not None:
+        kps = np.asarray(landmarks, dtype=np.float32).reshape(5, 2)
+        scores['size'] = min(np.linalg.norm(kps[1] - kps[0]) / EYE_DISTANCE_REF, 1.0)
+        scores['pose'] = pose_score(kps)
+    return _weighted(scores)
+
+def best_aligned_face(insightface_app, image, faces):
+    """
+    Scores the crop get_face_embeddings_batch would embed for each face
+    (after InsightFace's detector relocalizes faces in untrusted boxes) and
+    returns (crop, quality) of the best one, or (None, 0.0) if no box holds
+    a usable face.
+    """
+    crops, _, crop_landmarks = prepare_face_crops(
+        insightface_app, image, [face['bbox'] for face in faces],
+        landmarks=[face.get('landmarks') for face in faces], return_landmarks=True
+    )
+    if not crops:
+        return None, 0.0
+    qualities = [score_aligned_face(crop, kps) for crop, kps in zip(crops, crop_landmarks)]
+    best = int(np.argmax(qualities))
+    return crops[best], qualities[best]
+
+def annotate_quality(image, faces, face_boxes=True):
+    """Adds a 'quality' score to each face dict in place; returns faces."""
+    for face in faces:
+        face['quality'] = score_face(image, face, face_boxes)
+    return faces
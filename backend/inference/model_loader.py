@@ -1,8 +1,11 @@
 import os
+import glob
 import requests
-from ultralytics import YOLO
+import numpy as np
 import insightface
 
+from .onnx_detector import OnnxYoloDetector
+
 # --- MODEL CONFIG ---
 # Path relative to the backend directory (inference/../models/)
 _BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -11,6 +14,29 @@ MODEL_PATH_GENERAL = os.path.join(_BACKEND_DIR, "models", "yolov8n.pt")
 FACE_MODEL_URL = "https://github.com/ultralytics/assets/releases/download/v8.3.0/yolov8s.pt"
 GENERAL_MODEL_URL = "https://github.com/ultralytics/assets/releases/download/v0.0.0/yolov8n.pt"
 
+# InsightFace modules to load. With a YOLO face model only the ArcFace
+# embedding is needed; generic YOLO weights (the default yolov8s.pt is COCO)
+# return person/object boxes, so InsightFace's face detector is loaded too.
+INSIGHTFACE_MODULES = ("detection", "recognition", "landmark_2d_106", "landmark_3d_68", "genderage")
+DEFAULT_INSIGHTFACE_MODULES = ("detection", "recognition")
+FACE_DETECTOR_INSIGHTFACE_MODULES = ("recognition",)
+DEFAULT_DET_SIZE = 640
+
+# YOLO execution backends: the Ultralytics PyTorch model or its ONNX export on onnxruntime
+DETECTOR_BACKENDS = ("ultralytics", "onnx")
+DEFAULT_DETECTOR_BACKEND = "ultralytics"
+
+# Numeric precision of the ONNX models; INT8 variants are produced by quantize.py
+MODEL_PRECISIONS = ("fp32", "int8-dynamic", "int8-static")
+DEFAULT_MODEL_PRECISION = "fp32"
+INSIGHTFACE_ROOT = os.path.join(_BACKEND_DIR, "models")
+
+# Recognition model file inside each InsightFace model pack
+RECOGNITION_MODEL_FILES = {
+    "buffalo_l": "w600k_r50.onnx",
+    "antelopev2": "glintr100.onnx",
+}
+
 # --- MODEL DOWNLOADING ---
 def download_yolo_model():
     """Download YOLOv8 model (face-specific if available, else general)"""
@@ -45,11 +71,152 @@ def download_yolo_model():
             # st.error(f"❌ General model download also failed: {e2}")
             return None
 
+# --- ONNX EXPORT ---
+def export_yolo_onnx(model_path, imgsz=640):
+    """
+    Exports a YOLOv8 .pt model to ONNX once and caches it next to the weights
+    (yolov8s.pt -> yolov8s.onnx). Re-exports if the weights are newer.
+    """
+    onnx_path = os.path.splitext(model_path)[0] + ".onnx"
+    if os.path.exists(onnx_path) and os.path.getmtime(onnx_path) >= os.path.getmtime(model_path):
+        return onnx_path
+
+    from ultralytics import YOLO
+    # Dynamic axes so the micro-batcher can send several frames per run
+    exported = YOLO(model_path).export(format="onnx", imgsz=imgsz, dynamic=True)
+    if exported and os.path.abspath(exported) != os.path.abspath(onnx_path):
+        os.replace(exported, onnx_path)
+    print(f"✅ YOLO exported to ONNX: {onnx_path}")
+    return onnx_path
+
+def load_yolo_model(model_path, detector_backend=DEFAULT_DETECTOR_BACKEND, intra_op_threads=0, inter_op_threads=0,
+                    model_precision=DEFAULT_MODEL_PRECISION):
+    """Loads the YOLO detector with the requested backend (INT8 variants require 'onnx')"""
+    if detector_backend not in DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown detector backend '{detector_backend}'. Allowed: {list(DETECTOR_BACKENDS)}")
+    if detector_backend == "onnx":
+        onnx_path = export_yolo_onnx(model_path)
+        if model_precision != "fp32":
+            from . import quantize
+            onnx_path = quantize.ensure_quantized(onnx_path, model_precision, "detector")
+        return OnnxYoloDetector(onnx_path, intra_op_threads, inter_op_threads)
+    if model_precision != "fp32":
+        raise ValueError(f"Precision '{model_precision}' requires detector_backend 'onnx'")
+
+    # Imported lazily: torch + ultralytics are slow to import and not needed for the ONNX backend
+    from ultralytics import YOLO
+    return YOLO(model_path)
+
+def recognition_model_path(name="buffalo_l"):
+    """Path of the FP32 ArcFace ONNX file of an InsightFace model pack (downloads it if missing)"""
+    model_dir = insightface.utils.ensure_available('models', name, root=INSIGHTFACE_ROOT)
+    return os.path.join(model_dir, RECOGNITION_MODEL_FILES[name])
+
+def fp32_recognition_path(insightface_app):
+    """FP32 ArcFace file of the pack an app's recognition model (FP32 or quantized) belongs to"""
+    pack = os.path.basename(os.path.dirname(insightface_app.models['recognition'].model_file))
+    return recognition_model_path(pack)
+
+def _remove_stale_quantized_models(model_dir):
+    """
+    Older versions wrote INT8 variants into the pack dir, where FaceAnalysis
+    picks them over the FP32 model (and later runs quantized those again).
+    They can't be trusted, so they are removed and re-created on demand.
+    """
+    from . import quantize
+
+    for path in glob.glob(os.path.join(model_dir, '*.onnx')):
+        if quantize.is_quantized_model(path):
+            os.remove(path)
+            print(f"Removed quantized model from the InsightFace pack: {path}")
+
+def _load_quantized_recognition(yolo_model, insightface_app, precision, providers):
+    """
+    Swaps the FP32 ArcFace model of an app for its INT8 variant, calibrated
+    (int8-static) on the crops the loaded detector and app produce.
+    """
+    from . import quantize
+
+    fp32_model = insightface_app.models['recognition']
+    path = quantize.ensure_quantized(
+        fp32_recognition_path(insightface_app), precision, "recognition", (yolo_model, insightface_app),
+        input_norm=(fp32_model.input_mean, fp32_model.input_std)
+    )
+    rec_model = insightface.model_zoo.get_model(path, providers=providers)
+    # Keep the FP32 normalization; quantized graphs can hide the ops it is inferred from
+    rec_model.input_mean, rec_model.input_std = fp32_model.input_mean, fp32_model.input_std
+    rec_model.prepare(ctx_id=0)
+    insightface_app.models['recognition'] = rec_model
+
+# --- RECOGNITION-ONLY INSIGHTFACE ---
+class RecognitionOnlyApp:
+    """
+    Lightweight stand-in for insightface.app.FaceAnalysis holding only the
+    ArcFace model. FaceAnalysis always requires a detector, which is not
+    needed when the YOLO model itself detects faces.
+    """
+
+    def __init__(self, name, root, providers=None):
+        model_dir = insightface.utils.ensure_available('models', name, root=root)
+        model_file = os.path.join(model_dir, RECOGNITION_MODEL_FILES.get(name, ""))
+        candidates = [model_file] if os.path.isfile(model_file) else sorted(glob.glob(os.path.join(model_dir, '*.onnx')))
+
+        rec_model = None
+        for onnx_file in candidates:
+            model = insightface.model_zoo.get_model(onnx_file, providers=providers)
+            if model is not None and model.taskname == 'recognition':
+                rec_model = model
+                break
+        if rec_model is None:
+            raise RuntimeError(f"No recognition model found in {model_dir}")
+
+        rec_model.prepare(ctx_id=0)
+        self.models = {'recognition': rec_model}
+
+    def get(self, img, max_num=0):
+        # No detector loaded: embeddings go through the recognition model directly
+        return []
+
 # --- MODELS INITIALIZATION ---
-def load_models():
-    """Load YOLOv8 face detector and InsightFace ArcFace model"""
+def yolo_detects_faces(yolo_model):
+    """True if the YOLO model's only class is 'face' (Ultralytics models expose .names)"""
+    names = getattr(yolo_model, 'names', None)
+    if isinstance(names, dict):
+        names = list(names.values())
+    return bool(names) and {str(n).lower() for n in names} == {"face"}
+
+def normalize_insightface_modules(modules, face_detector=False):
+    """
+    Validates a module list; recognition is always required for embeddings.
+    The default depends on whether the YOLO model detects faces.
+    """
+    if modules is None:
+        return FACE_DETECTOR_INSIGHTFACE_MODULES if face_detector else DEFAULT_INSIGHTFACE_MODULES
+    modules = tuple(dict.fromkeys(modules))
+    unknown = [m for m in modules if m not in INSIGHTFACE_MODULES]
+    if unknown:
+        raise ValueError(f"Unknown InsightFace modules: {unknown}. Allowed: {list(INSIGHTFACE_MODULES)}")
+    if "recognition" not in modules:
+        raise ValueError("InsightFace module 'recognition' is required")
+    return modules
+
+def load_models(insightface_modules=None, det_size=DEFAULT_DET_SIZE, detector_backend=DEFAULT_DETECTOR_BACKEND,
+                onnx_intra_op_threads=0, onnx_inter_op_threads=0, model_precision=DEFAULT_MODEL_PRECISION,
+                face_detector=False):
+    """
+    Load YOLOv8 detector and InsightFace ArcFace model.
+    face_detector marks the YOLO weights as a face model (also detected from
+    the model's class names); only then are its boxes embedded directly.
+    insightface_modules selects which InsightFace models are loaded (default:
+    recognition only for a face model, else detection + recognition); det_size is the InsightFace detector input size and
+    only matters when 'detection' is loaded. detector_backend picks
+    'ultralytics' (PyTorch) or 'onnx' (onnxruntime with the given thread counts).
+    model_precision 'int8-dynamic' / 'int8-static' loads quantized detector and
+    recognition models (produced on first use).
+    """
     yolo_model = None
     insightface_app = None
+    insightface_modules = normalize_insightface_modules(insightface_modules, face_detector)
     
     try:
         # 1. Load YOLO model
@@ -58,38 +225,48 @@ def load_models():
             print("ERROR: Failed to download any YOLOv8 model")
             return None, None
             
-        yolo_model = YOLO(model_path)
-        print(f"✅ YOLO model loaded from: {model_path}")
+        yolo_model = load_yolo_model(model_path, detector_backend, onnx_intra_op_threads, onnx_inter_op_threads,
+                                     model_precision)
+        print(f"✅ YOLO model loaded from: {model_path} ({detector_backend}, {model_precision})")
+        face_detector = face_detector or yolo_detects_faces(yolo_model)
+        if not face_detector and "detection" not in insightface_modules:
+            print("⚠️ YOLO model is not a face detector but InsightFace 'detection' is not loaded; "
+                  "embeddings will be taken from raw YOLO boxes")
         
         # 2. Try to load InsightFace
         models_dir = os.path.join(_BACKEND_DIR, "models")
+        providers = ['CPUExecutionProvider']
         
         # Try InsightFace 0.7.x API first (with providers), then fall back to 0.2.1 API
         def try_load_insightface(model_name):
             """Try loading InsightFace with different API versions"""
+            _remove_stale_quantized_models(insightface.utils.ensure_available('models', model_name, root=models_dir))
+            if "detection" not in insightface_modules:
+                return RecognitionOnlyApp(model_name, models_dir, providers=providers)
             try:
-                # InsightFace 0.7.x API - supports providers in constructor
+                # InsightFace 0.7.x API - supports providers and allowed_modules in constructor
                 app = insightface.app.FaceAnalysis(
                     name=model_name, 
                     root=models_dir,
-                    providers=['CPUExecutionProvider']
+                    providers=providers,
+                    allowed_modules=list(insightface_modules)
                 )
-                app.prepare(ctx_id=0, det_size=(640, 640))
+                app.prepare(ctx_id=0, det_size=(det_size, det_size))
                 return app
             except TypeError:
                 # InsightFace 0.2.1 API - no providers parameter
                 app = insightface.app.FaceAnalysis(name=model_name, root=models_dir)
-                app.prepare(ctx_id=0, det_size=(640, 640))
+                app.prepare(ctx_id=0, det_size=(det_size, det_size))
                 return app
         
         try:
             insightface_app = try_load_insightface('buffalo_l')
-            print("✅ InsightFace model (buffalo_l) loaded successfully")
+            print(f"✅ InsightFace model (buffalo_l) loaded successfully: {', '.join(insightface_modules)}")
         except Exception as e1:
             print(f"⚠️ InsightFace buffalo_l failed: {e1}")
             try:
                 insightface_app = try_load_insightface('antelopev2')
-                print("✅ InsightFace model (antelopev2) loaded successfully")
+                print(f"✅ InsightFace model (antelopev2) loaded successfully: {', '.join(insightface_modules)}")
             except Exception as e2:
                 print(f"⚠️ InsightFace antelopev2 also failed: {e2}")
                 print("⚠️ InsightFace models will be auto-downloaded on first use (requires internet).")
@@ -97,10 +274,45 @@ def load_models():
                 print("⚠️ If auto-download fails, manually download from: https://github.com/deepinsight/insightface/releases")
                 insightface_app = None
         
+        if insightface_app is not None:
+            # Tells the embedding code whether YOLO boxes can be embedded without finding the face first
+            insightface_app.face_boxes = face_detector
+        
+        if insightface_app is not None and model_precision != "fp32":
+            # Static calibration embeds faculty_db faces through the models just loaded
+            _load_quantized_recognition(yolo_model, insightface_app, model_precision, providers)
+            print(f"✅ InsightFace recognition model switched to {model_precision}")
+        
         return yolo_model, insightface_app
         
     except Exception as e:
         print(f"ERROR loading models: {e}")
         import traceback
         traceback.print_exc()
-        return yolo_model, insightface_app
\ No newline at end of file
+        return yolo_model, insightface_app
+
+# --- MODEL WARM-UP ---
+def warmup_models(yolo_model, insightface_app, image_size=640):
+    """
+    Runs one detection and one embedding on a synthetic image so lazy
+    initialization and ONNX/PyTorch graph optimization happen before the
+    first real request.
+    """
+    from insightface.utils import face_align
+    from .face_detect import detect_faces_yolo
+    from .embeddings import get_face_embeddings_batch, get_detection_model
+
+    image = np.random.default_rng(0).integers(0, 256, (image_size, image_size, 3), dtype=np.uint8)
+    try:
+        detect_faces_yolo(yolo_model, image)
+        if insightface_app is not None:
+            q = image_size // 4
+            det_model = get_detection_model(insightface_app)
+            if det_model is not None:
+                det_model.detect(image, max_num=1)
+            # Template landmarks so the recognition model runs even though the image has no face
+            kps = face_align.arcface_dst * (2 * q / 112.0) + q
+            get_face_embeddings_batch(insightface_app, image, [[q, q, 3 * q, 3 * q]], landmarks=[kps])
+        print("✅ Models warmed up")
+    except Exception as e:
+        print(f"⚠️ Model warm-up failed: {e}")
@@ -0,0 +1,122 @@
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+# Ultralytics predict() defaults, so both backends return the same boxes
+DEFAULT_IOU_THRESHOLD = 0.7
+MAX_DETECTIONS = 300
+LETTERBOX_COLOR = (114, 114, 114)
+
+# --- ONNX RUNTIME YOLO BACKEND ---
+class OnnxYoloDetector:
+    """
+    YOLOv8 detector exported to ONNX and run with onnxruntime.
+    Pre-processing (letterbox), decoding and NMS are done in NumPy; outputs
+    are the same {'bbox', 'confidence'} dicts as face_detect.detect_faces_yolo.
+    """
+
+    def __init__(self, onnx_path, intra_op_threads=0, inter_op_threads=0, input_size=640):
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # 0 lets onnxruntime pick (one thread per physical core)
+        options.intra_op_num_threads = int(intra_op_threads)
+        options.inter_op_num_threads = int(inter_op_threads)
+
+        self.onnx_path = onnx_path
+        self.session = ort.InferenceSession(onnx_path, sess_options=options, providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        batch_dim, _, height, _ = model_input.shape
+        # Dynamic axes are reported as strings / None
+        self.input_size = height if isinstance(height, int) else input_size
+        self.dynamic_batch = not isinstance(batch_dim, int)
+
+    def detect(self, image, conf=0.5, iou=DEFAULT_IOU_THRESHOLD):
+        return self.detect_batch([image], conf=conf, iou=iou)[0]
+
+    def detect_batch(self, images, conf=0.5, iou=DEFAULT_IOU_THRESHOLD):
+        """Runs detection on several images (one session run if the export has a dynamic batch axis)."""
+        if len(images) == 0:
+            return []
+        prepared = [letterbox(image, self.input_size) for image in images]
+
+        if self.dynamic_batch:
+            blob = np.stack([p[0] for p in prepared])
+            outputs = self.session.run(None, {self.input_name: blob})[0]
+        else:
+            outputs = np.concatenate([
+                self.session.run(None, {self.input_name: p[0][None]})[0] for p in prepared
+            ])
+
+        return [
+            self._postprocess(pred, ratio, pad, image.shape[:2], conf, iou)
+            for pred, (_, ratio, pad), image in zip(outputs, prepared, images)
+        ]
+
+    def _postprocess(self, pred, ratio, pad, shape, conf, iou):
+        """Decodes one (4 + classes, anchors) output into face dicts in original image coordinates."""
+        pred = pred.T
+        class_scores = pred[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_scores)), class_ids]
+
+        keep = scores >= conf
+        if not keep.any():
+            return []
+        boxes, scores, class_ids = pred[keep, :4], scores[keep], class_ids[keep]
+
+        # cx, cy, w, h (letterboxed) -> x1, y1, x2, y2 (original image)
+        xyxy = np.empty_like(boxes)
+        xyxy[:, 0] = boxes[:, 0] - boxes[:, 2] / 2
+        xyxy[:, 1] = boxes[:, 1] - boxes[:, 3] / 2
+        xyxy[:, 2] = boxes[:, 0] + boxes[:, 2] / 2
+        xyxy[:, 3] = boxes[:, 1] + boxes[:, 3] / 2
+        xyxy[:, [0, 2]] = (xyxy[:, [0, 2]] - pad[0]) / ratio
+        xyxy[:, [1, 3]] = (xyxy[:, [1, 3]] - pad[1]) / ratio
+        h, w = shape
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, w)
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, h)
+
+        # Per-class NMS via the usual coordinate offset trick
+        offsets = class_ids[:, None].astype(np.float32) * max(h, w)
+        order = nms(xyxy + offsets, scores, iou)[:MAX_DETECTIONS]
+
+        return [
+            {'bbox': list(xyxy[i].astype(int)), 'confidence': float(scores[i])}
+            for i in order
+        ]
+
+def letterbox(image, size):
+    """Resizes keeping aspect ratio and pads to a square; returns CHW float32 RGB blob, scale and padding."""
+    h, w = image.shape[:2]
+    ratio = min(size / h, size / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+    pad_x, pad_y = (size - new_w) / 2, (size - new_h) / 2
+
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR) if (new_w, new_h) != (w, h) else image
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    padded = cv2.copyMakeBorder(resized, top, bottom, left, right, cv2.BORDER_CONSTANT, value=LETTERBOX_COLOR)
+
+    blob = cv2.dnn.blobFromImage(padded, 1.0 / 255.0, swapRB=True)[0]
+    return blob, ratio, (left, top)
+
+def nms(boxes, scores, iou_threshold):
+    """Greedy non-maximum suppression; returns kept indices by descending score."""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        xx1 = np.maximum(x1[i], x1[rest])
+        yy1 = np.maximum(y1[i], y1[rest])
+        xx2 = np.minimum(x2[i], x2[rest])
+        yy2 = np.minimum(y2[i], y2[rest])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        overlap = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[overlap <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
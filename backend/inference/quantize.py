@@ -0,0 +1,293 @@
+"""
+INT8 variants of the YOLO detector and ArcFace recognition ONNX models,
+plus an accuracy/latency benchmark against the FP32 models.
+
+    python -m backend.inference.quantize quantize --precision int8-static
+    python -m backend.inference.quantize benchmark --precision int8-dynamic
+"""
+import os
+import glob
+import time
+import json
+import argparse
+
+import cv2
+import numpy as np
+from onnxruntime.quantization import (
+    CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static
+)
+
+from . import model_loader
+from .onnx_detector import OnnxYoloDetector, letterbox
+from .face_detect import detect_faces_yolo
+from .face_quality import best_aligned_face
+from .embeddings import ARCFACE_INPUT_SIZE
+from ..recognition import faiss_store
+
+QUANTIZED_PRECISIONS = ("int8-dynamic", "int8-static")
+# Quantized variants live here, never next to their FP32 source: FaceAnalysis
+# loads every *.onnx of an InsightFace pack dir and keeps the first model per
+# task, and "w600k_r50.int8-*.onnx" sorts before "w600k_r50.onnx"
+QUANTIZED_DIR = os.path.join(model_loader.INSIGHTFACE_ROOT, "quantized")
+CALIBRATION_IMAGE_LIMIT = 100
+IMAGE_EXTENSIONS = ("*.jpg", "*.jpeg", "*.png")
+
+# --- CALIBRATION DATA ---
+class _BlobCalibrationReader(CalibrationDataReader):
+    """Feeds pre-processed NCHW blobs one by one to the static quantizer."""
+
+    def __init__(self, input_name, blobs):
+        self._items = iter([{input_name: blob[None]} for blob in blobs])
+
+    def get_next(self):
+        return next(self._items, None)
+
+def load_calibration_images(limit=CALIBRATION_IMAGE_LIMIT):
+    """Reads up to `limit` enrollment images from faculty_db."""
+    paths = []
+    for pattern in IMAGE_EXTENSIONS:
+        paths.extend(glob.glob(os.path.join(faiss_store.IMAGES_DIR, pattern)))
+    images = []
+    for path in sorted(paths)[:limit]:
+        image = cv2.imread(path)
+        if image is not None:
+            images.append(image)
+    return images
+
+def _detector_blobs(images, input_size):
+    return [letterbox(image, input_size)[0] for image in images]
+
+def _recognition_normalization(fp32_path):
+    """(input_mean, input_std) InsightFace infers for the FP32 recognition model"""
+    import insightface
+    model = insightface.model_zoo.get_model(fp32_path, providers=['CPUExecutionProvider'])
+    return model.input_mean, model.input_std
+
+def enrollment_crop(yolo_model, insightface_app, image):
+    """
+    The ArcFace input crop production would enroll from an image: the
+    configured detector, then the best-quality aligned crop (as
+    enrollment_embedding picks it). Returns None if no usable face is found.
+    """
+    faces = detect_faces_yolo(yolo_model, image)
+    if not faces:
+        return None
+    return best_aligned_face(insightface_app, image, faces)[0]
+
+def _recognition_blobs(crops, input_mean, input_std):
+    """ArcFace-style blobs of the crops, normalized exactly like the FP32 model's own preprocessing"""
+    return [
+        cv2.dnn.blobFromImage(
+            crop, 1.0 / input_std, (ARCFACE_INPUT_SIZE, ARCFACE_INPUT_SIZE),
+            (input_mean, input_mean, input_mean), swapRB=True
+        )[0]
+        for crop in crops
+    ]
+
+def load_production_models():
+    """
+    FP32 ONNX detector and InsightFace app with the configured modules, for
+    offline calibration and benchmarks outside the server.
+    """
+    from .router import resolve_model_settings
+    settings = resolve_model_settings(detector_backend="onnx", model_precision="fp32")
+    yolo_model, insightface_app = model_loader.load_models(**settings)
+    if yolo_model is None or insightface_app is None:
+        raise RuntimeError("Failed to load the FP32 models")
+    return yolo_model, insightface_app
+
+def _input_name(onnx_path):
+    import onnxruntime as ort
+    return ort.InferenceSession(onnx_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+# --- QUANTIZATION ---
+def quantized_model_path(fp32_path, precision):
+    """
+    models/yolov8s.onnx -> models/quantized/yolov8s.int8-dynamic.onnx
+    models/models/buffalo_l/w600k_r50.onnx -> models/quantized/buffalo_l/w600k_r50.int8-dynamic.onnx
+    """
+    model_dir = os.path.dirname(os.path.abspath(fp32_path))
+    out_dir = QUANTIZED_DIR
+    if model_dir != os.path.abspath(model_loader.INSIGHTFACE_ROOT):
+        out_dir = os.path.join(QUANTIZED_DIR, os.path.basename(model_dir))
+    stem = os.path.splitext(os.path.basename(fp32_path))[0]
+    return os.path.join(out_dir, f"{stem}.{precision}.onnx")
+
+def is_quantized_model(path):
+    """True for files produced by ensure_quantized (or left in a pack dir by older versions)"""
+    name = os.path.basename(path)
+    return any(f".{precision}." in name for precision in QUANTIZED_PRECISIONS)
+
+def ensure_quantized(fp32_path, precision, kind, models=None, input_norm=None):
+    """
+    Returns the path of the quantized variant of an FP32 ONNX model, producing
+    it on first use. kind is 'detector' or 'recognition'; static quantization
+    calibrates on faculty_db images. Recognition calibration uses the crops
+    production embeds (see enrollment_crop), found with models, the loaded
+    (yolo_model, insightface_app) pair (FP32 models are loaded if not given),
+    and normalized with input_norm, the FP32 model's (input_mean, input_std),
+    read from the model if not given.
+    """
+    if precision not in QUANTIZED_PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}'. Allowed: {list(QUANTIZED_PRECISIONS)}")
+    if is_quantized_model(fp32_path):
+        raise ValueError(f"{fp32_path} is already quantized; pass the FP32 model")
+
+    out_path = quantized_model_path(fp32_path, precision)
+    if os.path.exists(out_path) and os.path.getmtime(out_path) >= os.path.getmtime(fp32_path):
+        return out_path
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+
+    if precision == "int8-dynamic":
+        # Weights-only INT8; activations are quantized on the fly, no calibration needed
+        quantize_dynamic(fp32_path, out_path, weight_type=QuantType.QUInt8)
+    else:
+        images = load_calibration_images()
+        if kind == "detector":
+            blobs = _detector_blobs(images, OnnxYoloDetector(fp32_path).input_size)
+        else:
+            yolo_model, insightface_app = models or load_production_models()
+            crops = [enrollment_crop(yolo_model, insightface_app, image) for image in images]
+            input_mean, input_std = input_norm or _recognition_normalization(fp32_path)
+            blobs = _recognition_blobs([crop for crop in crops if crop is not None], input_mean, input_std)
+        if not blobs:
+            raise RuntimeError(f"No calibration data for {kind}: add enrollment images to {faiss_store.IMAGES_DIR}")
+
+        quantize_static(
+            fp32_path, out_path,
+            _BlobCalibrationReader(_input_name(fp32_path), blobs),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True
+        )
+
+    print(f"✅ Quantized {kind} ({precision}): {out_path}")
+    return out_path
+
+# --- BENCHMARK ---
+def _median_ms(samples):
+    return float(np.median(samples) * 1000.0) if samples else 0.0
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def _embed(rec_model, crop):
+    feat = np.asarray(rec_model.get_feat([crop]), dtype='float32')[0]
+    return feat / (np.linalg.norm(feat) + 1e-12)
+
+def benchmark(precision, threshold=0.6, limit=CALIBRATION_IMAGE_LIMIT):
+    """
+    Compares FP32 and quantized models on the faculty_db images / current gallery.
+    Reports median detect/embed latency, embedding cosine drift (FP32 vs INT8
+    embedding of the same crop) and leave-one-out top-1 recall: each image is
+    matched against the gallery without its own row, so only people with at
+    least two enrolled images are used. Both recognizers embed the crop the
+    FP32 production path enrolls (enrollment_crop), so only the model differs.
+    """
+    import insightface
+
+    gallery = faiss_store.get_faculty_gallery()
+    rows = gallery.live_rows()
+    names = [gallery.names[row] for row in rows]
+    matrix = gallery.embeddings[rows]
+    samples = []
+    for position, (row, name) in enumerate(zip(rows, names)):
+        if len(gallery.rows_for_name(name)) < 2:
+            continue
+        image = cv2.imread(os.path.join(faiss_store.IMAGES_DIR, gallery.image_files[row]))
+        if image is not None:
+            samples.append((name, image, position))
+    samples = samples[:limit]
+    if not samples:
+        raise RuntimeError("Benchmark needs faculty with at least two enrolled images in faculty_db")
+
+    yolo_fp32, app = load_production_models()
+    yolo_fp32_path = model_loader.export_yolo_onnx(model_loader.download_yolo_model())
+    detectors = {
+        "fp32": yolo_fp32,
+        precision: OnnxYoloDetector(ensure_quantized(yolo_fp32_path, precision, "detector"))
+    }
+    fp32_path = model_loader.fp32_recognition_path(app)
+    fp32_model = app.models['recognition']
+    if os.path.abspath(fp32_model.model_file) != os.path.abspath(fp32_path):
+        raise RuntimeError(f"FP32 baseline resolved to {fp32_model.model_file}, expected {fp32_path}")
+    input_norm = (fp32_model.input_mean, fp32_model.input_std)
+    quant_model = insightface.model_zoo.get_model(
+        ensure_quantized(fp32_path, precision, "recognition", (yolo_fp32, app), input_norm=input_norm),
+        providers=['CPUExecutionProvider']
+    )
+    # Same normalization as the FP32 model, as in model_loader._load_quantized_recognition
+    quant_model.input_mean, quant_model.input_std = input_norm
+    quant_model.prepare(ctx_id=0)
+    recognizers = {"fp32": fp32_model, precision: quant_model}
+
+    crops = [enrollment_crop(yolo_fp32, app, image) for _, image, _ in samples]
+
+    # Warm both variants so session initialization is not timed
+    for key in detectors:
+        detectors[key].detect(samples[0][1])
+        _embed(recognizers[key], np.zeros((ARCFACE_INPUT_SIZE, ARCFACE_INPUT_SIZE, 3), dtype=np.uint8))
+
+    report = {}
+    reference = {}
+    for key in ("fp32", precision):
+        detect_times, embed_times, hits, similarities = [], [], 0, []
+        for i, ((name, image, row), crop) in enumerate(zip(samples, crops)):
+            _, elapsed = _timed(detectors[key].detect, image)
+            detect_times.append(elapsed)
+            if crop is None:
+                continue
+            embedding, elapsed = _timed(_embed, recognizers[key], crop)
+            embed_times.append(elapsed)
+
+            if key == "fp32":
+                reference[i] = embedding
+            elif i in reference:
+                similarities.append(float(np.dot(embedding, reference[i])))
+
+            # Leave-one-out: the image's own gallery row would always win
+            scores = matrix @ embedding
+            scores[row] = -np.inf
+            best = int(np.argmax(scores))
+            if scores[best] >= threshold and names[best] == name:
+                hits += 1
+
+        report[key] = {
+            "detect_ms_p50": _median_ms(detect_times),
+            "embed_ms_p50": _median_ms(embed_times),
+            "recall_at_1": hits / len(samples)
+        }
+        if key != "fp32":
+            report[key]["embedding_cosine_vs_fp32_mean"] = float(np.mean(similarities)) if similarities else None
+            report[key]["embedding_cosine_vs_fp32_min"] = float(np.min(similarities)) if similarities else None
+
+    fp32, quant = report["fp32"], report[precision]
+    report["summary"] = {
+        "images": len(samples),
+        "detect_speedup": fp32["detect_ms_p50"] / quant["detect_ms_p50"] if quant["detect_ms_p50"] else None,
+        "embed_speedup": fp32["embed_ms_p50"] / quant["embed_ms_p50"] if quant["embed_ms_p50"] else None,
+        "recall_delta": quant["recall_at_1"] - fp32["recall_at_1"]
+    }
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Produce and benchmark INT8 model variants")
+    parser.add_argument("command", choices=["quantize", "benchmark"])
+    parser.add_argument("--precision", choices=QUANTIZED_PRECISIONS, default="int8-dynamic")
+    parser.add_argument("--threshold", type=float, default=0.6)
+    parser.add_argument("--limit", type=int, default=CALIBRATION_IMAGE_LIMIT)
+    args = parser.parse_args()
+
+    if args.command == "quantize":
+        yolo_fp32_path = model_loader.export_yolo_onnx(model_loader.download_yolo_model())
+        ensure_quantized(yolo_fp32_path, args.precision, "detector")
+        yolo_fp32, app = load_production_models()
+        ensure_quantized(model_loader.fp32_recognition_path(app), args.precision, "recognition", (yolo_fp32, app))
+    else:
+        print(json.dumps(benchmark(args.precision, args.threshold, args.limit), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,20 @@
+import os
 import cv2
+import json
+import asyncio
+import threading
 import numpy as np
 import base64
-from fastapi import APIRouter, UploadFile, File, HTTPException, Body
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Body, Request, Query
+from pydantic import BaseModel, ValidationError
 from typing import List, Optional, Any
 
 from . import model_loader
 from . import face_detect
 from . import embeddings
+from .worker_pool import run_inference, get_inference_pool
+from . import batcher
+from ..config.config_store import get_setting, DEFAULT_CONFIG
 
 router = APIRouter()
 
@@ -17,13 +24,36 @@ MODELS = {
     "insightface": None
 }
 
+# Guards model loading so concurrent init calls / first requests load only once
+_models_lock = threading.Lock()
+_loaded_settings = None
+
+MODEL_INIT_MODES = ("lazy", "eager")
+
+# Headers that mark a binary body as raw pixels instead of an encoded image
+FRAME_WIDTH_HEADER = "x-frame-width"
+FRAME_HEIGHT_HEADER = "x-frame-height"
+
 # --- Pydantic Models for Input ---
+class InitModelsPayload(BaseModel):
+    insightface_modules: Optional[List[str]] = None
+    det_size: Optional[int] = None
+    detector_backend: Optional[str] = None
+    model_precision: Optional[str] = None
+    force: bool = False
+
 class ImagePayload(BaseModel):
     image_base64: str
 
 class EmbeddingPayload(BaseModel):
     image_base64: str
     bbox: List[int]
+    landmarks: Optional[List[List[float]]] = None
+
+class BatchEmbeddingPayload(BaseModel):
+    image_base64: str
+    bboxes: List[List[int]]
+    landmarks: Optional[List[Optional[List[List[float]]]]] = None
 
 # --- Helper Functions ---
 def decode_image(image_bytes: bytes) -> np.ndarray:
@@ -34,21 +64,228 @@ def decode_image(image_bytes: bytes) -> np.ndarray:
         raise HTTPException(status_code=400, detail="Invalid image data")
     return img
 
-def parse_image_input(file: Optional[UploadFile], payload: Optional[ImagePayload]) -> np.ndarray:
-    """Handles both File upload and Base64 JSON input"""
-    if file:
-        return decode_image(file.file.read())
-    elif payload and payload.image_base64:
+async def read_image_request(request: Request) -> bytes:
+    """
+    Reads an image request: JSON {"image_base64"} or a multipart form with
+    "file". Branches on content-type by hand (see parse_face_request).
+    Returns the image bytes; decoding is left to the inference pool.
+    """
+    if request.headers.get("content-type", "").startswith("application/json"):
         try:
-            image_bytes = base64.b64decode(payload.image_base64)
-            return decode_image(image_bytes)
-        except Exception:
+            payload = ImagePayload(**await request.json())
+        except (ValueError, TypeError, ValidationError) as e:
+            raise HTTPException(status_code=422, detail=f"Invalid payload: {e}")
+        try:
+            return base64.b64decode(payload.image_base64)
+        except (ValueError, TypeError):
             raise HTTPException(status_code=400, detail="Invalid base64 string")
-    else:
+
+    upload = (await request.form()).get("file")
+    if not hasattr(upload, "read"):
         raise HTTPException(status_code=400, detail="No image provided. Send file or base64.")
+    return await upload.read()
+
+def _is_number_list(value, length):
+    return (isinstance(value, list) and len(value) == length
+            and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value))
+
+def _is_landmarks(value):
+    """5 (x, y) points, or None"""
+    return value is None or (isinstance(value, list) and len(value) == 5
+                             and all(_is_number_list(point, 2) for point in value))
+
+def validate_face_boxes(boxes, landmarks, boxes_field: str):
+    """
+    Checks the shapes of client-supplied boxes and landmarks before they
+    reach the inference pool, where a bad shape would surface as a 500.
+    "bbox" is one [x1, y1, x2, y2] with one landmark set; "bboxes" is a list
+    of them with an optional list of per-box landmark sets (entries may be null).
+    """
+    if boxes_field == "bbox":
+        if not _is_number_list(boxes, 4):
+            raise HTTPException(status_code=400, detail="Invalid bbox. Expected [x1, y1, x2, y2].")
+        if not _is_landmarks(landmarks):
+            raise HTTPException(status_code=400, detail="Invalid landmarks. Expected 5 [x, y] points or null.")
+        return
+
+    if not isinstance(boxes, list) or not all(_is_number_list(box, 4) for box in boxes):
+        raise HTTPException(status_code=400, detail=f"Invalid {boxes_field}. Expected [[x1, y1, x2, y2], ...].")
+    if landmarks is not None and not (isinstance(landmarks, list) and len(landmarks) == len(boxes)
+                                      and all(_is_landmarks(points) for points in landmarks)):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid landmarks. Expected one set of 5 [x, y] points (or null) per entry in {boxes_field}."
+        )
+
+async def parse_face_request(request: Request, payload_model, boxes_field: str):
+    """
+    Reads an embedding request: JSON matching payload_model (image_base64,
+    boxes_field, landmarks), or a multipart form with "file", boxes_field as
+    a JSON string and an optional JSON "landmarks" field.
+    Branches on content-type by hand: declaring File() and Body() parameters
+    together makes FastAPI parse every request as a form, so a JSON body would
+    never be read. Returns (image bytes, boxes, landmarks); decoding is left
+    to the inference pool.
+    """
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            payload = payload_model(**await request.json())
+        except (ValueError, TypeError, ValidationError) as e:
+            raise HTTPException(status_code=422, detail=f"Invalid payload: {e}")
+        try:
+            image_bytes = base64.b64decode(payload.image_base64)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid base64 string")
+        boxes, landmarks = getattr(payload, boxes_field), payload.landmarks
+        validate_face_boxes(boxes, landmarks, boxes_field)
+        return image_bytes, boxes, landmarks
+
+    form = await request.form()
+    upload = form.get("file")
+    if not hasattr(upload, "read"):
+        raise HTTPException(status_code=400, detail="No input provided")
+    try:
+        boxes = json.loads(form.get(boxes_field))
+        landmarks = json.loads(form["landmarks"]) if form.get("landmarks") else None
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Invalid {boxes_field} or landmarks format. Expected JSON arrays.")
+    validate_face_boxes(boxes, landmarks, boxes_field)
+    return await upload.read(), boxes, landmarks
+
+def frame_size_from_headers(request: Request):
+    """Returns (width, height) from the raw-frame headers, or (None, None) for encoded images"""
+    width = request.headers.get(FRAME_WIDTH_HEADER)
+    height = request.headers.get(FRAME_HEIGHT_HEADER)
+    if width is None and height is None:
+        return None, None
+    try:
+        width, height = int(width), int(height)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="X-Frame-Width and X-Frame-Height must both be integers")
+    if width <= 0 or height <= 0:
+        raise HTTPException(status_code=400, detail="Frame dimensions must be positive")
+    return width, height
+
+def decode_frame(body: bytes, width: Optional[int] = None, height: Optional[int] = None) -> np.ndarray:
+    """
+    Decodes a binary request body: raw BGR pixels when width/height are given
+    (a read-only view over the body, no copy), otherwise JPEG/PNG bytes.
+    """
+    if width is None:
+        return decode_image(body)
+    if len(body) != width * height * 3:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Raw BGR frame must be {width}x{height}x3 = {width * height * 3} bytes, got {len(body)}"
+        )
+    return np.frombuffer(body, np.uint8).reshape(height, width, 3)
+
+def downscale_to_max_side(image: np.ndarray, max_side: Optional[int]):
+    """Shrinks image so its longer side is at most max_side; returns (image, scale)"""
+    h, w = image.shape[:2]
+    if not max_side or max(h, w) <= max_side:
+        return image, 1.0
+    scale = max_side / float(max(h, w))
+    resized = cv2.resize(image, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+    return resized, scale
+
+def rescale_faces(faces, scale):
+    """Maps boxes/landmarks detected on a downscaled image back to original coordinates"""
+    if scale == 1.0:
+        return faces
+    for face in faces:
+        face['bbox'] = [int(round(c / scale)) for c in face['bbox']]
+        if 'landmarks' in face:
+            face['landmarks'] = [[x / scale, y / scale] for x, y in face['landmarks']]
+    return faces
+
+def serialize_faces(faces):
+    """Converts numpy types to python native types for JSON serialization"""
+    serializable_faces = []
+    for face in faces:
+        item = {
+            "bbox": [int(c) for c in face['bbox']],
+            "confidence": float(face['confidence'])
+        }
+        if 'landmarks' in face:
+            item["landmarks"] = face['landmarks']
+        serializable_faces.append(item)
+    return serializable_faces
+
+# --- Model Initialization ---
+def get_model_init_mode():
+    """'eager' (load at startup) or 'lazy' (load on first use); env MODEL_INIT_MODE overrides config"""
+    mode = os.environ.get("MODEL_INIT_MODE") or get_setting("model_init_mode")
+    mode = str(mode).lower()
+    return mode if mode in MODEL_INIT_MODES else DEFAULT_CONFIG["model_init_mode"]
+
+def _warmup_enabled():
+    env = os.environ.get("MODEL_WARMUP")
+    if env is not None:
+        return env.lower() not in ("0", "false", "no")
+    return bool(get_setting("model_warmup"))
+
+def resolve_model_settings(insightface_modules=None, det_size=None, detector_backend=None, model_precision=None):
+    """Fills unset model settings from system config; raises ValueError on bad values"""
+    detector_backend = detector_backend or get_setting("detector_backend")
+    if detector_backend not in model_loader.DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown detector backend '{detector_backend}'. Allowed: {list(model_loader.DETECTOR_BACKENDS)}")
+
+    model_precision = model_precision or get_setting("model_precision")
+    if model_precision not in model_loader.MODEL_PRECISIONS:
+        raise ValueError(f"Unknown model precision '{model_precision}'. Allowed: {list(model_loader.MODEL_PRECISIONS)}")
+    if model_precision != "fp32" and detector_backend != "onnx":
+        raise ValueError(f"Model precision '{model_precision}' requires detector_backend 'onnx'")
+
+    face_detector = bool(get_setting("detector_face_model"))
+    return {
+        "insightface_modules": model_loader.normalize_insightface_modules(
+            insightface_modules or get_setting("insightface_modules"), face_detector
+        ),
+        "det_size": int(det_size or get_setting("det_size")),
+        "detector_backend": detector_backend,
+        "onnx_intra_op_threads": int(get_setting("onnx_intra_op_threads")),
+        "onnx_inter_op_threads": int(get_setting("onnx_inter_op_threads")),
+        "model_precision": model_precision,
+        "face_detector": face_detector
+    }
+
+def initialize_models(insightface_modules=None, det_size=None, detector_backend=None, model_precision=None,
+                      force=False):
+    """
+    Loads (and optionally warms up) the models into MODELS. Thread-safe: callers
+    racing here wait for a single load. Models already loaded with the same
+    settings are reused unless force=True. Returns the settings in effect.
+    """
+    global _loaded_settings
+    settings = resolve_model_settings(insightface_modules, det_size, detector_backend, model_precision)
+
+    with _models_lock:
+        if not force and MODELS["yolo"] is not None and _loaded_settings == settings:
+            return settings
+
+        yolo, insightface_app = model_loader.load_models(**settings)
+        if yolo is None:
+            raise RuntimeError("Failed to load YOLO model")
+
+        if _warmup_enabled():
+            model_loader.warmup_models(yolo, insightface_app)
+
+        MODELS["yolo"] = yolo
+        MODELS["insightface"] = insightface_app  # May be None if InsightFace models unavailable
+        _loaded_settings = settings
+        return settings
 
 def ensure_models_loaded(require_insightface=False):
-    """Ensure YOLO model is loaded. InsightFace is optional unless require_insightface=True."""
+    """
+    Ensure YOLO model is loaded. InsightFace is optional unless require_insightface=True.
+    In lazy mode the first caller loads the models (others wait on the lock).
+    """
+    if MODELS["yolo"] is None and get_model_init_mode() == "lazy":
+        try:
+            initialize_models()
+        except (RuntimeError, ValueError) as e:
+            raise HTTPException(status_code=503, detail=f"Model initialization failed: {e}")
     if MODELS["yolo"] is None:
         raise HTTPException(status_code=503, detail="Models not initialized. Call /init-models first.")
     if require_insightface and MODELS["insightface"] is None:
@@ -57,68 +294,183 @@ def ensure_models_loaded(require_insightface=False):
 # --- Endpoints ---
 
 @router.post("/init-models")
-async def init_models():
-    """Initialize models globally"""
-    yolo, insightface_app = model_loader.load_models()
-    if yolo is None:
-        raise HTTPException(status_code=500, detail="Failed to load YOLO model")
-    
-    MODELS["yolo"] = yolo
-    MODELS["insightface"] = insightface_app  # May be None if InsightFace models unavailable
+async def init_models(payload: Optional[InitModelsPayload] = Body(None)):
+    """
+    Initialize models globally.
+    InsightFace modules and detector size come from the payload, else from system config.
+    """
+    payload = payload or InitModelsPayload()
+    try:
+        # Load off the event loop; concurrent calls share a single load
+        settings = await asyncio.to_thread(
+            initialize_models, payload.insightface_modules, payload.det_size,
+            payload.detector_backend, payload.model_precision, payload.force
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
     
-    if insightface_app is None:
+    if MODELS["insightface"] is None:
         return {"status": "partial", "message": "YOLO loaded. InsightFace unavailable - face recognition limited."}
-    return {"status": "success", "message": "All models loaded successfully"}
+    return {
+        "status": "success",
+        "message": "All models loaded successfully",
+        "insightface_modules": list(settings["insightface_modules"]),
+        "det_size": settings["det_size"],
+        "detector_backend": settings["detector_backend"],
+        "model_precision": settings["model_precision"]
+    }
 
 @router.post("/detect-faces")
-async def detect_faces(
-    file: Optional[UploadFile] = File(None),
-    payload: Optional[ImagePayload] = Body(None)
-):
-    """Detect faces in an image"""
-    ensure_models_loaded()
-    image = parse_image_input(file, payload)
-    
-    faces = face_detect.detect_faces_yolo(MODELS["yolo"], image)
-    
-    # Convert numpy types to python native types for JSON serialization
-    serializable_faces = []
-    for face in faces:
-        serializable_faces.append({
-            "bbox": [int(c) for c in face['bbox']],
-            "confidence": float(face['confidence'])
-        })
-        
-    return {"faces": serializable_faces}
+async def detect_faces(request: Request):
+    """
+    Detect faces in an image.
+    Body is JSON {"image_base64"} or multipart with "file".
+    """
+    image_bytes = await read_image_request(request)
 
-@router.post("/extract-embedding")
-async def extract_embedding(
-    file: Optional[UploadFile] = File(None),
-    bbox: Optional[str] = Body(None), # If using form-data, bbox comes as string
-    payload: Optional[EmbeddingPayload] = Body(None)
-):
-    """Extract embedding for a specific face bbox"""
-    ensure_models_loaded()
+    if batcher.batching_enabled():
+        # Decode in the pool, then join the micro-batch for a shared YOLO run
+        def _decode():
+            ensure_models_loaded()
+            return decode_image(image_bytes)
+
+        image = await run_inference(_decode)
+        faces = await batcher.get_detection_batcher(lambda: MODELS["yolo"]).detect(image)
+    else:
+        def _detect():
+            ensure_models_loaded()
+            image = decode_image(image_bytes)
+            return face_detect.detect_faces_yolo(MODELS["yolo"], image)
+
+        # Decode + YOLO run in the bounded inference pool, not on the event loop
+        faces = await run_inference(_detect)
     
-    # 1. Parse Image
-    if payload:
-        image = parse_image_input(None, payload)
-        target_bbox = payload.bbox
-    elif file:
-        image = parse_image_input(file, None)
-        # Parse bbox from form string "[x1, y1, x2, y2]"
-        try:
-            import json
-            target_bbox = json.loads(bbox)
-        except (json.JSONDecodeError, TypeError, ValueError):
-            raise HTTPException(status_code=400, detail="Invalid bbox format. Expected JSON array.")
+    return {"faces": serialize_faces(faces)}
+
+@router.post("/detect-faces/raw")
+async def detect_faces_raw(request: Request, max_side: Optional[int] = Query(None, ge=1)):
+    """
+    Detect faces in a binary body (application/octet-stream, image/jpeg, image/png):
+    encoded image bytes, or raw BGR pixels when X-Frame-Width / X-Frame-Height
+    are set. No multipart or base64 overhead.
+    max_side downscales large frames before detection; returned boxes and
+    landmarks are in original-frame coordinates.
+    """
+    width, height = frame_size_from_headers(request)
+    body = await request.body()
+    if not body:
+        raise HTTPException(status_code=400, detail="Empty request body")
+
+    def _decode():
+        ensure_models_loaded()
+        return downscale_to_max_side(decode_frame(body, width, height), max_side)
+
+    if batcher.batching_enabled():
+        image, scale = await run_inference(_decode)
+        faces = await batcher.get_detection_batcher(lambda: MODELS["yolo"]).detect(image)
     else:
-        raise HTTPException(status_code=400, detail="No input provided")
+        def _detect():
+            image, scale = _decode()
+            return face_detect.detect_faces_yolo(MODELS["yolo"], image), scale
+
+        faces, scale = await run_inference(_detect)
+
+    return {"faces": serialize_faces(rescale_faces(faces, scale))}
 
-    # 2. Extract Embedding
-    embedding = embeddings.get_face_embedding(MODELS["insightface"], image, target_bbox)
+@router.post("/extract-embedding")
+async def extract_embedding(request: Request):
+    """
+    Extract embedding for a specific face bbox.
+    Body is JSON {"image_base64", "bbox", "landmarks"} or multipart with
+    "file", "bbox" as a JSON array string and optional "landmarks".
+    """
+    # 1. Parse Inputs
+    image_bytes, target_bbox, landmarks = await parse_face_request(request, EmbeddingPayload, "bbox")
+
+    # 2. Decode + Extract Embedding in the inference pool
+    def _embed():
+        ensure_models_loaded(require_insightface=True)
+        image = decode_image(image_bytes)
+        return embeddings.get_face_embedding(MODELS["insightface"], image, target_bbox, landmarks=landmarks)
+
+    embedding = await run_inference(_embed)
     
     if embedding is None:
         return {"embedding": None, "message": "Face too small or not detected in crop"}
         
-    return {"embedding": embedding.tolist()}
\ No newline at end of file
+    return {"embedding": embedding.tolist()}
+
+@router.post("/extract-embeddings")
+async def extract_embeddings(request: Request):
+    """
+    Extract embeddings for all given face bboxes of one image in a single batch.
+    Body is JSON {"image_base64", "bboxes", "landmarks"} or multipart with
+    "file", "bboxes" as a JSON string "[[x1, y1, x2, y2], ...]" and optional "landmarks".
+    """
+    # 1. Parse Inputs
+    image_bytes, target_bboxes, landmarks = await parse_face_request(request, BatchEmbeddingPayload, "bboxes")
+
+    # 2. Decode + extract all embeddings in one forward pass, in the inference pool
+    def _embed_batch():
+        ensure_models_loaded(require_insightface=True)
+        image = decode_image(image_bytes)
+        return embeddings.get_face_embeddings_batch(
+            MODELS["insightface"], image, target_bboxes, landmarks=landmarks
+        )
+
+    results = await run_inference(_embed_batch)
+
+    return {
+        "embeddings": [e.tolist() if e is not None else None for e in results]
+    }
+
+@router.post("/extract-embeddings/raw")
+async def extract_embeddings_raw(request: Request, bboxes: str):
+    """
+    Extract embeddings from a binary body (encoded image, or raw BGR with
+    X-Frame-Width / X-Frame-Height) for the bboxes given as a JSON array in
+    the query string, e.g. ?bboxes=[[x1,y1,x2,y2],...].
+    """
+    try:
+        target_bboxes = json.loads(bboxes)
+    except (json.JSONDecodeError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid bboxes format. Expected JSON array of arrays.")
+    validate_face_boxes(target_bboxes, None, "bboxes")
+
+    width, height = frame_size_from_headers(request)
+    body = await request.body()
+    if not body:
+        raise HTTPException(status_code=400, detail="Empty request body")
+
+    def _embed_batch():
+        ensure_models_loaded(require_insightface=True)
+        image = decode_frame(body, width, height)
+        return embeddings.get_face_embeddings_batch(MODELS["insightface"], image, target_bboxes)
+
+    results = await run_inference(_embed_batch)
+
+    return {
+        "embeddings": [e.tolist() if e is not None else None for e in results]
+    }
+
+@router.get("/pool")
+async def inference_pool_status():
+    """Current size and queue depth of the inference worker pool"""
+    return get_inference_pool().stats()
+
+@router.get("/metrics")
+async def inference_metrics():
+    """
+    Worker pool stats plus detect micro-batching metrics (batch size, queue
+    wait, batch latency). Each detect batch is one pool job, so it shows up
+    in the pool's pending count like any other inference.
+    """
+    return {
+        "pool": get_inference_pool().stats(),
+        "detect_batching": {
+            "enabled": batcher.batching_enabled(),
+            "metrics": batcher.get_batcher_metrics()
+        }
+    }
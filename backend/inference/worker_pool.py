@@ -0,0 +1,104 @@
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from fastapi import HTTPException
+
+from ..config.config_store import load_config, DEFAULT_CONFIG
+
+# Seconds a client should wait before retrying when the pool is saturated
+RETRY_AFTER_SECONDS = 1
+
+class PoolSaturatedError(Exception):
+    """Raised when the inference queue is full."""
+
+# --- BOUNDED INFERENCE POOL ---
+class InferencePool:
+    """
+    Thread pool for CPU-bound inference (YOLO / ONNX Runtime release the GIL)
+    with a cap on jobs running + waiting, so overload is rejected up front
+    instead of piling up behind the event loop.
+    """
+
+    def __init__(self, max_workers, max_pending):
+        self.max_workers = max_workers
+        self.max_pending = max(max_pending, max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """Submits a job; raises PoolSaturatedError if the queue is full."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise PoolSaturatedError()
+            self._pending += 1
+
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except RuntimeError:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn, *args, **kwargs):
+        """Runs fn in the pool and awaits it; answers 503 + Retry-After when saturated."""
+        try:
+            future = self.submit(fn, *args, **kwargs)
+        except PoolSaturatedError:
+            raise HTTPException(
+                status_code=503,
+                detail="Inference queue is full. Retry later.",
+                headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+            )
+        return await asyncio.wrap_future(future)
+
+    def stats(self):
+        return {
+            "workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending
+        }
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _setting(env_name, config_key):
+    value = os.environ.get(env_name)
+    if value is None:
+        value = load_config().get(config_key, DEFAULT_CONFIG[config_key])
+    return int(value)
+
+def get_inference_pool():
+    """Returns the process-wide pool, sized from env (INFERENCE_WORKERS / INFERENCE_QUEUE_LIMIT) or config."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = _setting("INFERENCE_WORKERS", "inference_workers") or min(4, os.cpu_count() or 1)
+                queue_limit = _setting("INFERENCE_QUEUE_LIMIT", "inference_queue_limit")
+                _pool = InferencePool(workers, queue_limit)
+    return _pool
+
+async def run_inference(fn, *args, **kwargs):
+    """Shortcut for get_inference_pool().run(...)"""
+    return await get_inference_pool().run(fn, *args, **kwargs)
+
+def run_inference_blocking(fn, *args, timeout=None, **kwargs):
+    """
+    Runs fn in the pool and waits for it, for plain worker threads (never call
+    it from a pool thread). Raises PoolSaturatedError if the queue is full and
+    concurrent.futures.TimeoutError (after cancelling the job) on timeout.
+    """
+    future = get_inference_pool().submit(fn, *args, **kwargs)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        raise
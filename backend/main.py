@@ -1,21 +1,38 @@
 # main.py
 
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 # --- Import Routers from All Microservices ---
-from .inference.router import router as inference_router
+from .inference.router import router as inference_router, get_model_init_mode, initialize_models
 from .recognition.router import router as recognition_router
 from .attendance.router import router as attendance_router
 from .config.router import router as config_router
 from .notification.router import router as notification_router
 
 
+# --- Startup: Model Initialization ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # "eager": load (and warm up) models before serving, in a worker thread so the
+    # event loop stays free. "lazy": the first request needing a model loads it.
+    if get_model_init_mode() == "eager":
+        try:
+            await asyncio.to_thread(initialize_models)
+        except (RuntimeError, ValueError) as e:
+            print(f"ERROR: Eager model initialization failed: {e}")
+    yield
+
+
 # --- Create FastAPI App ---
 app = FastAPI(
     title="Faculty Presence Detection Backend",
     version="1.0.0",
-    description="Modular AI-powered smart attendance backend with microservice architecture."
+    description="Modular AI-powered smart attendance backend with microservice architecture.",
+    lifespan=lifespan
 )
 
 # --- CORS Middleware (Allow React / Streamlit / Mobile Apps / Deployment) ---
@@ -0,0 +1,247 @@
+import os
+import io
+import time
+import uuid
+import zipfile
+import threading
+
+import cv2
+import numpy as np
+
+from . import faiss_store
+from .faculty_manager import enrollment_embedding
+from ..inference.face_detect import detect_faces_yolo_batch
+from ..inference.worker_pool import run_inference_blocking, PoolSaturatedError, RETRY_AFTER_SECONDS
+from ..config.config_store import get_setting
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+BULK_MAX_ITEMS = 2000
+BULK_MAX_BYTES = 512 * 1024 * 1024   # uncompressed total, guards against zip bombs
+BULK_DETECT_BATCH = 16               # images per YOLO call
+# Server directory /faculty/bulk-add-directory may read from; unset disables it.
+# Environment only, so API clients (e.g. via PUT /config) can't widen it.
+BULK_IMPORT_ROOT_ENV = "BULK_IMPORT_ROOT"
+
+# One bulk job (enrollment or re-embedding) at a time; others wait for it
+_bulk_job_lock = threading.Lock()
+
+# --- INPUT COLLECTION ---
+def name_from_path(path):
+    """'Jane Doe/1.jpg' -> 'Jane Doe' (folder per person), 'Jane Doe.jpg' -> 'Jane Doe'"""
+    parent = os.path.basename(os.path.dirname(path.replace("\\", "/")))
+    if parent:
+        return parent
+    return os.path.splitext(os.path.basename(path))[0]
+
+def _is_image(path):
+    return path.lower().endswith(IMAGE_EXTENSIONS) and not os.path.basename(path).startswith(".")
+
+def items_from_zip(data):
+    """Reads (name, image bytes, source) items from a zip archive without extracting it"""
+    items, total = [], 0
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not _is_image(info.filename) or "__MACOSX" in info.filename:
+                continue
+            total += info.file_size
+            if len(items) >= BULK_MAX_ITEMS or total > BULK_MAX_BYTES:
+                raise ValueError(f"Archive exceeds {BULK_MAX_ITEMS} images or {BULK_MAX_BYTES // (1024 * 1024)} MB")
+            items.append({
+                'name': name_from_path(info.filename),
+                'data': archive.read(info),
+                'source': info.filename
+            })
+    return items
+
+def resolve_import_directory(directory):
+    """
+    Resolves a client-supplied directory inside the BULK_IMPORT_ROOT import
+    root (relative paths are taken from the root). Raises PermissionError if
+    directory import is disabled or the path, symlinks resolved, leaves the root.
+    """
+    root = os.environ.get(BULK_IMPORT_ROOT_ENV)
+    if not root:
+        raise PermissionError(f"Directory import is disabled; set {BULK_IMPORT_ROOT_ENV} to enable it")
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, directory))
+    if os.path.commonpath([root, path]) != root:
+        raise PermissionError(f"Directory must be inside the import root ({BULK_IMPORT_ROOT_ENV})")
+    return path
+
+def items_from_directory(directory):
+    """Reads (name, image bytes, source) items from a directory tree on the server"""
+    if not os.path.isdir(directory):
+        raise ValueError(f"Directory not found: {directory}")
+    items = []
+    for root, _, files in os.walk(directory):
+        for filename in sorted(files):
+            # Symlinked files could point outside the tree being imported
+            if not _is_image(filename) or os.path.islink(os.path.join(root, filename)):
+                continue
+            if len(items) >= BULK_MAX_ITEMS:
+                raise ValueError(f"Directory exceeds {BULK_MAX_ITEMS} images")
+            path = os.path.join(root, filename)
+            with open(path, "rb") as f:
+                items.append({
+                    'name': name_from_path(os.path.relpath(path, directory)),
+                    'data': f.read(),
+                    'source': path
+                })
+    return items
+
+# --- ENROLLMENT ---
+def _decode(item):
+    data = item.get('data')
+    if data is None:
+        # Stored images (re-embedding) are read here so only one chunk is in memory
+        try:
+            with open(item['path'], "rb") as f:
+                data = f.read()
+        except (IOError, OSError) as e:
+            item['error'], item['image'] = f"Could not read image: {e}", None
+            return item
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        item['error'] = "Could not decode image"
+    item['image'] = image
+    return item
+
+def _embed(insightface_app, item, min_quality):
+    embedding, error = enrollment_embedding(insightface_app, item['image'], item['faces'], min_quality)
+    item['embedding'], item['error'] = embedding, error
+    # The decoded frame is no longer needed; free it before the commit step
+    item['image'] = None
+    return item
+
+def _process_chunk(yolo_model, insightface_app, chunk, min_quality):
+    chunk = [item for item in map(_decode, chunk) if item['error'] is None]
+    for item, faces in zip(chunk, detect_faces_yolo_batch(yolo_model, [i['image'] for i in chunk])):
+        item['faces'] = faces
+    for item in chunk:
+        _embed(insightface_app, item, min_quality)
+
+def _process_items(yolo_model, insightface_app, pending, min_quality):
+    """
+    Decodes, detects (batched) and embeds items in place, setting 'embedding'
+    or 'error'. Each chunk is one job of the shared inference pool, so a bulk
+    job holds at most one pool slot and backs off while live requests fill
+    the queue. Chunked so only BULK_DETECT_BATCH decoded images are held in
+    memory at a time.
+    """
+    for start in range(0, len(pending), BULK_DETECT_BATCH):
+        chunk = pending[start:start + BULK_DETECT_BATCH]
+        while True:
+            try:
+                run_inference_blocking(_process_chunk, yolo_model, insightface_app, chunk, min_quality)
+                break
+            except PoolSaturatedError:
+                time.sleep(RETRY_AFTER_SECONDS)
+
+def add_faculty_bulk(yolo_model, insightface_app, items):
+    """
+    Enrolls many (name, image bytes) items: decode, detect in batches and
+    embed in the inference pool, then commit every success to the gallery
+    with one index update and one save. Returns a per-item report.
+    """
+    min_quality = get_setting("min_face_quality")
+    for item in items:
+        item['error'] = None if item.get('name') else "Name is required"
+
+    with _bulk_job_lock:
+        _process_items(yolo_model, insightface_app, [item for item in items if item['error'] is None], min_quality)
+
+        accepted = [item for item in items if item['error'] is None]
+        if accepted and not _commit(accepted):
+            for item in accepted:
+                item['error'] = "Failed to save to database"
+
+    report = [
+        {
+            'source': item.get('source'),
+            'name': item.get('name'),
+            'status': "added" if item['error'] is None else "failed",
+            'message': item['error'] or "Faculty member added successfully"
+        }
+        for item in items
+    ]
+    return {
+        'added': sum(1 for r in report if r['status'] == "added"),
+        'failed': sum(1 for r in report if r['status'] == "failed"),
+        'items': report
+    }
+
+def _commit(accepted):
+    """Writes the images and adds all embeddings in a single database update"""
+    written = []
+    with faiss_store.write_lock:
+        try:
+            for item in accepted:
+                extension = os.path.splitext(item.get('source') or "")[1].lower() or ".jpg"
+                filename = f"{uuid.uuid4().hex}{extension}"
+                faiss_store.save_image_file(filename, item['data'])
+                written.append(filename)
+        except (IOError, OSError) as e:
+            print(f"Error: Failed to store enrollment images: {e}")
+            _remove_images(written)
+            return False
+
+        embeddings = np.stack([item['embedding'] for item in accepted])
+        if faiss_store.add_faculty_rows([item['name'] for item in accepted], written, embeddings) is not None:
+            return True
+        _remove_images(written)
+        return False
+
+def reembed_gallery(yolo_model, insightface_app):
+    """
+    Recomputes every stored embedding from its faculty_db image with the
+    current detection/crop/recognition pipeline (e.g. after migrating a
+    legacy pickle or changing models) and rebuilds the index once.
+    Rows whose image is missing or has no usable face keep their old vector.
+    The images are embedded without holding write_lock, so enrollments
+    continue meanwhile; only the final rebuild and save take it.
+    """
+    with _bulk_job_lock:
+        gallery = faiss_store.get_faculty_gallery()
+        items = [
+            {
+                'id': int(gallery.ids[row]),
+                'name': gallery.names[row],
+                'source': gallery.image_files[row],
+                'path': os.path.join(faiss_store.IMAGES_DIR, gallery.image_files[row]),
+                'error': None
+            }
+            for row in gallery.live_rows()
+        ]
+        # Quality gating is for new enrollments; keep whichever face is best here
+        _process_items(yolo_model, insightface_app, items, min_quality=0.0)
+        fresh = {item['id']: item['embedding'] for item in items if item['error'] is None}
+
+        with faiss_store.write_lock:
+            # Rows deleted meanwhile are gone; rows enrolled meanwhile already use the current models
+            faculty_data, _ = faiss_store.gallery_for_update().compacted()
+            positions = [i for i, faculty_id in enumerate(faculty_data['ids']) if faculty_id in fresh]
+            if positions:
+                embeddings = np.array(faculty_data['embeddings'], dtype='float32')
+                embeddings[positions] = faiss_store.normalize_embeddings(
+                    np.stack([fresh[faculty_data['ids'][i]] for i in positions])
+                )
+                faculty_data['embeddings'] = embeddings
+                index = faiss_store.build_faiss_index(embeddings, faculty_data['ids'])
+                if not faiss_store.save_faculty_database(faculty_data, index):
+                    raise RuntimeError("Failed to save re-embedded database")
+
+    return {
+        'updated': len(positions),
+        'kept': sum(1 for item in items if item['error'] is not None),
+        'items': [
+            {'source': item['source'], 'name': item['name'], 'message': item['error']}
+            for item in items if item['error'] is not None
+        ]
+    }
+
+def _remove_images(filenames):
+    for filename in filenames:
+        try:
+            os.remove(os.path.join(faiss_store.IMAGES_DIR, filename))
+        except OSError:
+            pass
@@ -1,133 +1,232 @@
 import os
-import cv2
 import numpy as np
-import faiss
 
 # Import storage functions
 from . import faiss_store
 # Import inference logic from the sibling module
 from ..inference.face_detect import detect_faces_yolo
-from ..inference.embeddings import get_face_embedding
+from ..inference.embeddings import (
+    get_face_embeddings_batch, get_recognition_model, embed_face_crops, trusts_face_boxes
+)
+from ..inference.face_quality import annotate_quality, best_aligned_face
+from ..config.config_store import get_setting
 
-def add_faculty_member(yolo_model, insightface_app, image_path, name, image_filename):
-    """Add a new faculty member to the database"""
+# How per-row similarities are combined into one score per faculty member
+MATCH_AGGREGATIONS = ("max", "mean", "centroid")
+# Rows retrieved from the index before aggregating by identity
+MATCH_CANDIDATES = 32
+
+def enrollment_embedding(insightface_app, image, faces, min_quality=None):
+    """
+    Picks the face to enroll from an image's detections and embeds it.
+    Returns (embedding, None) or (None, reason).
+    """
+    if len(faces) == 0:
+        return None, "No face detected"
+    
+    if min_quality is None:
+        min_quality = get_setting("min_face_quality")
+    if get_recognition_model(insightface_app) is None:
+        # Old InsightFace API: no aligned crops to score, fall back to the detector boxes
+        annotate_quality(image, faces, trusts_face_boxes(insightface_app))
+        best_face = max(faces, key=lambda x: x['quality'])
+        if best_face['quality'] < min_quality:
+            return None, f"Face image quality too low ({best_face['quality']:.2f} < {min_quality})"
+        embedding = get_face_embeddings_batch(insightface_app, image, [best_face['bbox']])[0]
+        if embedding is None:
+            return None, "Failed to extract face embedding"
+        return embedding, None
+
+    # Enroll the sharpest, best-exposed, most frontal face rather than the most confident box,
+    # scored on the same aligned crop the attendance engine embeds (not on a raw YOLO box)
+    crop, quality = best_aligned_face(insightface_app, image, faces)
+    if crop is None:
+        return None, "Failed to extract face embedding"
+    if quality < min_quality:
+        return None, f"Face image quality too low ({quality:.2f} < {min_quality})"
+    return embed_face_crops(insightface_app, [crop])[0], None
+
+def add_faculty_member(yolo_model, insightface_app, image, name, image_filename, existing_only=False):
+    """
+    Add a faculty member to the database from a decoded BGR image.
+    image_filename is recorded for the original upload, which the caller
+    stores only after this succeeds. Enrolling an existing name adds
+    another embedding for that person instead of a duplicate entry.
+    With existing_only=True the name must already be enrolled.
+    Appends the new row to the cached gallery and the journal, so nothing
+    is re-read or rewritten on disk.
+    """
     try:
-        image = cv2.imread(image_path)
         if image is None:
             return False, "Could not load image"
         
         faces = detect_faces_yolo(yolo_model, image)
-        if len(faces) == 0:
-            return False, "No face detected"
         if len(faces) > 1:
             # st.warning(f"Multiple faces detected in {name}. Using the largest face.")
             pass
         
-        best_face = max(faces, key=lambda x: x['confidence'])
-        embedding = get_face_embedding(insightface_app, image, best_face['bbox'])
+        embedding, error = enrollment_embedding(insightface_app, image, faces)
         if embedding is None:
-            return False, "Failed to extract face embedding"
-        
-        faculty_data, index = faiss_store.load_faculty_database()
+            return False, error
         
-        if 'image_files' not in faculty_data:
-            faculty_data['image_files'] = []
+        with faiss_store.write_lock:
+            gallery = faiss_store.gallery_for_update()
             
-        faculty_data['names'].append(name)
-        faculty_data['embeddings'].append(embedding.tolist())
-        faculty_data['image_files'].append(image_filename)
-        
-        index = faiss_store.build_faiss_index(faculty_data['embeddings'])
-        
-        if faiss_store.save_faculty_database(faculty_data, index):
+            if existing_only and not gallery.rows_for_name(name):
+                return False, "Faculty member not found."
+            
+            # Only the new row is journaled and appended; existing entries keep their IDs
+            if faiss_store.add_faculty_rows([name], [image_filename], embedding) is None:
+                return False, "Failed to save to database"
+            count = len(faiss_store.gallery_for_update().rows_for_name(name))
+            if count > 1:
+                return True, f"Added image {count} for {name}"
             return True, "Faculty member added successfully"
-        else:
-            return False, "Failed to save to database"
             
     except Exception as e:
         return False, f"Error: {str(e)}"
 
 def delete_faculty_member(name_to_delete):
-    """Deletes a faculty member from the database."""
+    """
+    Deletes a faculty member (all of their enrolled images) from the database.
+    Like add_faculty_member, only the removed IDs are journaled (O(k) on disk).
+    """
     try:
-        faculty_data, index = faiss_store.load_faculty_database()
-        
-        if name_to_delete not in faculty_data['names']:
-            return False, "Faculty member not found."
-            
-        idx = faculty_data['names'].index(name_to_delete)
-        
-        # Remove data
-        faculty_data['names'].pop(idx)
-        faculty_data['embeddings'].pop(idx)
-        image_file = faculty_data['image_files'].pop(idx)
-        
-        # Delete image file
-        try:
-            os.remove(os.path.join(faiss_store.IMAGES_DIR, image_file))
-        except Exception as e:
-            # st.warning(f"Could not delete image file {image_file}: {e}")
-            pass
+        with faiss_store.write_lock:
+            gallery = faiss_store.gallery_for_update()
+        
+            rows = gallery.rows_for_name(name_to_delete)
+            if not rows:
+                return False, "Faculty member not found."
+        
+            image_files = [gallery.image_files[i] for i in rows]
+            faculty_ids = [int(gallery.ids[i]) for i in rows]
+        
+            # Delete image files
+            for image_file in image_files:
+                try:
+                    os.remove(os.path.join(faiss_store.IMAGES_DIR, image_file))
+                except Exception as e:
+                    # st.warning(f"Could not delete image file {image_file}: {e}")
+                    pass
             
-        # Rebuild index
-        new_index = faiss_store.build_faiss_index(faculty_data['embeddings'])
-        
-        # Save updated database
-        if faiss_store.save_faculty_database(faculty_data, new_index):
-            return True, f"Successfully deleted {name_to_delete}."
-        else:
-            return False, "Failed to save updated database."
+            # Journal and tombstone just this member's rows
+            if faiss_store.delete_faculty_ids(faculty_ids):
+                return True, f"Successfully deleted {name_to_delete}."
+            else:
+                return False, "Failed to save updated database."
             
     except Exception as e:
         return False, f"Error deleting faculty: {str(e)}"
 
-def search_faculty_specific(index, faculty_names, query_embedding, target_name, threshold=0.6):
-    """Search for a specific faculty member using FAISS"""
-    if index is None or len(faculty_names) == 0:
+def search_faculty_specific(gallery, query_embedding, target_name, threshold=0.6, aggregation="max"):
+    """
+    Verify a query against one specific faculty member.
+    Compares directly with that member's stored (normalized) embeddings via
+    the gallery's name -> rows map, so the cost does not grow with the
+    gallery and no other face can crowd the target out of the results.
+    """
+    rows = gallery.rows_for_name(target_name)
+    if not rows:
         return False, None, 0.0
     
     try:
-        if target_name not in faculty_names:
-            return False, None, 0.0
-        
-        target_index = faculty_names.index(target_name)
-        query_embedding = np.array([query_embedding]).astype('float32')
-        faiss.normalize_L2(query_embedding)
-        
-        distances, indices = index.search(query_embedding, min(5, len(faculty_names)))
+        query_embedding = faiss_store.prepare_queries(query_embedding)
+        
+        embeddings = gallery.embeddings_for_name(target_name)
+        similarities = embeddings @ query_embedding[0]
+        if aggregation == "centroid":
+            centroid = embeddings.mean(axis=0)
+            similarity = float(centroid @ query_embedding[0] / max(np.linalg.norm(centroid), 1e-12))
+        elif aggregation == "mean":
+            similarity = float(similarities.mean())
+        else:
+            similarity = float(similarities.max())
         
-        for i, idx in enumerate(indices[0]):
-            if idx == target_index:
-                distance = distances[0][i]
-                similarity = 1.0 - (distance / 2.0)
-                if similarity >= threshold:
-                    return True, target_name, float(similarity)
-                break
+        if similarity >= threshold:
+            return True, target_name, similarity
         return False, None, 0.0
         
     except Exception as e:
         # st.error(f"Search failed: {e}")
         return False, None, 0.0
 
-def search_faculty(index, faculty_names, query_embedding, threshold=0.6):
-    """Search for matching faculty member using FAISS"""
-    if index is None or len(faculty_names) == 0:
+def search_faculty_batch(gallery, query_embeddings, top_k=1, threshold=0.6):
+    """
+    Identifies many embeddings with a single FAISS search.
+    Returns one list per query of up to top_k {'name', 'confidence'} dicts,
+    best first, one entry per faculty member (max over their images).
+    """
+    queries = faiss_store.prepare_queries(query_embeddings)
+    if gallery.index is None or len(gallery) == 0:
+        return [[] for _ in range(len(queries))]
+
+    # Extra rows so people with several images don't crowd out other identities
+    k = 1 if top_k == 1 else min(len(gallery), max(top_k, MATCH_CANDIDATES))
+    similarities, indices = gallery.search(queries, k)
+
+    # Threshold the whole (M, k) block at once; rows come back best first,
+    # so each query's passing rows are a prefix of its results
+    passing = ((indices != -1) & (similarities >= threshold)).sum(axis=1)
+
+    results = []
+    for query_sims, query_ids, count in zip(similarities, indices, passing):
+        matches, seen = [], set()
+        for similarity, idx in zip(query_sims[:count], query_ids[:count]):
+            name = gallery.name_for_id(idx)
+            if name in seen:
+                continue
+            seen.add(name)
+            matches.append({'name': name, 'confidence': float(similarity)})
+            if len(matches) == top_k:
+                break
+        results.append(matches)
+    return results
+
+def search_faculty(gallery, query_embedding, threshold=0.6, aggregation="max"):
+    """
+    Search for matching faculty member using FAISS.
+    aggregation combines the similarities of a person's enrolled images:
+    "max" (best image), "mean" (average over all their images) or
+    "centroid" (similarity to their mean embedding).
+    """
+    if gallery.index is None or len(gallery) == 0:
         return False, None, 0.0
     
     try:
-        query_embedding = np.array([query_embedding]).astype('float32')
-        faiss.normalize_L2(query_embedding)
-        distances, indices = index.search(query_embedding, 1)
-        
-        if len(distances[0]) > 0:
-            distance = distances[0][0]
-            idx = indices[0][0]
-            similarity = 1.0 - (distance / 2.0)
-            
-            if similarity >= threshold:
-                name = faculty_names[idx]
-                return True, name, float(similarity)
-        
+        query_embedding = faiss_store.prepare_queries(query_embedding)
+        
+        if aggregation == "centroid":
+            # One matrix-vector product against the per-identity centroids
+            identities, centroids = gallery.centroids()
+            similarities = centroids @ query_embedding[0]
+            best = int(np.argmax(similarities))
+            name, similarity = identities[best], float(similarities[best])
+        elif aggregation == "mean":
+            # Shortlist identities from the index, then average all their rows exactly
+            k = min(MATCH_CANDIDATES, len(gallery))
+            _, indices = gallery.search(query_embedding, k)
+            candidates = list(dict.fromkeys(
+                gallery.name_for_id(idx) for idx in indices[0] if idx != -1
+            ))
+            if not candidates:
+                return False, None, 0.0
+            scores = [
+                float((gallery.embeddings_for_name(n) @ query_embedding[0]).mean())
+                for n in candidates
+            ]
+            best = int(np.argmax(scores))
+            name, similarity = candidates[best], scores[best]
+        else:
+            # Max over a person's images is simply the nearest row
+            similarities, indices = gallery.search(query_embedding, 1)
+            if len(similarities[0]) == 0 or indices[0][0] == -1:
+                return False, None, 0.0
+            name = gallery.name_for_id(indices[0][0])
+            similarity = float(similarities[0][0])
+        
+        if similarity >= threshold:
+            return True, name, float(similarity)
         return False, None, 0.0
         
     except Exception as e:
@@ -1,82 +1,1014 @@
 import os
+import json
+import base64
 import pickle
 import faiss
 import numpy as np
 import glob
+import shutil
+import threading
+from contextlib import contextmanager
+
+from ..config.config_store import get_setting
 
 # --- FILE/DIR CONFIG ---
 # Path relative to the backend directory (recognition/../)
 _BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 IMAGES_DIR = os.path.join(_BACKEND_DIR, "faculty_db")
-EMBEDDINGS_FILE = os.path.join(_BACKEND_DIR, "faculty_embeddings.pkl")
+# Each save writes a new snapshot directory (embeddings matrix, metadata
+# sidecar, index); the manifest names the current one and is replaced last,
+# so a crash mid-save leaves the previous snapshot in effect
+SNAPSHOTS_DIR = os.path.join(_BACKEND_DIR, "faculty_snapshots")
+MANIFEST_FILE = os.path.join(_BACKEND_DIR, "faculty_manifest.json")
+SNAPSHOT_EMBEDDINGS = "embeddings.npy"
+SNAPSHOT_METADATA = "meta.json"
+SNAPSHOT_INDEX = "faiss.index"
+# Append-only log of adds/deletes since the current snapshot was written
+JOURNAL_FILE = os.path.join(_BACKEND_DIR, "faculty_journal.jsonl")
+LEGACY_EMBEDDINGS_FILE = os.path.join(_BACKEND_DIR, "faculty_embeddings.pkl")
+# Unversioned files of the first .npy format; read until the next save replaces them with a snapshot
+FLAT_EMBEDDINGS_FILE = os.path.join(_BACKEND_DIR, "faculty_embeddings.npy")
+FLAT_METADATA_FILE = os.path.join(_BACKEND_DIR, "faculty_meta.json")
 FAISS_INDEX_FILE = os.path.join(_BACKEND_DIR, "faculty_faiss.index")
+EMBEDDING_DIM = 512
+
+# --- INDEX TYPES ---
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+# Metric shared by every index type; similarity_from_distances must match it.
+# Stored vectors are unit length, so the inner product is the cosine similarity.
+INDEX_METRIC = faiss.METRIC_INNER_PRODUCT
+# Gallery sizes at which index_type "auto" switches to an approximate index
+AUTO_HNSW_MIN_SIZE = 10000
+AUTO_IVF_PQ_MIN_SIZE = 200000
+# How far (as a fraction) the size must move past a threshold before an
+# existing index switches type, so adds/deletes at the boundary don't rebuild
+INDEX_TYPE_HYSTERESIS = 0.1
+HNSW_M = 32
+IVF_PQ_SUBQUANTIZERS = 64   # 512 / 64 = 8 dims per sub-vector
+IVF_PQ_BITS = 8
+IVF_MIN_POINTS_PER_LIST = 39  # FAISS warns below this when training k-means
+# An IVF index is retrained once its nlist is off from _ivf_nlist(size) by more than this factor
+IVF_NLIST_REBUILD_FACTOR = 2
+# Index types whose search scores are approximate (compressed codes), and how
+# many candidates FacultyGallery.search re-scores exactly for them
+APPROXIMATE_SCORE_TYPES = ("ivf_pq",)
+RERANK_CANDIDATES = 64
+
+# --- PERSISTENCE ---
+# Journaled changes after which the next write rewrites the full snapshot instead
+JOURNAL_COMPACT_ENTRIES = 1000
+# Deleted vectors the live index may keep before the next write compacts it. Removing
+# from FAISS indexes is O(N) (and impossible for HNSW), so deletes only tombstone them
+MAX_TOMBSTONES = 256
 
 # Ensure folders exist
 os.makedirs(IMAGES_DIR, exist_ok=True)
 
+def _empty_faculty_data():
+    return {
+        'names': [],
+        'embeddings': np.zeros((0, EMBEDDING_DIM), dtype='float32'),
+        'image_files': [],
+        'ids': [],
+        'next_id': 0
+    }
+
 # --- FAISS INDEX MANAGEMENT ---
 def load_faculty_database():
-    """Load faculty embeddings and FAISS index"""
+    """
+    Load faculty metadata, embeddings and FAISS index: the snapshot named by
+    the manifest plus any changes journaled since. If that snapshot is
+    damaged (e.g. its row counts disagree with the manifest), the previous
+    one is loaded instead and the journal replayed over it.
+    Embeddings are an (N, 512) float32 matrix of normalized vectors,
+    memory-mapped read-only: snapshots are never rewritten in place, so the
+    mapping stays valid while later saves write new ones.
+    The index is derived data, so a missing or unreadable one is rebuilt.
+    Raises RuntimeError if no stored gallery can be read, so a write never
+    replaces it with an empty one.
+    """
+    if os.path.exists(LEGACY_EMBEDDINGS_FILE) and not _has_snapshot():
+        migrate_legacy_database()
+
+    if not _has_snapshot() and not os.path.exists(JOURNAL_FILE):
+        return _empty_faculty_data(), None
+
+    try:
+        faculty_data, index = _load_current_snapshot()
+        entries = _read_journal()
+        index = _replay_journal(faculty_data, index, entries)
+    except (IOError, OSError, ValueError, KeyError, TypeError) as e:
+        raise RuntimeError(f"Faculty database is unreadable: {e}") from e
+
+    faculty_data['journal_entries'] = len(entries)
+    return faculty_data, index
+
+def _has_snapshot():
+    return os.path.exists(MANIFEST_FILE) or os.path.exists(FLAT_METADATA_FILE)
+
+def _read_manifest():
+    if not os.path.exists(MANIFEST_FILE):
+        return None
+    with open(MANIFEST_FILE, 'r') as f:
+        return json.load(f)
+
+def _load_current_snapshot():
+    """Reads the manifest's snapshot, falling back to the previous one if it is damaged"""
+    manifest = _read_manifest()
+    if manifest is None:
+        if os.path.exists(FLAT_METADATA_FILE):
+            return _read_snapshot(FLAT_EMBEDDINGS_FILE, FLAT_METADATA_FILE, FAISS_INDEX_FILE)
+        return _empty_faculty_data(), None
+
+    try:
+        return _read_snapshot_dir(manifest['snapshot'], manifest['rows'])
+    except (IOError, OSError, ValueError, KeyError, TypeError) as e:
+        if not manifest.get('previous'):
+            raise
+        print(f"Warning: Snapshot {manifest['snapshot']} is unreadable ({e}); "
+              f"loading {manifest['previous']} and replaying the journal over it")
+        return _read_snapshot_dir(manifest['previous'], manifest.get('previous_rows'))
+
+def _read_snapshot_dir(name, rows):
+    path = os.path.join(SNAPSHOTS_DIR, name)
+    return _read_snapshot(
+        os.path.join(path, SNAPSHOT_EMBEDDINGS), os.path.join(path, SNAPSHOT_METADATA),
+        os.path.join(path, SNAPSHOT_INDEX), rows
+    )
+
+def _read_snapshot(embeddings_path, metadata_path, index_path, rows=None):
+    """Reads one snapshot; raises ValueError if its files disagree on the row count"""
+    faculty_data = _empty_faculty_data()
+    with open(metadata_path, 'r') as f:
+        faculty_data.update(json.load(f))
+    # Zero-copy: pages are read on first access; the first append copies (see FacultyGallery)
+    faculty_data['embeddings'] = np.load(embeddings_path, mmap_mode='r')
+    if len(faculty_data['embeddings']) != len(faculty_data['ids']):
+        raise ValueError(f"{len(faculty_data['embeddings'])} embeddings for {len(faculty_data['ids'])} IDs")
+    if rows is not None and len(faculty_data['ids']) != rows:
+        raise ValueError(f"{len(faculty_data['ids'])} rows, manifest expects {rows}")
+    return faculty_data, _load_faiss_index(faculty_data, index_path)
+
+def _load_faiss_index(faculty_data, index_path):
+    """Reads the stored index, rebuilding it from the embeddings when it is unusable"""
+    if os.path.exists(index_path):
+        try:
+            index = faiss.read_index(index_path)
+            # Built with another type or metric (e.g. an older L2 index); persisted on the next save
+            if index.ntotal == len(faculty_data['ids']) and not index_needs_rebuild(index, len(faculty_data['ids'])):
+                return apply_search_params(index)
+        except RuntimeError as e:
+            print(f"Warning: Failed to read FAISS index, rebuilding it from the embeddings: {e}")
+    return build_faiss_index(faculty_data['embeddings'], faculty_data['ids'])
+
+def migrate_legacy_database():
+    """
+    One-shot migration from the pickled list-of-lists store to a snapshot
+    (.npy matrix + JSON sidecar). The pickle is kept as *.migrated.
+    """
     try:
-        if os.path.exists(EMBEDDINGS_FILE) and os.path.exists(FAISS_INDEX_FILE):
-            with open(EMBEDDINGS_FILE, 'rb') as f:
-                faculty_data = pickle.load(f)
-            index = faiss.read_index(FAISS_INDEX_FILE)
-            return faculty_data, index
-    except (IOError, OSError, pickle.UnpicklingError, RuntimeError) as e:
-        print(f"Warning: Failed to load faculty database: {e}")
+        with open(LEGACY_EMBEDDINGS_FILE, 'rb') as f:
+            legacy = pickle.load(f)
+    except (IOError, OSError, pickle.UnpicklingError, EOFError) as e:
+        print(f"Warning: Failed to read legacy faculty database: {e}")
+        return False
+
+    faculty_data = _empty_faculty_data()
+    faculty_data['names'] = list(legacy.get('names', []))
+    faculty_data['image_files'] = list(legacy.get('image_files', []))
+    if len(legacy.get('embeddings', [])) > 0:
+        faculty_data['embeddings'] = normalize_embeddings(legacy['embeddings'])
+    # IDs are kept if the pickle already had them (incremental index era)
+    faculty_data['ids'] = list(legacy.get('ids', range(len(faculty_data['names']))))
+    faculty_data['next_id'] = legacy.get('next_id', len(faculty_data['ids']))
+
+    index = build_faiss_index(faculty_data['embeddings'], faculty_data['ids'])
+    if not save_faculty_database(faculty_data, index):
+        return False
+
+    os.replace(LEGACY_EMBEDDINGS_FILE, LEGACY_EMBEDDINGS_FILE + ".migrated")
+    print(f"Migrated {len(faculty_data['names'])} faculty entries to {SNAPSHOTS_DIR}")
+    # Pickled vectors came from the old crop pipeline and don't match current queries
+    print("Re-embed them from faculty_db with: POST /recognition/faculty/reembed "
+          "(or bulk_enroll.reembed_gallery)")
+    return True
+
+def prepare_queries(queries):
+    """
+    Returns queries as a C-contiguous (M, D) float32 matrix of unit rows.
+    Float32 buffers that are already normalized are used as-is; anything
+    else is copied and normalized once.
+    """
+    matrix = np.asarray(queries, dtype='float32')
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    if matrix.flags.c_contiguous and np.allclose(np.einsum('ij,ij->i', matrix, matrix), 1.0, atol=1e-4):
+        return matrix
+    return normalize_embeddings(matrix)
+
+def normalize_embeddings(embeddings):
+    """Returns a new contiguous (N, D) float32 matrix of L2-normalized rows"""
+    matrix = np.array(embeddings, dtype='float32', ndmin=2, order='C')
+    faiss.normalize_L2(matrix)
+    return matrix
+
+def delete_faculty_rows(faculty_data, rows):
+    """Removes the given row positions (names, image files, IDs and embeddings) in memory"""
+    row_set = set(rows)
+    keep = [i for i in range(len(faculty_data['names'])) if i not in row_set]
+    for key in ('names', 'image_files', 'ids'):
+        faculty_data[key] = [faculty_data[key][i] for i in keep]
+    faculty_data['embeddings'] = np.delete(faculty_data['embeddings'], rows, axis=0)
+
+def _write_file(path, write_func, mode='wb'):
+    """Writes a file and fsyncs it, so it is complete on disk before anything points at it"""
+    with open(path, mode) as f:
+        write_func(f)
+        f.flush()
+        os.fsync(f.fileno())
+
+def _atomic_write(path, write_func, mode='wb'):
+    """Writes via a temp file + rename so readers never see a partial file"""
+    tmp_path = path + ".tmp"
+    _write_file(tmp_path, write_func, mode)
+    os.replace(tmp_path, path)
 
-    return {'names': [], 'embeddings': [], 'image_files': []}, None
+def save_image_file(filename, image_bytes):
+    """Stores an enrollment image in IMAGES_DIR (atomically)"""
+    _atomic_write(os.path.join(IMAGES_DIR, filename), lambda f: f.write(image_bytes))
 
 def save_faculty_database(faculty_data, index):
-    """Save faculty embeddings and FAISS index"""
+    """
+    Save faculty embeddings matrix, metadata sidecar and FAISS index as a
+    new snapshot and empty the journal. The snapshot is written to its own
+    directory and only becomes current when the manifest is replaced, so a
+    crash at any point leaves a consistent gallery. This rewrites the whole
+    gallery, so it costs O(N); single adds/deletes go through
+    add_faculty_rows / delete_faculty_ids, which only append to the journal.
+    """
     try:
-        with open(EMBEDDINGS_FILE, 'wb') as f:
-            pickle.dump(faculty_data, f)
-        if index is not None:
-            faiss.write_index(index, FAISS_INDEX_FILE)
+        embeddings = np.ascontiguousarray(faculty_data['embeddings'], dtype='float32')
+        metadata = {
+            'names': list(faculty_data['names']),
+            'image_files': list(faculty_data.get('image_files', [])),
+            'ids': [int(i) for i in faculty_data['ids']],
+            'next_id': int(faculty_data.get('next_id', 0)),
+            'dim': int(embeddings.shape[1]) if embeddings.ndim == 2 else EMBEDDING_DIM
+        }
 
+        # Rebuild when the gallery grew past an auto-selection threshold, or
+        # to drop the deleted vectors an HNSW index still holds
+        if index is not None and (index.ntotal != len(metadata['ids'])
+                                  or index_needs_rebuild(index, len(metadata['ids']))):
+            index_type = choose_index_type(len(metadata['ids']), current=index_kind(index))
+            index = build_faiss_index(embeddings, metadata['ids'], index_type)
+
+        previous = _read_manifest()
+        name = _write_snapshot(embeddings, metadata, index)
+        manifest = {'snapshot': name, 'rows': len(metadata['ids'])}
+        if previous:
+            manifest.update(previous=previous['snapshot'], previous_rows=previous['rows'])
+        # The switch: before this the old snapshot (+ journal) is current, after it the new one
+        _atomic_write(MANIFEST_FILE, lambda f: json.dump(manifest, f), mode='w')
+
+        # Safe to crash before this: replaying the journal over the new snapshot is a no-op
+        for path in (JOURNAL_FILE, FLAT_EMBEDDINGS_FILE, FLAT_METADATA_FILE, FAISS_INDEX_FILE):
+            if os.path.exists(path):
+                os.remove(path)
+        # Keep the previous snapshot to fall back to if the new one gets damaged
+        _prune_snapshots(keep={name, manifest.get('previous')})
+
+        # The data just written is the new steady state; no need to re-read it
+        _install_gallery(dict(metadata, embeddings=embeddings), index)
         return True
-    except (IOError, OSError, pickle.PicklingError, RuntimeError) as e:
+    except (IOError, OSError, ValueError, RuntimeError) as e:
         print(f"Error: Failed to save faculty database: {e}")
         return False
 
-def build_faiss_index(embeddings):
-    """Build FAISS index from embeddings"""
+def _snapshot_names():
+    """Completed snapshot directories, oldest first"""
+    if not os.path.isdir(SNAPSHOTS_DIR):
+        return []
+    return sorted(name for name in os.listdir(SNAPSHOTS_DIR) if name.isdigit())
+
+def _write_snapshot(embeddings, metadata, index):
+    """Writes a snapshot into a new directory (renamed into place when complete) and returns its name"""
+    names = _snapshot_names()
+    name = f"{int(names[-1]) + 1 if names else 1:08d}"
+    path = os.path.join(SNAPSHOTS_DIR, name)
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    _write_file(os.path.join(tmp_path, SNAPSHOT_EMBEDDINGS), lambda f: np.save(f, embeddings))
+    _write_file(os.path.join(tmp_path, SNAPSHOT_METADATA), lambda f: json.dump(metadata, f), mode='w')
+    if index is not None:
+        _write_file(os.path.join(tmp_path, SNAPSHOT_INDEX), lambda f: f.write(faiss.serialize_index(index).tobytes()))
+    os.replace(tmp_path, path)
+    return name
+
+def _prune_snapshots(keep):
+    """
+    Deletes snapshots (and leftover temp dirs) other than keep. One still
+    memory-mapped by a live gallery can't be deleted on Windows; it is
+    retried on the next save.
+    """
+    for name in os.listdir(SNAPSHOTS_DIR):
+        if name not in keep:
+            shutil.rmtree(os.path.join(SNAPSHOTS_DIR, name), ignore_errors=True)
+
+# --- JOURNAL ---
+def journal_add(faculty_id, name, image_file, embedding):
+    """Journal entry for one added row (embedding already normalized)"""
+    return {
+        'op': "add",
+        'id': int(faculty_id),
+        'name': name,
+        'image_file': image_file,
+        'embedding': base64.b64encode(np.asarray(embedding, dtype='<f4').tobytes()).decode('ascii')
+    }
+
+def journal_delete(faculty_ids):
+    """Journal entry for removed rows"""
+    return {'op': "delete", 'ids': [int(i) for i in faculty_ids]}
+
+def _append_journal(entries):
+    """Appends entries as JSON lines and fsyncs them, so an acknowledged write survives a crash"""
+    with open(JOURNAL_FILE, 'a+b') as f:
+        # A crash mid-append can leave a torn last line; start on a fresh one
+        if f.seek(0, os.SEEK_END):
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+        f.write("".join(json.dumps(entry) + "\n" for entry in entries).encode('utf-8'))
+        f.flush()
+        os.fsync(f.fileno())
+
+def _read_journal():
+    """Returns the journaled entries; torn lines from an interrupted append are skipped"""
+    if not os.path.exists(JOURNAL_FILE):
+        return []
+    entries = []
+    with open(JOURNAL_FILE, 'rb') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                print("Warning: Skipping a partially written faculty journal entry")
+    return entries
+
+def _replay_journal(faculty_data, index, entries):
+    """
+    Applies journaled adds/deletes to a loaded snapshot and its index.
+    Keyed by ID (IDs are never reused), so entries the snapshot already
+    contains, e.g. after a crash right after compaction, are skipped.
+    """
+    known = set(faculty_data['ids'])
+    added, removed = [], set()
+    for entry in entries:
+        if entry['op'] == "add" and entry['id'] not in known:
+            known.add(entry['id'])
+            added.append(entry)
+        elif entry['op'] == "delete":
+            removed.update(i for i in entry['ids'] if i in known)
+
+    if added:
+        vectors = np.stack([np.frombuffer(base64.b64decode(e['embedding']), dtype='<f4') for e in added])
+        ids = [e['id'] for e in added]
+        faculty_data['names'].extend(e['name'] for e in added)
+        faculty_data['image_files'].extend(e['image_file'] for e in added)
+        faculty_data['ids'].extend(ids)
+        faculty_data['next_id'] = max(faculty_data.get('next_id', 0), max(ids) + 1)
+        faculty_data['embeddings'] = np.concatenate([faculty_data['embeddings'], vectors.astype('float32')])
+        index = add_to_faiss_index(index, vectors, ids)
+    if removed:
+        delete_faculty_rows(faculty_data, [row for row, i in enumerate(faculty_data['ids']) if i in removed])
+        index = remove_from_faiss_index(index, sorted(removed))
+    return index
+
+# --- WRITES ---
+def gallery_for_update():
+    """
+    Returns the installed gallery to write to, reloading it first only if
+    another process changed the files.
+    Call under write_lock; raises RuntimeError if the database is unreadable.
+    """
+    with _gallery_lock:
+        stamp = _database_stamp()
+        if _gallery is None or stamp != _gallery_stamp:
+            faculty_data, index = load_faculty_database()
+            return _install_gallery(faculty_data, index, stamp)
+        return _gallery
+
+def add_faculty_rows(names, image_files, embeddings):
+    """
+    Enrolls one row per name / image file / embedding and returns the new
+    IDs, or None if the change could not be persisted.
+    """
+    with write_lock:
+        gallery = gallery_for_update()
+        vectors = normalize_embeddings(embeddings)
+        ids = list(range(gallery.next_id, gallery.next_id + len(vectors)))
+        entries = [
+            journal_add(faculty_id, name, image_file, vector)
+            for faculty_id, name, image_file, vector in zip(ids, names, image_files, vectors)
+        ]
+        if _commit(gallery, entries, len(ids), 0, lambda: gallery.append_rows(names, image_files, vectors, ids)):
+            return ids
+        return None
+
+def delete_faculty_ids(faculty_ids):
+    """Removes the rows with the given IDs; returns True on success"""
+    with write_lock:
+        gallery = gallery_for_update()
+        return _commit(gallery, [journal_delete(faculty_ids)], 0, len(faculty_ids),
+                       lambda: gallery.delete_ids(faculty_ids))
+
+def _commit(gallery, entries, added, removed, apply):
+    """
+    Persists a write and applies it to the live gallery. Usually this only
+    appends the journal entries, then apply() updates the gallery in place:
+    O(1) per added row and O(k) per deleted one, in memory and on disk.
+    A full snapshot of the compacted gallery (the only time the index is
+    cloned) is written instead once the journal reaches JOURNAL_COMPACT_ENTRIES,
+    the index type should change, or the index would hold more than
+    MAX_TOMBSTONES deleted vectors. Returns True on success.
+    """
+    size = len(gallery) + added - removed
+    index = gallery.index
+    if (gallery.journal_entries + len(entries) >= JOURNAL_COMPACT_ENTRIES
+            or (index is not None and (index.ntotal + added - size > MAX_TOMBSTONES
+                                       or index_needs_rebuild(index, size)))):
+        faculty_data, index = gallery.compacted()
+        index = _replay_journal(faculty_data, index, entries)
+        return save_faculty_database(faculty_data, index)
+
+    # Held so readers that notice the journal changed wait for apply() instead of reloading
+    with _gallery_lock:
+        try:
+            _append_journal(entries)
+        except (IOError, OSError) as e:
+            print(f"Error: Failed to write faculty journal: {e}")
+            return False
+        apply()
+        gallery.journal_entries += len(entries)
+        _mark_gallery_current(gallery)
+    return True
+
+def _index_setting(key):
+    return get_setting(key)
+
+def _ivf_nlist(size):
+    """Number of IVF lists: ~4*sqrt(N), capped so every list gets enough training points"""
+    return max(1, min(int(4 * np.sqrt(size)), size // IVF_MIN_POINTS_PER_LIST))
+
+def _index_type_for_size(index_type, size):
+    """Resolves a faiss_index_type setting for a gallery of size vectors"""
+    if index_type == "auto":
+        if size >= AUTO_IVF_PQ_MIN_SIZE:
+            index_type = "ivf_pq"
+        elif size >= AUTO_HNSW_MIN_SIZE:
+            index_type = "hnsw"
+        else:
+            index_type = "flat"
+
+    # IVF needs enough vectors to train its coarse quantizer (and PQ codebooks)
+    if index_type == "ivf_flat" and size < IVF_MIN_POINTS_PER_LIST:
+        index_type = "flat"
+    if index_type == "ivf_pq" and size < IVF_MIN_POINTS_PER_LIST * (1 << IVF_PQ_BITS):
+        index_type = "ivf_flat" if size >= IVF_MIN_POINTS_PER_LIST else "flat"
+    return index_type
+
+def choose_index_type(size, current=None):
+    """
+    Resolves the configured faiss_index_type ("auto" picks by gallery size).
+    With current (the type of the existing index) the type is kept while size
+    stays within INDEX_TYPE_HYSTERESIS of the threshold it crossed.
+    """
+    index_type = _index_setting("faiss_index_type")
+    if index_type != "auto" and index_type not in INDEX_TYPES:
+        print(f"Warning: Unknown faiss_index_type '{index_type}', using flat")
+        index_type = "flat"
+
+    chosen = _index_type_for_size(index_type, size)
+    if current is not None and chosen != current:
+        margin = size * INDEX_TYPE_HYSTERESIS
+        if current in (_index_type_for_size(index_type, size - margin),
+                       _index_type_for_size(index_type, size + margin)):
+            return current
+    return chosen
+
+def index_kind(index):
+    """Returns which of INDEX_TYPES an index is"""
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+def index_needs_rebuild(index, size):
+    """
+    True if the index uses another metric or type than the current settings
+    call for, or is an IVF index trained for a much smaller or larger gallery.
+    """
+    kind = index_kind(index)
+    if index.metric_type != INDEX_METRIC or kind != choose_index_type(size, current=kind):
+        return True
+    if kind in ("ivf_flat", "ivf_pq"):
+        # nlist is fixed at training time; a gallery that grew well past it
+        # would put most vectors in a few lists and scan them all per query
+        nlist = faiss.extract_index_ivf(index).nlist
+        target = _ivf_nlist(size)
+        return not nlist / IVF_NLIST_REBUILD_FACTOR <= target <= nlist * IVF_NLIST_REBUILD_FACTOR
+    return False
+
+def apply_search_params(index):
+    """Sets efSearch (HNSW) / nprobe (IVF) from the config on a built or loaded index"""
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = int(_index_setting("faiss_ef_search"))
+    elif isinstance(inner, faiss.IndexIVF):
+        inner.nprobe = int(_index_setting("faiss_nprobe"))
+    return index
+
+def similarity_from_distances(distances):
+    """Converts index.search distances (INDEX_METRIC) of normalized vectors to similarities"""
+    # Inner-product scores are already cosine similarities
+    return distances
+
+def create_faiss_index(index_type, dimension, training_vectors=None):
+    """
+    Creates an empty index of the given type that accepts add_with_ids.
+    IVF types are trained on training_vectors (the stored embeddings).
+    """
+    if index_type == "flat":
+        return faiss.IndexIDMap(faiss.IndexFlat(dimension, INDEX_METRIC))
+    if index_type == "hnsw":
+        # HNSW has no native IDs (and no remove_ids), so it is wrapped like flat
+        hnsw = faiss.IndexHNSWFlat(dimension, HNSW_M, INDEX_METRIC)
+        hnsw.hnsw.efConstruction = int(_index_setting("faiss_ef_construction"))
+        return faiss.IndexIDMap(hnsw)
+
+    nlist = _ivf_nlist(len(training_vectors))
+    quantizer = faiss.IndexFlat(dimension, INDEX_METRIC)
+    if index_type == "ivf_pq":
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, IVF_PQ_SUBQUANTIZERS, IVF_PQ_BITS, INDEX_METRIC)
+    else:
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist, INDEX_METRIC)
+    index.train(training_vectors)
+    return index
+
+def build_faiss_index(embeddings, ids, index_type=None):
+    """Build an ID-mapped FAISS index from embeddings and their stable IDs"""
     if len(embeddings) == 0:
         return None
     
-    embeddings_array = np.array(embeddings).astype('float32')
-    faiss.normalize_L2(embeddings_array)
-    dimension = embeddings_array.shape[1]
-    index = faiss.IndexFlatL2(dimension)
-    index.add(embeddings_array)
+    embeddings_array = normalize_embeddings(embeddings)
+    index_type = index_type or choose_index_type(len(embeddings_array))
+    index = create_faiss_index(index_type, embeddings_array.shape[1], embeddings_array)
+    index.add_with_ids(embeddings_array, np.asarray(ids, dtype='int64'))
+    return apply_search_params(index)
+
+def add_to_faiss_index(index, embedding, faculty_id):
+    """
+    Adds embedding(s) under their ID(s) without touching the other vectors.
+    Accepts one vector + ID or an (N, D) matrix + N IDs.
+    """
+    vectors = normalize_embeddings(embedding)
+    ids = np.asarray(faculty_id, dtype='int64').reshape(-1)
+    if index is None:
+        return build_faiss_index(vectors, ids)
+    index.add_with_ids(vectors, ids)
     return index
 
+def remove_from_faiss_index(index, faculty_ids):
+    """
+    Removes the given IDs from the index; returns None once it is empty.
+    HNSW graphs can't drop vectors, so there they stay as tombstones until
+    the next rebuild (save_faculty_database rebuilds on a count mismatch);
+    FacultyGallery.search skips IDs it no longer holds.
+    """
+    if index is None:
+        return None
+    if index_kind(index) == "hnsw":
+        return index
+    index.remove_ids(np.asarray(faculty_ids, dtype='int64'))
+    if index.ntotal == 0:
+        return None
+    return index
+
+def rebuild_faiss_index():
+    """Rebuilds the stored index with the current index settings"""
+    with write_lock:
+        faculty_data, _ = load_faculty_database()
+        index = build_faiss_index(faculty_data['embeddings'], faculty_data['ids'])
+        return save_faculty_database(faculty_data, index)
+
 def clear_faculty_database():
     """Clear all faculty data including images, embeddings, and FAISS index"""
     try:
         files_removed = 0
         errors = []
         
-        image_files = glob.glob(os.path.join(IMAGES_DIR, "*"))
-        for f in image_files:
-            try:
-                os.remove(f)
-                files_removed += 1
-            except Exception as e:
-                errors.append(f"Failed to remove {f}: {str(e)}")
-        
-        for f in [EMBEDDINGS_FILE, FAISS_INDEX_FILE]:
-            if os.path.exists(f):
+        with write_lock:
+            image_files = glob.glob(os.path.join(IMAGES_DIR, "*"))
+            for f in image_files:
                 try:
                     os.remove(f)
                     files_removed += 1
                 except Exception as e:
                     errors.append(f"Failed to remove {f}: {str(e)}")
-        
-        # st.cache_data.clear() # Clear data cache
+            
+            # The manifest goes first: without it the snapshots are no longer loaded
+            for f in [MANIFEST_FILE, JOURNAL_FILE, FLAT_EMBEDDINGS_FILE, FLAT_METADATA_FILE, FAISS_INDEX_FILE]:
+                if os.path.exists(f):
+                    try:
+                        os.remove(f)
+                        files_removed += 1
+                    except Exception as e:
+                        errors.append(f"Failed to remove {f}: {str(e)}")
+            if os.path.isdir(SNAPSHOTS_DIR):
+                try:
+                    shutil.rmtree(SNAPSHOTS_DIR)
+                except OSError as e:
+                    errors.append(f"Failed to remove {SNAPSHOTS_DIR}: {str(e)}")
+            
+            invalidate_faculty_gallery()
         return True, f"Successfully cleared database! Removed {files_removed} files.", errors
         
     except Exception as e:
-        return False, f"Failed to clear database: {str(e)}", []
\ No newline at end of file
+        return False, f"Failed to clear database: {str(e)}", []
+
+# --- IN-MEMORY GALLERY CACHE ---
+class _ReadWriteLock:
+    """Many readers or one writer; waiting writers go first so adds aren't starved by searches"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def reading(self):
+        with self._cond:
+            while self._writing or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def writing(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+class FacultyGallery:
+    """
+    In-memory faculty database: the names, a contiguous (N, 512) float32
+    matrix of normalized embeddings and the FAISS index, so searches never
+    touch the disk. A faculty member may own several rows (one per
+    enrolled image).
+    Writes (append_rows / delete_ids, under write_lock) update it in place.
+    Rows go into an append-only buffer grown by doubling and become visible
+    when the row count is published; deleted rows stay as tombstones that
+    the ID/name maps no longer point at, until compaction replaces the
+    gallery. Readers take no locks apart from the index one: FAISS indexes
+    must not be searched while vectors are added.
+    """
+
+    def __init__(self, names, embeddings, image_files, ids, index, version, next_id=0, journal_entries=0):
+        # Per row, tombstones included; rows are only appended
+        self.names = list(names)
+        self.image_files = list(image_files)
+        # May start as the read-only memory-mapped snapshot; copied on the first append
+        self._buffer = embeddings
+        self._ids = np.asarray(ids, dtype='int64')
+        self._count = len(self.names)
+        self.index = index
+        self._index_lock = _ReadWriteLock()
+        self.version = version
+        # Write bookkeeping, so writes needn't re-read the files
+        self.next_id = next_id
+        self.journal_entries = journal_entries
+        # FAISS returns IDs, not row positions: row of each ID (IDs are allocated
+        # sequentially), -1 once deleted, so search() maps them with one gather
+        self._row_of_id = np.full(max(next_id, int(self._ids.max()) + 1 if len(self._ids) else 0, 16), -1, dtype='int64')
+        self._row_of_id[self._ids] = np.arange(len(self._ids))
+        self._tombstone_ids = set()
+        # Unique identities in enrollment order, and the live rows each one owns
+        self._rows_of_name = {}
+        for row, name in enumerate(self.names):
+            self._rows_of_name.setdefault(name, []).append(row)
+        self._live_image_files = set(self.image_files)
+        # Per-identity centroids, tagged with the version they were computed at
+        self._name_versions = {}
+        self._centroid_of_name = {}
+        self._centroids = None
+        # PQ distances are lossy; those results are re-scored in search()
+        self.approximate = index is not None and index_kind(index) in APPROXIMATE_SCORE_TYPES
+
+    @property
+    def embeddings(self):
+        """(rows, D) matrix of every row, tombstones included; index it with rows from the maps"""
+        return self._buffer[:self._count]
+
+    @property
+    def ids(self):
+        return self._ids[:self._count]
+
+    @property
+    def identities(self):
+        """Enrolled names in enrollment order"""
+        return list(self._rows_of_name)
+
+    def __len__(self):
+        return self._count - len(self._tombstone_ids)
+
+    def rows_for_name(self, name):
+        """Row positions of every embedding enrolled under name"""
+        return self._rows_of_name.get(name, [])
+
+    def embeddings_for_name(self, name):
+        """(k, D) matrix of the embeddings enrolled under name"""
+        rows = self.rows_for_name(name)
+        # Read the buffer after the rows: any buffer installed since still holds them
+        return self._buffer[rows]
+
+    def live_rows(self):
+        """Row positions that are not deleted, in order (O(N))"""
+        rows = np.arange(self._count)
+        return rows[self._rows_of_ids(self._ids[:self._count]) == rows].tolist()
+
+    def _rows_of_ids(self, faculty_ids):
+        """Row of each ID in an array of any shape; -1 for deleted, unknown and padding (-1) IDs"""
+        row_of_id = self._row_of_id
+        faculty_ids = np.asarray(faculty_ids, dtype='int64')
+        known = (faculty_ids >= 0) & (faculty_ids < len(row_of_id))
+        return np.where(known, row_of_id[np.where(known, faculty_ids, 0)], -1)
+
+    def has_image_file(self, image_file):
+        return image_file in self._live_image_files
+
+    def _centroid(self, name):
+        tag = self._name_versions.get(name)
+        cached = self._centroid_of_name.get(name)
+        if cached is not None and cached[0] == tag:
+            return cached[1]
+        centroid = self.embeddings_for_name(name).mean(axis=0)
+        centroid /= max(np.linalg.norm(centroid), 1e-12)
+        self._centroid_of_name[name] = (tag, centroid)
+        return centroid
+
+    def centroids(self):
+        """
+        (identities, (len(identities), D) matrix of normalized per-identity mean
+        embeddings). Cached; a write only recomputes the identities it touched.
+        """
+        version = self.version
+        cached = self._centroids
+        if cached is not None and cached[0] == version:
+            return cached[1], cached[2]
+        identities = self.identities
+        centroids = np.zeros((len(identities), self._buffer.shape[1]), dtype='float32')
+        for i, name in enumerate(identities):
+            centroids[i] = self._centroid(name)
+        self._centroids = (version, identities, centroids)
+        return identities, centroids
+
+    def append_rows(self, names, image_files, vectors, ids):
+        """Appends normalized rows in place (amortized O(1) per row). Call under write_lock."""
+        start, end = self._count, self._count + len(ids)
+        if end > len(self._buffer) or not self._buffer.flags.writeable:
+            capacity = max(end, 2 * len(self._buffer), 16)
+            buffer = np.empty((capacity, vectors.shape[1]), dtype='float32')
+            buffer[:start] = self._buffer[:start]
+            id_buffer = np.empty(capacity, dtype='int64')
+            id_buffer[:start] = self._ids[:start]
+            self._buffer, self._ids = buffer, id_buffer
+        self._buffer[start:end] = vectors
+        self._ids[start:end] = ids
+        self.names.extend(names)
+        self.image_files.extend(image_files)
+        # Publish the rows before the maps point at them
+        self._count = end
+
+        with self._index_lock.writing():
+            self.index = add_to_faiss_index(self.index, vectors, ids)
+        self.approximate = index_kind(self.index) in APPROXIMATE_SCORE_TYPES
+
+        top = max(ids) + 1
+        if top > len(self._row_of_id):
+            row_of_id = np.full(max(top, 2 * len(self._row_of_id)), -1, dtype='int64')
+            row_of_id[:len(self._row_of_id)] = self._row_of_id
+            self._row_of_id = row_of_id
+        self._row_of_id[np.asarray(ids, dtype='int64')] = np.arange(start, end)
+
+        version = _next_gallery_version()
+        for row, (faculty_id, name, image_file) in enumerate(zip(ids, names, image_files), start):
+            self._rows_of_name[name] = self._rows_of_name.get(name, []) + [row]
+            self._live_image_files.add(image_file)
+            self._name_versions[name] = version
+        self.next_id = max(self.next_id, max(ids) + 1)
+        self.version = version
+
+    def delete_ids(self, faculty_ids):
+        """
+        Drops rows by ID from the maps; their vectors stay in the buffer and
+        the index as tombstones (search skips them). O(k). Call under write_lock.
+        """
+        version = _next_gallery_version()
+        for faculty_id in faculty_ids:
+            row = int(self._rows_of_ids(faculty_id))
+            if row < 0:
+                continue
+            self._row_of_id[int(faculty_id)] = -1
+            self._tombstone_ids.add(int(faculty_id))
+            name = self.names[row]
+            remaining = [r for r in self._rows_of_name.get(name, []) if r != row]
+            if remaining:
+                self._rows_of_name[name] = remaining
+            else:
+                self._rows_of_name.pop(name, None)
+            self._live_image_files.discard(self.image_files[row])
+            self._name_versions[name] = version
+        self.version = version
+
+    def compacted(self):
+        """
+        The live rows as faculty_data, with a clone of the index without the
+        deleted vectors (where the index type can remove them). O(N), for
+        writing a new snapshot.
+        """
+        rows = self.live_rows()
+        faculty_data = {
+            'names': [self.names[row] for row in rows],
+            'embeddings': self._buffer[rows],
+            'image_files': [self.image_files[row] for row in rows],
+            'ids': self._ids[rows].tolist(),
+            'next_id': self.next_id,
+            'journal_entries': self.journal_entries
+        }
+        index = None
+        if self.index is not None:
+            index = apply_search_params(faiss.clone_index(self.index))
+            index = remove_from_faiss_index(index, sorted(self._tombstone_ids))
+        return faculty_data, index
+
+    def search(self, queries, k):
+        """
+        Searches the index for prepared queries and returns (similarities, ids),
+        each (M, k) and best first. For approximate indexes a larger candidate
+        set is re-scored against the stored embeddings and re-sorted, so the
+        similarities callers threshold are exact. Deleted vectors the index
+        still holds are over-fetched for and dropped.
+        """
+        index = self.index
+        tombstones = max(0, index.ntotal - len(self))
+        if not self.approximate and tombstones == 0:
+            with self._index_lock.reading():
+                distances, indices = index.search(queries, k)
+            return similarity_from_distances(distances), indices
+
+        fetch = k + tombstones
+        if self.approximate:
+            fetch = max(fetch, RERANK_CANDIDATES)
+        with self._index_lock.reading():
+            distances, indices = index.search(queries, min(index.ntotal, fetch))
+        rows = self._rows_of_ids(indices)
+        if self.approximate:
+            # One gather of the candidate rows and one batched dot product
+            similarities = np.einsum('mkd,md->mk', self._buffer[rows], queries)
+        else:
+            similarities = np.array(similarity_from_distances(distances), dtype='float32')
+        # Padding (-1) and unknown IDs must sort last and never pass a threshold
+        similarities[rows == -1] = -np.inf
+        indices = np.where(rows == -1, -1, indices)
+        order = np.argsort(-similarities, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(similarities, order, 1), np.take_along_axis(indices, order, 1)
+
+    def name_for_id(self, faculty_id):
+        """Maps an ID returned by index.search back to a faculty name"""
+        row = int(self._rows_of_ids(faculty_id))
+        return None if row < 0 else self.names[row]
+
+# Process-wide cache: updated in place by journaled writes, replaced on
+# snapshot writes and when another process changed the files
+_gallery = None
+_gallery_stamp = None
+_gallery_version = 0
+_gallery_lock = threading.RLock()
+
+# Serializes read-modify-write cycles on the database (add/delete/clear)
+write_lock = threading.RLock()
+
+def _database_stamp():
+    """Returns (mtime, size) of the database files to detect writes by other processes"""
+    stamp = []
+    for path in (MANIFEST_FILE, JOURNAL_FILE, FLAT_METADATA_FILE):
+        try:
+            st = os.stat(path)
+            stamp.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+def _embedding_matrix(embeddings):
+    """Returns stored (already normalized) embeddings as a float32 matrix, copying only if needed"""
+    if len(embeddings) == 0:
+        return np.zeros((0, EMBEDDING_DIM), dtype='float32')
+    return np.asarray(embeddings, dtype='float32')
+
+def _install_gallery(faculty_data, index, stamp=None):
+    """Replaces the cached gallery with the given database state"""
+    global _gallery, _gallery_stamp, _gallery_version
+    with _gallery_lock:
+        _gallery_version += 1
+        _gallery = FacultyGallery(
+            faculty_data.get('names', []),
+            _embedding_matrix(faculty_data.get('embeddings', [])),
+            faculty_data.get('image_files', []),
+            faculty_data.get('ids', []),
+            index,
+            _gallery_version,
+            next_id=faculty_data.get('next_id', 0),
+            journal_entries=faculty_data.get('journal_entries', 0)
+        )
+        _gallery_stamp = stamp if stamp is not None else _database_stamp()
+        return _gallery
+
+def _next_gallery_version():
+    global _gallery_version
+    with _gallery_lock:
+        _gallery_version += 1
+        return _gallery_version
+
+def _mark_gallery_current(gallery):
+    """Records that the installed gallery includes the files as they are now (after a journal append)"""
+    global _gallery_stamp
+    with _gallery_lock:
+        if gallery is _gallery:
+            _gallery_stamp = _database_stamp()
+
+def invalidate_faculty_gallery():
+    """Drops the cached gallery so the next access reloads it from disk"""
+    global _gallery, _gallery_stamp, _gallery_version
+    with _gallery_lock:
+        _gallery_version += 1
+        _gallery = None
+        _gallery_stamp = None
+
+def get_faculty_gallery():
+    """
+    Returns the cached FacultyGallery, reloading it only when the database
+    files changed on disk since it was built.
+    """
+    stamp = _database_stamp()
+    gallery = _gallery
+    if gallery is not None and stamp == _gallery_stamp:
+        return gallery
+
+    with _gallery_lock:
+        # Another thread may have reloaded while we waited
+        if _gallery is not None and stamp == _gallery_stamp:
+            return _gallery
+        try:
+            faculty_data, index = load_faculty_database()
+        except RuntimeError as e:
+            # Searches see an empty gallery, but it isn't cached: writes keep
+            # failing (instead of overwriting the files) and the next read retries
+            print(f"Error: {e}")
+            return FacultyGallery([], _embedding_matrix([]), [], [], None, _gallery_version)
+        return _install_gallery(faculty_data, index, stamp)
+
+if __name__ == "__main__":
+    # python -m backend.recognition.faiss_store          -> migrate a legacy pickle store
+    # python -m backend.recognition.faiss_store rebuild  -> rebuild the index with current settings
+    import sys
+    if sys.argv[1:] == ["rebuild"]:
+        if rebuild_faiss_index():
+            print(f"Rebuilt FAISS index ({choose_index_type(len(get_faculty_gallery()))})")
+    elif os.path.exists(LEGACY_EMBEDDINGS_FILE):
+        migrate_legacy_database()
+    else:
+        print("No legacy faculty_embeddings.pkl found; nothing to migrate.")
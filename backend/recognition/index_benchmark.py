@@ -0,0 +1,122 @@
+"""
+Recall / latency comparison of the approximate FAISS index types against
+exact (flat) search, swept over efSearch (HNSW) and nprobe (IVF).
+Approximate indexes are searched through FacultyGallery.search, so IVF-PQ
+is measured with the exact re-rank production applies.
+
+    python -m backend.recognition.index_benchmark
+    python -m backend.recognition.index_benchmark --synthetic 100000 --queries 1000
+"""
+import time
+import json
+import argparse
+
+import faiss
+import numpy as np
+
+from . import faiss_store
+
+EF_SEARCH_VALUES = (16, 32, 64, 128, 256)
+NPROBE_VALUES = (1, 4, 16, 64)
+
+def synthetic_gallery(size, images_per_identity=4, noise=0.35, seed=0):
+    """Clustered normalized vectors (a few noisy 'images' per identity), like a real gallery"""
+    rng = np.random.default_rng(seed)
+    identities = max(1, size // images_per_identity)
+    centres = rng.standard_normal((identities, faiss_store.EMBEDDING_DIM), dtype=np.float32)
+    faiss.normalize_L2(centres)
+    rows = centres[np.arange(size) % identities]
+    rows = rows + noise * rng.standard_normal(rows.shape, dtype=np.float32) / np.sqrt(faiss_store.EMBEDDING_DIM)
+    return faiss_store.normalize_embeddings(rows)
+
+def make_queries(embeddings, count, noise=0.35, seed=1):
+    """Perturbed copies of random gallery rows, standing in for new captures of enrolled people"""
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(embeddings), size=count)
+    queries = embeddings[picks] + noise * rng.standard_normal(
+        (count, embeddings.shape[1]), dtype=np.float32) / np.sqrt(embeddings.shape[1])
+    return faiss_store.normalize_embeddings(queries)
+
+def _set_search_param(index, value):
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = value
+    else:
+        inner.nprobe = value
+
+def _served_gallery(embeddings, ids, index):
+    """A FacultyGallery around a built index, searched exactly like the server's"""
+    return faiss_store.FacultyGallery(
+        [str(i) for i in ids], embeddings, [""] * len(ids), ids, index, version=0, next_id=len(ids)
+    )
+
+def _timed_search(search, queries, k):
+    start = time.perf_counter()
+    _, ids = search(queries, k)
+    return ids, (time.perf_counter() - start) * 1000.0 / len(queries)
+
+def _recall(ids, truth):
+    k = truth.shape[1]
+    return {
+        "recall_at_1": float(np.mean(ids[:, 0] == truth[:, 0])),
+        f"recall_at_{k}": float(np.mean([len(set(a) & set(b)) / k for a, b in zip(ids, truth)]))
+    }
+
+def benchmark(embeddings, queries, k=10):
+    """Returns {index_type: {...}} with build time, and recall/latency per search setting"""
+    ids = np.arange(len(embeddings), dtype='int64')
+    k = min(k, len(embeddings))
+
+    flat = faiss_store.build_faiss_index(embeddings, ids, "flat")
+    truth, flat_ms = _timed_search(flat.search, queries, k)
+    report = {
+        "gallery_size": len(embeddings),
+        "queries": len(queries),
+        "flat": {"ms_per_query": flat_ms}
+    }
+
+    sweeps = {"hnsw": ("ef_search", EF_SEARCH_VALUES), "ivf_flat": ("nprobe", NPROBE_VALUES), "ivf_pq": ("nprobe", NPROBE_VALUES)}
+    min_sizes = {
+        "hnsw": 1,
+        "ivf_flat": faiss_store.IVF_MIN_POINTS_PER_LIST,
+        "ivf_pq": faiss_store.IVF_MIN_POINTS_PER_LIST * (1 << faiss_store.IVF_PQ_BITS)
+    }
+    for index_type, (param, values) in sweeps.items():
+        if len(embeddings) < min_sizes[index_type]:
+            report[index_type] = {"skipped": f"needs at least {min_sizes[index_type]} vectors"}
+            continue
+
+        start = time.perf_counter()
+        index = faiss_store.build_faiss_index(embeddings, ids, index_type)
+        gallery = _served_gallery(embeddings, ids, index)
+        entry = {"build_s": time.perf_counter() - start, "reranked": gallery.approximate, "runs": []}
+        for value in values:
+            _set_search_param(index, value)
+            found, ms = _timed_search(gallery.search, queries, k)
+            entry["runs"].append(dict(
+                {param: value, "ms_per_query": ms, "speedup_vs_flat": flat_ms / ms if ms else None},
+                **_recall(found, truth)
+            ))
+        report[index_type] = entry
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark approximate FAISS indexes against flat search")
+    parser.add_argument("--synthetic", type=int, default=0, help="use N synthetic vectors instead of the gallery")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        embeddings = synthetic_gallery(args.synthetic)
+    else:
+        gallery = faiss_store.get_faculty_gallery()
+        if len(gallery) == 0:
+            raise SystemExit("Gallery is empty; use --synthetic N")
+        embeddings = faiss_store.normalize_embeddings(gallery.embeddings[gallery.live_rows()])
+
+    queries = make_queries(embeddings, args.queries)
+    print(json.dumps(benchmark(embeddings, queries, args.k), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,20 @@
-import os
-import shutil
+import asyncio
 import base64
 import uuid
+import zipfile
 from typing import List, Optional
 
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Body
-from pydantic import BaseModel
+import numpy as np
+from fastapi import APIRouter, UploadFile, HTTPException, Request, BackgroundTasks
+from pydantic import BaseModel, ValidationError
 
 from . import faiss_store
 from . import faculty_manager
+from . import bulk_enroll
+from ..config.config_store import get_setting
 # Import global models from the inference module to pass to faculty_manager
-from ..inference.router import MODELS, ensure_models_loaded
+from ..inference.router import MODELS, ensure_models_loaded, decode_image
+from ..inference.worker_pool import run_inference
 
 router = APIRouter()
 
@@ -20,6 +24,12 @@ class AddFacultyPayload(BaseModel):
     image_base64: str
     name: str
 
+class AddImagePayload(BaseModel):
+    image_base64: str
+
+class BulkDirectoryPayload(BaseModel):
+    directory: str
+
 class DeleteFacultyPayload(BaseModel):
     name: str
 
@@ -30,95 +40,247 @@ class SpecificSearchPayload(BaseModel):
     embedding: List[float]
     target_name: str
 
+class BatchSearchPayload(BaseModel):
+    embeddings: List[List[float]]
+    top_k: int = 1
+    threshold: float = 0.6
+
 # --- Helper Functions ---
 
-def save_temp_image(file: Optional[UploadFile], base64_str: Optional[str]) -> str:
+async def read_upload_image(file: Optional[UploadFile], base64_str: Optional[str]):
     """
-    Saves uploaded image to the faculty_db folder to satisfy add_faculty_member logic.
-    Returns the filename and full path.
+    Reads an uploaded enrollment image into memory and returns its bytes.
+    Nothing is written to disk here, and decoding is left to the inference
+    pool (see enroll_image) so it never blocks the event loop.
     """
-    filename = f"{uuid.uuid4().hex}.jpg"
-    file_path = os.path.join(faiss_store.IMAGES_DIR, filename)
+    if file:
+        image_bytes = await file.read()
+    elif base64_str:
+        try:
+            image_bytes = base64.b64decode(base64_str)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid base64 string")
+    else:
+        raise HTTPException(status_code=400, detail="Image (file or base64) is required")
+    return image_bytes
 
-    try:
-        if file:
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-        elif base64_str:
-            img_data = base64.b64decode(base64_str)
-            with open(file_path, "wb") as buffer:
-                buffer.write(img_data)
-        else:
-            raise ValueError("No image provided")
-        return filename, file_path
-    except (IOError, OSError, ValueError) as e:
-        raise HTTPException(status_code=400, detail=f"Failed to process image: {str(e)}")
+def enroll_image(image_bytes: bytes, name: str, filename: str, existing_only: bool = False):
+    """Inference-pool job: decodes the upload, then detects, embeds and enrolls it"""
+    return faculty_manager.add_faculty_member(
+        MODELS["yolo"],
+        MODELS["insightface"],
+        decode_image(image_bytes),
+        name,
+        filename,
+        existing_only=existing_only
+    )
+
+def persist_enrollment_image(filename: str, image_bytes: bytes):
+    """Background task: stores the original upload once its enrollment succeeded"""
+    # Check and write under the lock deletes hold, so a concurrent delete cannot leave an orphan
+    with faiss_store.write_lock:
+        # Skip if the member was deleted again before this ran
+        if not faiss_store.get_faculty_gallery().has_image_file(filename):
+            return
+        try:
+            faiss_store.save_image_file(filename, image_bytes)
+        except (IOError, OSError) as e:
+            print(f"Warning: Failed to store enrollment image {filename}: {e}")
+
+def resolve_faculty_name(name: str) -> Optional[str]:
+    """Returns the enrolled name matching name case-insensitively, or None"""
+    for existing in faiss_store.get_faculty_gallery().identities:
+        if existing.lower() == name.lower():
+            return existing
+    return None
+
+def match_aggregation() -> str:
+    # Cached read: searches must not open the config file every time
+    return get_setting("match_aggregation")
+
+async def enroll_bulk_items(items):
+    """Shared tail of the bulk endpoints: validates the item count and enrolls them"""
+    if not items:
+        raise HTTPException(status_code=400, detail="No images found")
+    if len(items) > bulk_enroll.BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {bulk_enroll.BULK_MAX_ITEMS} images per request")
+
+    await asyncio.to_thread(ensure_models_loaded)
+
+    # Long-running: waits in a plain thread and feeds the inference pool one chunk at a time
+    report = await asyncio.to_thread(
+        bulk_enroll.add_faculty_bulk,
+        MODELS["yolo"],
+        MODELS["insightface"],
+        items
+    )
+    return dict(report, status="success" if report['added'] else "failed")
 
 # --- Endpoints ---
 
 @router.post("/faculty/add")
-async def add_faculty(
-    file: Optional[UploadFile] = File(None),
-    name: Optional[str] = Form(None),
-    payload: Optional[AddFacultyPayload] = Body(None)
-):
+async def add_faculty(request: Request, background_tasks: BackgroundTasks):
     """
     Add a new faculty member.
+    Body is either a multipart upload with "file" and "name" fields or JSON
+    {"image_base64": "...", "name": "..."}.
     Requires Models to be initialized in the inference module.
     """
-    ensure_models_loaded()
-    
-    # Handle inputs (Multipart or JSON)
-    final_name = name
-    image_base64 = None
-
-    if payload:
+    # Branch by hand: declaring File() and Body() together makes FastAPI parse
+    # every request as a form, so the JSON body would never be read
+    file, image_base64 = None, None
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            payload = AddFacultyPayload(**await request.json())
+        except (ValueError, TypeError, ValidationError) as e:
+            raise HTTPException(status_code=422, detail=f"Invalid add-faculty payload: {e}")
         final_name = payload.name
         image_base64 = payload.image_base64
-    
+    else:
+        form = await request.form()
+        upload = form.get("file")
+        file = upload if hasattr(upload, "read") else None
+        final_name = form.get("name")
+
     if not final_name:
         raise HTTPException(status_code=400, detail="Name is required")
 
-    # Save file to disk (Required by faculty_manager.add_faculty_member logic)
-    try:
-        filename, file_path = save_temp_image(file, image_base64)
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Image (file or base64) is required")
+    # May trigger a lazy model load, so keep it off the event loop
+    await asyncio.to_thread(ensure_models_loaded)
 
-    # Call manager
-    success, message = faculty_manager.add_faculty_member(
-        MODELS["yolo"],
-        MODELS["insightface"],
-        file_path,
-        final_name,
-        filename
-    )
+    # Decode in memory; the upload only reaches disk after a successful enrollment
+    image_bytes = await read_upload_image(file, image_base64)
+    filename = f"{uuid.uuid4().hex}.jpg"
+
+    # Decode, detection and embedding all run in the inference pool
+    success, message = await run_inference(enroll_image, image_bytes, final_name, filename)
 
     if not success:
-        # Clean up file if addition failed
-        if os.path.exists(file_path):
-            os.remove(file_path)
         raise HTTPException(status_code=500, detail=message)
 
+    background_tasks.add_task(persist_enrollment_image, filename, image_bytes)
     return {"status": "success", "message": message}
 
+@router.post("/faculty/bulk-add")
+async def bulk_add_faculty(request: Request):
+    """
+    Enroll many faculty images in one request. Multipart form with either:
+    - one .zip in "files" (folder per person, or files named after the person)
+    - several images in "files", with one "names" entry per file (or named after the person)
+    The gallery is updated once; the response reports every item.
+    For a directory on the server use /faculty/bulk-add-directory.
+    """
+    # Read repeated fields by hand: FastAPI 0.110 doesn't collect
+    # Optional[List[...]] File/Form parameters into lists
+    form = await request.form()
+    files = [upload for upload in form.getlist("files") if hasattr(upload, "read")]
+    names = form.getlist("names")
+    try:
+        if files and len(files) == 1 and files[0].filename.lower().endswith(".zip"):
+            items = bulk_enroll.items_from_zip(await files[0].read())
+        elif files:
+            if names and len(names) != len(files):
+                raise ValueError("names must have one entry per file")
+            items = [
+                {
+                    'name': names[i] if names else bulk_enroll.name_from_path(upload.filename),
+                    'data': await upload.read(),
+                    'source': upload.filename
+                }
+                for i, upload in enumerate(files)
+            ]
+        else:
+            raise ValueError("A zip or image files are required")
+    except (ValueError, OSError, zipfile.BadZipFile) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return await enroll_bulk_items(items)
+
+@router.post("/faculty/bulk-add-directory")
+async def bulk_add_faculty_directory(payload: BulkDirectoryPayload):
+    """
+    Enroll every image under a directory on the server, laid out like the
+    /faculty/bulk-add zip. The directory must be inside the BULK_IMPORT_ROOT
+    environment setting (relative paths are taken from it); without it the
+    endpoint is disabled.
+    """
+    try:
+        directory = bulk_enroll.resolve_import_directory(payload.directory)
+        items = await asyncio.to_thread(bulk_enroll.items_from_directory, directory)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except (ValueError, OSError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return await enroll_bulk_items(items)
+
+@router.post("/faculty/reembed")
+async def reembed_faculty():
+    """
+    Recompute all stored embeddings from the faculty_db images with the
+    current models (needed after migrating a legacy pickle database).
+    """
+    await asyncio.to_thread(ensure_models_loaded, True)
+    try:
+        report = await asyncio.to_thread(bulk_enroll.reembed_gallery, MODELS["yolo"], MODELS["insightface"])
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return dict(report, status="success")
+
+@router.post("/faculty/{name}/add-image")
+async def add_faculty_image(name: str, request: Request, background_tasks: BackgroundTasks):
+    """
+    Enroll another image of an existing faculty member (case-insensitive name).
+    Body is either a multipart upload in the "file" field or JSON
+    {"image_base64": "..."}. Each image adds one embedding; matching
+    aggregates them per person.
+    """
+    target_name = resolve_faculty_name(name)
+    if not target_name:
+        raise HTTPException(status_code=404, detail=f"Faculty member '{name}' not found.")
+
+    # Branch by hand: declaring File() and Body() together makes FastAPI parse
+    # every request as a form, so the JSON body would never be read
+    file, image_base64 = None, None
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            image_base64 = AddImagePayload(**await request.json()).image_base64
+        except (ValueError, TypeError, ValidationError) as e:
+            raise HTTPException(status_code=422, detail=f"Invalid add-image payload: {e}")
+    else:
+        upload = (await request.form()).get("file")
+        file = upload if hasattr(upload, "read") else None
+
+    await asyncio.to_thread(ensure_models_loaded)
+
+    image_bytes = await read_upload_image(file, image_base64)
+    filename = f"{uuid.uuid4().hex}.jpg"
+
+    success, message = await run_inference(enroll_image, image_bytes, target_name, filename, existing_only=True)
+
+    if not success:
+        if "not found" in message.lower():
+            raise HTTPException(status_code=404, detail=message)
+        raise HTTPException(status_code=500, detail=message)
+
+    background_tasks.add_task(persist_enrollment_image, filename, image_bytes)
+    return {
+        "status": "success",
+        "message": message,
+        "images": len(faiss_store.get_faculty_gallery().rows_for_name(target_name))
+    }
+
 @router.post("/faculty/delete")
 async def delete_faculty(payload: DeleteFacultyPayload):
     """Delete a faculty member by name (case-insensitive)"""
-    # Load current names to find exact case match
-    faculty_data, _ = faiss_store.load_faculty_database()
-    existing_names = faculty_data.get('names', [])
-    
-    target_name = None
-    for name in existing_names:
-        if name.lower() == payload.name.lower():
-            target_name = name
-            break
+    # Look up current names (cached gallery) to find exact case match
+    target_name = resolve_faculty_name(payload.name)
             
     if not target_name:
          raise HTTPException(status_code=404, detail=f"Faculty member '{payload.name}' not found.")
 
-    success, message = faculty_manager.delete_faculty_member(target_name)
+    # May rebuild an HNSW index, so keep it off the event loop
+    success, message = await asyncio.to_thread(faculty_manager.delete_faculty_member, target_name)
     
     if not success:
         # Check if it was "not found" (404) or "error" (500)
@@ -131,12 +293,12 @@ async def delete_faculty(payload: DeleteFacultyPayload):
 @router.post("/faculty/search")
 async def search_faculty(payload: SearchPayload):
     """Identify faculty from embedding"""
-    faculty_data, index = faiss_store.load_faculty_database()
+    gallery = faiss_store.get_faculty_gallery()
     
     match, name, confidence = faculty_manager.search_faculty(
-        index, 
-        faculty_data['names'], 
-        payload.embedding
+        gallery, 
+        payload.embedding,
+        aggregation=match_aggregation()
     )
     
     return {
@@ -145,16 +307,56 @@ async def search_faculty(payload: SearchPayload):
         "confidence": confidence
     }
 
+@router.post("/faculty/search-batch")
+async def search_faculty_batch(request: Request, top_k: int = 1, threshold: float = 0.6):
+    """
+    Identify many embeddings (M x 512) in one index search.
+    Body is either JSON {"embeddings": [[...], ...], "top_k", "threshold"} or
+    application/octet-stream with raw little-endian float32 rows, in which
+    case top_k/threshold come from the query string.
+    """
+    if request.headers.get("content-type", "").startswith("application/octet-stream"):
+        body = await request.body()
+        row_bytes = faiss_store.EMBEDDING_DIM * 4
+        if not body or len(body) % row_bytes:
+            raise HTTPException(status_code=400, detail=f"Body must be a whole number of {row_bytes}-byte float32 rows")
+        queries = np.frombuffer(body, dtype='<f4').reshape(-1, faiss_store.EMBEDDING_DIM)
+    else:
+        try:
+            payload = BatchSearchPayload(**await request.json())
+        except (ValueError, TypeError, ValidationError) as e:
+            raise HTTPException(status_code=422, detail=f"Invalid batch search payload: {e}")
+        if not payload.embeddings:
+            raise HTTPException(status_code=400, detail="At least one embedding is required")
+        if any(len(e) != faiss_store.EMBEDDING_DIM for e in payload.embeddings):
+            raise HTTPException(status_code=400, detail=f"Each embedding must have {faiss_store.EMBEDDING_DIM} values")
+        queries = np.asarray(payload.embeddings, dtype='float32')
+        top_k, threshold = payload.top_k, payload.threshold
+
+    if top_k < 1:
+        raise HTTPException(status_code=400, detail="top_k must be at least 1")
+
+    gallery = faiss_store.get_faculty_gallery()
+    results = faculty_manager.search_faculty_batch(gallery, queries, top_k=top_k, threshold=threshold)
+
+    return {
+        "count": len(results),
+        "results": [
+            {"matched": bool(matches), "matches": matches}
+            for matches in results
+        ]
+    }
+
 @router.post("/faculty/search-specific")
 async def search_specific(payload: SpecificSearchPayload):
     """Verify specific faculty member"""
-    faculty_data, index = faiss_store.load_faculty_database()
+    gallery = faiss_store.get_faculty_gallery()
     
     match, name, confidence = faculty_manager.search_faculty_specific(
-        index,
-        faculty_data['names'],
+        gallery,
         payload.embedding,
-        payload.target_name
+        payload.target_name,
+        aggregation=match_aggregation()
     )
     
     return {
@@ -166,7 +368,7 @@ async def search_specific(payload: SpecificSearchPayload):
 @router.post("/faculty/clear-db")
 async def clear_database():
     """Clear the entire faculty database"""
-    success, message, errors = faiss_store.clear_faculty_database()
+    success, message, errors = await asyncio.to_thread(faiss_store.clear_faculty_database)
     
     if not success:
         raise HTTPException(status_code=500, detail=message)
@@ -179,6 +381,5 @@ async def clear_database():
 
 @router.get("/faculty/list")
 async def list_faculty():
-    """List all registered faculty names"""
-    faculty_data, _ = faiss_store.load_faculty_database()
-    return {"faculty": faculty_data.get("names", [])}
\ No newline at end of file
+    """List all registered faculty names (once each, however many images they have)"""
+    return {"faculty": faiss_store.get_faculty_gallery().identities}
\ No newline at end of file
@@ -0,0 +1,42 @@
+import pytest
+
+pytest.importorskip("insightface")
+pytest.importorskip("onnxruntime")
+
+from fastapi import HTTPException
+
+from backend.inference import batcher
+
+
+def test_batches_run_as_one_pool_job(monkeypatch):
+    jobs = []
+
+    def fake_run(fn, model, images):
+        jobs.append(len(images))
+        return [[{'bbox': [0, 0, 1, 1], 'image': image}] for image in images]
+
+    monkeypatch.setattr(batcher, "run_inference_blocking", fake_run)
+    detector = batcher.DetectionBatcher(lambda: "model", window_ms=200, max_batch_size=3)
+
+    futures = [detector.submit(i) for i in range(3)]
+
+    assert [f.result(timeout=5)[0]['image'] for f in futures] == [0, 1, 2]
+    assert jobs == [3]
+    metrics = detector.metrics()
+    assert metrics["batches"] == 1
+    assert metrics["images"] == 3
+
+
+def test_saturated_pool_fails_the_batch_with_503(monkeypatch):
+    def saturated(*args):
+        raise batcher.PoolSaturatedError()
+
+    monkeypatch.setattr(batcher, "run_inference_blocking", saturated)
+    detector = batcher.DetectionBatcher(lambda: "model", window_ms=0, max_batch_size=1)
+
+    with pytest.raises(HTTPException) as error:
+        detector.submit("image").result(timeout=5)
+
+    assert error.value.status_code == 503
+    assert "Retry-After" in error.value.headers
+    assert detector.metrics()["batches"] == 0
@@ -0,0 +1,90 @@
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("insightface")
+
+from backend.config.config_store import DEFAULT_CONFIG
+from backend.recognition import bulk_enroll
+from backend.recognition import faiss_store
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    for name in ("MANIFEST_FILE", "JOURNAL_FILE", "FLAT_EMBEDDINGS_FILE", "FLAT_METADATA_FILE", "FAISS_INDEX_FILE"):
+        monkeypatch.setattr(faiss_store, name, str(tmp_path / name.lower()))
+    monkeypatch.setattr(faiss_store, "SNAPSHOTS_DIR", str(tmp_path / "snapshots"))
+    monkeypatch.setattr(faiss_store, "LEGACY_EMBEDDINGS_FILE", str(tmp_path / "legacy.pkl"))
+    monkeypatch.setattr(faiss_store, "IMAGES_DIR", str(tmp_path / "images"))
+    monkeypatch.setattr(faiss_store, "_index_setting", lambda key: DEFAULT_CONFIG[key])
+    faiss_store.invalidate_faculty_gallery()
+    yield
+    faiss_store.invalidate_faculty_gallery()
+
+
+def _unit(seed, count=1):
+    rows = np.random.default_rng(seed).standard_normal((count, faiss_store.EMBEDDING_DIM)).astype("float32")
+    return faiss_store.normalize_embeddings(rows)
+
+
+def test_chunks_run_in_the_inference_pool_and_back_off_when_saturated(monkeypatch):
+    calls = []
+
+    def fake_run(fn, *args):
+        calls.append(len(args[2]))
+        if len(calls) == 1:
+            raise bulk_enroll.PoolSaturatedError()
+        return fn(*args)
+
+    def fake_chunk(yolo, app, chunk, min_quality):
+        for item in chunk:
+            item['embedding'] = np.zeros(4)
+
+    sleeps = []
+    monkeypatch.setattr(bulk_enroll, "run_inference_blocking", fake_run)
+    monkeypatch.setattr(bulk_enroll, "_process_chunk", fake_chunk)
+    monkeypatch.setattr(bulk_enroll.time, "sleep", sleeps.append)
+    items = [{'name': str(i), 'error': None} for i in range(bulk_enroll.BULK_DETECT_BATCH + 2)]
+
+    bulk_enroll._process_items(None, None, items, min_quality=0.0)
+
+    # The saturated first chunk is retried; one pool job per chunk
+    assert calls == [bulk_enroll.BULK_DETECT_BATCH, bulk_enroll.BULK_DETECT_BATCH, 2]
+    assert sleeps == [bulk_enroll.RETRY_AFTER_SECONDS]
+    assert all('embedding' in item for item in items)
+
+
+def test_reembed_computes_outside_write_lock_and_skips_rows_deleted_meanwhile(monkeypatch, store):
+    with faiss_store.write_lock:
+        ids = faiss_store.add_faculty_rows(["a", "b", "c"], ["a.jpg", "b.jpg", "c.jpg"], _unit(0, 3))
+    new_vectors = {faculty_id: _unit(10 + faculty_id)[0] for faculty_id in ids}
+
+    def fake_process(yolo, app, items, min_quality):
+        probe = []
+
+        def try_lock():
+            if faiss_store.write_lock.acquire(blocking=False):
+                faiss_store.write_lock.release()
+                probe.append(True)
+
+        thread = threading.Thread(target=try_lock)
+        thread.start()
+        thread.join()
+        assert probe == [True], "write_lock held while embedding"
+        # An enrollment-side delete lands while the images are being embedded
+        with faiss_store.write_lock:
+            faiss_store.delete_faculty_ids([ids[1]])
+        for item in items:
+            item['embedding'] = new_vectors[item['id']]
+
+    monkeypatch.setattr(bulk_enroll, "_process_items", fake_process)
+
+    report = bulk_enroll.reembed_gallery(None, None)
+
+    gallery = faiss_store.get_faculty_gallery()
+    assert report['updated'] == 2
+    assert gallery.identities == ["a", "c"]
+    np.testing.assert_allclose(gallery.embeddings_for_name("a")[0], new_vectors[ids[0]], atol=1e-6)
+    np.testing.assert_allclose(gallery.embeddings_for_name("c")[0], new_vectors[ids[2]], atol=1e-6)
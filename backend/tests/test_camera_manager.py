@@ -0,0 +1,62 @@
+import pytest
+
+# The camera manager imports the pipeline, which imports the model stack
+pytest.importorskip("insightface")
+pytest.importorskip("onnxruntime")
+
+from backend.attendance import camera_manager as camera_module
+
+
+class FakeCapture:
+    def __init__(self):
+        self.released = False
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        self.released = True
+
+
+class FakeGrabber:
+    def __init__(self, cap):
+        self.running = False
+
+    def start(self):
+        self.running = True
+        return self
+
+    def stop(self):
+        self.running = False
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(camera_module, "open_capture", lambda source: FakeCapture())
+    monkeypatch.setattr(camera_module, "LatestFrameGrabber", FakeGrabber)
+    manager = camera_module.CameraManager()
+    manager.register("lab-2", 1)
+    return manager
+
+
+def test_close_unregisters_idle_source(manager):
+    session = manager.acquire("lab-2")
+    manager.release(session)
+
+    manager.close("lab-2")
+
+    assert not session.running
+    assert manager.acquire("lab-2") is None
+    assert manager.status() == []
+
+
+def test_close_of_busy_source_waits_for_last_user(manager):
+    session = manager.acquire("lab-2")
+
+    manager.close("lab-2")
+
+    # Still readable by its user, but nobody can reopen it by name
+    assert session.running
+    assert manager.acquire("lab-2") is None
+    manager.release(session)
+    assert not session.running
@@ -0,0 +1,80 @@
+import json
+import typing
+
+import pytest
+
+pytest.importorskip("insightface")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("faiss")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.config import config_store
+from backend.config import router as config_router
+from backend.inference import model_loader
+from backend.inference import router as inference_router
+from backend.recognition import faiss_store
+from backend.recognition import faculty_manager
+
+
+@pytest.fixture
+def config_file(monkeypatch, tmp_path):
+    path = tmp_path / "system_config.json"
+    monkeypatch.setattr(config_store, "CONFIG_FILE", str(path))
+    monkeypatch.setattr(config_store, "_cached_config", None)
+    monkeypatch.setattr(config_store, "_cached_stamp", None)
+    return path
+
+
+@pytest.fixture
+def client(config_file):
+    app = FastAPI()
+    app.include_router(config_router.router)
+    return TestClient(app)
+
+
+def test_enum_literals_match_the_modules_reading_them():
+    assert typing.get_args(config_router.ModelInitMode) == inference_router.MODEL_INIT_MODES
+    assert typing.get_args(config_router.DetectorBackend) == model_loader.DETECTOR_BACKENDS
+    assert typing.get_args(config_router.ModelPrecision) == model_loader.MODEL_PRECISIONS
+    assert typing.get_args(config_router.MatchAggregation) == faculty_manager.MATCH_AGGREGATIONS
+    assert typing.get_args(config_router.FaissIndexType) == ("auto",) + faiss_store.INDEX_TYPES
+
+
+@pytest.mark.parametrize("field, value", [
+    ("match_aggregation", "median"),
+    ("faiss_index_type", "ivf"),
+    ("detector_backend", "tensorrt"),
+    ("model_precision", "fp16"),
+    ("model_init_mode", "later"),
+])
+def test_patch_rejects_unknown_enum_values(client, config_file, field, value):
+    response = client.patch("/config/update", json={field: value})
+
+    assert response.status_code == 422
+    assert not config_file.exists()
+
+
+def test_patch_accepts_known_enum_values(client, config_file):
+    response = client.patch("/config/update", json={"match_aggregation": "centroid", "faiss_index_type": "hnsw"})
+
+    assert response.status_code == 200
+    saved = json.loads(config_file.read_text())
+    assert saved["match_aggregation"] == "centroid"
+    assert saved["faiss_index_type"] == "hnsw"
+
+
+def test_get_setting_rereads_only_when_the_file_changes(monkeypatch, config_file):
+    config_file.write_text(json.dumps({"faiss_nprobe": 8}))
+    loads = []
+    real_load = config_store.load_config
+    monkeypatch.setattr(config_store, "load_config", lambda: loads.append(1) or real_load())
+
+    assert config_store.get_setting("faiss_nprobe") == 8
+    assert config_store.get_setting("faiss_ef_search") == config_store.DEFAULT_CONFIG["faiss_ef_search"]
+    assert len(loads) == 1
+
+    config_file.write_text(json.dumps({"faiss_nprobe": 32}))
+    assert config_store.get_setting("faiss_nprobe") == 32
+    assert len(loads) == 2
@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+pytest.importorskip("insightface")
+
+from backend.inference import face_quality
+from backend.recognition import faculty_manager
+
+# 5-point landmarks of a frontal face about 40px between the eyes
+FRONTAL = np.array([[80, 90], [120, 90], [100, 110], [84, 130], [116, 130]], dtype="float32")
+
+
+def _textured_image(seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 255, (240, 240, 3), dtype=np.uint8)
+
+
+class FakeDetection:
+    """InsightFace 'detection' stand-in: finds a frontal face in any crop it is given"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def detect(self, crop, max_num=1):
+        self.calls += 1
+        h, w = crop.shape[:2]
+        kps = FRONTAL - FRONTAL.mean(axis=0) + np.array([w / 2, h / 2], dtype="float32")
+        return None, kps[None]
+
+
+class FakeRecognition:
+    def __init__(self):
+        self.crops = []
+
+    def get_feat(self, crops):
+        self.crops.extend(crops)
+        return np.ones((len(crops), 4), dtype="float32")
+
+
+def _untrusted_app():
+    return SimpleNamespace(models={"detection": FakeDetection(), "recognition": FakeRecognition()})
+
+
+def test_untrusted_boxes_skip_size_and_pose():
+    image = _textured_image()
+    # A tall person box with nonsense landmarks: only sharpness and exposure may count
+    face = {"bbox": [40, 0, 200, 240], "landmarks": np.zeros((5, 2))}
+    crop = image[0:240, 40:200]
+    expected = face_quality._weighted(face_quality._crop_scores(crop))
+
+    assert face_quality.score_face(image, face, face_box=False) == pytest.approx(expected)
+    assert face_quality.score_face(image, face) != pytest.approx(expected)
+
+
+def test_enrollment_scores_the_relocalized_aligned_crop(monkeypatch):
+    app = _untrusted_app()
+    image = _textured_image()
+    person_box = {"bbox": [20, 10, 220, 230], "confidence": 0.9}
+    monkeypatch.setattr(face_quality, "score_face", lambda *args, **kwargs: pytest.fail("raw box scored"))
+
+    embedding, error = faculty_manager.enrollment_embedding(app, image, [person_box], min_quality=0.0)
+
+    assert error is None
+    assert embedding.shape == (4,)
+    assert app.models["detection"].calls == 1
+    # The crop embedded is the 112x112 aligned one that was scored
+    assert [crop.shape for crop in app.models["recognition"].crops] == [(112, 112, 3)]
+
+
+def test_enrollment_rejects_low_quality_aligned_crop():
+    app = _untrusted_app()
+    flat = np.full((240, 240, 3), 128, dtype=np.uint8)
+
+    embedding, error = faculty_manager.enrollment_embedding(app, flat, [{"bbox": [20, 10, 220, 230]}], min_quality=0.9)
+
+    assert embedding is None
+    assert "quality too low" in error
+    assert app.models["recognition"].crops == []
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("insightface")
+
+from backend.recognition import faiss_store
+from backend.recognition.faculty_manager import search_faculty, search_faculty_batch, search_faculty_specific
+
+
+def _axis(i):
+    vector = np.zeros(faiss_store.EMBEDDING_DIM, dtype="float32")
+    vector[i] = 1.0
+    return vector
+
+
+def _unit(vector):
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def gallery():
+    """alice: e0 and (e0+e1)/sqrt2, bob: e2, carol: 0.8 e0 + 0.6 e3"""
+    names = ["alice", "alice", "bob", "carol"]
+    embeddings = np.stack([
+        _axis(0), _unit(_axis(0) + _axis(1)), _axis(2), 0.8 * _axis(0) + 0.6 * _axis(3)
+    ]).astype("float32")
+    ids = list(range(len(names)))
+    index = faiss_store.build_faiss_index(embeddings, ids, "flat")
+    return faiss_store.FacultyGallery(names, embeddings, [""] * len(names), ids, index, version=0, next_id=len(ids))
+
+
+def test_batch_returns_one_entry_per_identity_up_to_top_k(gallery):
+    results = search_faculty_batch(gallery, [_axis(0), _axis(2)], top_k=2, threshold=0.5)
+
+    # alice's second image (0.71) does not take carol's place
+    assert [m['name'] for m in results[0]] == ["alice", "carol"]
+    assert [m['confidence'] for m in results[0]] == pytest.approx([1.0, 0.8])
+    assert [m['name'] for m in results[1]] == ["bob"]
+
+
+def test_batch_applies_the_threshold_per_query(gallery):
+    results = search_faculty_batch(gallery, [_axis(0), _axis(4)], top_k=3, threshold=0.9)
+
+    assert [m['name'] for m in results[0]] == ["alice"]
+    assert results[1] == []
+    assert search_faculty_batch(gallery, [_axis(0)], top_k=1, threshold=0.5) == [[{'name': "alice", 'confidence': pytest.approx(1.0)}]]
+
+
+def test_batch_on_an_empty_gallery():
+    empty = faiss_store.FacultyGallery([], np.zeros((0, faiss_store.EMBEDDING_DIM), "float32"), [], [], None, version=0)
+
+    assert search_faculty_batch(empty, [_axis(0), _axis(1)], top_k=2) == [[], []]
+
+
+@pytest.mark.parametrize("aggregation, expected", [
+    ("max", 1.0),
+    ("mean", (1.0 + np.sqrt(0.5)) / 2),
+    # centroid of alice's two rows, normalized: cos(22.5 degrees)
+    ("centroid", np.cos(np.pi / 8)),
+])
+def test_specific_aggregations(gallery, aggregation, expected):
+    matched, name, similarity = search_faculty_specific(gallery, _axis(0), "alice", threshold=0.0, aggregation=aggregation)
+
+    assert matched and name == "alice"
+    assert similarity == pytest.approx(expected, abs=1e-5)
+
+
+def test_specific_threshold_depends_on_the_aggregation(gallery):
+    assert search_faculty_specific(gallery, _axis(0), "alice", threshold=0.9, aggregation="max")[0]
+    assert search_faculty_specific(gallery, _axis(0), "alice", threshold=0.9, aggregation="centroid")[0]
+    assert search_faculty_specific(gallery, _axis(0), "alice", threshold=0.9, aggregation="mean") == (False, None, 0.0)
+
+
+def test_specific_verifies_the_target_even_when_others_are_closer(gallery):
+    matched, name, similarity = search_faculty_specific(gallery, _axis(0), "carol", threshold=0.5)
+
+    assert matched and name == "carol" and similarity == pytest.approx(0.8)
+    assert search_faculty_specific(gallery, _axis(0), "nobody") == (False, None, 0.0)
+
+
+def test_unnormalized_queries_score_as_cosine_similarity(gallery):
+    # A scaled copy of carol's row scores its cosine (1.0), not the raw inner product (7.0)
+    query = 7.0 * (0.8 * _axis(0) + 0.6 * _axis(3))
+
+    matched, name, similarity = search_faculty(gallery, query, threshold=0.5)
+    assert matched and name == "carol" and similarity == pytest.approx(1.0)
+
+    results = search_faculty_batch(gallery, [3.0 * _axis(0)], top_k=3, threshold=0.8)
+    assert [(m['name'], round(m['confidence'], 4)) for m in results[0]] == [("alice", 1.0), ("carol", 0.8)]
+
+
+def test_prepare_queries_reuses_normalized_float32_rows():
+    queries = np.stack([_axis(0), _axis(1)])
+
+    assert faiss_store.prepare_queries(queries) is queries
+    scaled = faiss_store.prepare_queries(2.0 * queries)
+    np.testing.assert_allclose(np.linalg.norm(scaled, axis=1), 1.0, atol=1e-6)
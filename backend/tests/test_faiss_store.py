@@ -0,0 +1,230 @@
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip("faiss")
+
+from backend.config.config_store import DEFAULT_CONFIG
+from backend.recognition import faiss_store
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    """Points the store at a temporary directory with "auto" index selection and small thresholds"""
+    for name in ("MANIFEST_FILE", "JOURNAL_FILE", "FLAT_EMBEDDINGS_FILE", "FLAT_METADATA_FILE", "FAISS_INDEX_FILE"):
+        monkeypatch.setattr(faiss_store, name, str(tmp_path / name.lower()))
+    monkeypatch.setattr(faiss_store, "SNAPSHOTS_DIR", str(tmp_path / "snapshots"))
+    monkeypatch.setattr(faiss_store, "LEGACY_EMBEDDINGS_FILE", str(tmp_path / "legacy.pkl"))
+    settings = dict(DEFAULT_CONFIG, faiss_index_type="auto")
+    monkeypatch.setattr(faiss_store, "_index_setting", lambda key: settings[key])
+    monkeypatch.setattr(faiss_store, "AUTO_HNSW_MIN_SIZE", 100)
+    faiss_store.invalidate_faculty_gallery()
+    yield settings
+    faiss_store.invalidate_faculty_gallery()
+
+
+def _vectors(count, seed=0):
+    return faiss_store.normalize_embeddings(np.random.default_rng(seed).standard_normal((count, 512)))
+
+
+def _gallery_data(count, seed=0):
+    return {'names': [f"p{i}" for i in range(count)], 'embeddings': _vectors(count, seed),
+            'image_files': [""] * count, 'ids': list(range(count)), 'next_id': count}
+
+
+def _save(data):
+    assert faiss_store.save_faculty_database(data, faiss_store.build_faiss_index(data['embeddings'], data['ids']))
+
+
+def test_snapshot_is_memory_mapped(store):
+    for count in (3, 4, 5):
+        _save(_gallery_data(count))
+    # Only the current snapshot and the previous one are kept
+    assert faiss_store._snapshot_names() == ["00000002", "00000003"]
+    faculty_data, index = faiss_store.load_faculty_database()
+    assert isinstance(faculty_data['embeddings'], np.memmap)
+    assert faculty_data['ids'] == list(range(5)) and index.ntotal == 5
+
+
+def test_crash_before_manifest_switch_keeps_previous_snapshot(store, monkeypatch):
+    _save(_gallery_data(5))
+    # The new snapshot is written, then the process dies before the manifest is replaced
+    monkeypatch.setattr(faiss_store, "_atomic_write", lambda *args, **kwargs: (_ for _ in ()).throw(OSError("crash")))
+    assert not faiss_store.save_faculty_database(_gallery_data(7, seed=1), None)
+
+    faculty_data, _ = faiss_store.load_faculty_database()
+    assert faculty_data['ids'] == list(range(5))
+    np.testing.assert_allclose(faculty_data['embeddings'], _vectors(5))
+
+
+def test_damaged_snapshot_falls_back_to_previous_and_replays_journal(store):
+    _save(_gallery_data(5))
+    _save(_gallery_data(6))
+    assert faiss_store.add_faculty_rows(["late"], [""], _vectors(1, seed=2)) == [6]
+
+    # Truncate the current snapshot's matrix: its row count no longer matches the manifest
+    manifest = faiss_store._read_manifest()
+    current = f"{faiss_store.SNAPSHOTS_DIR}/{manifest['snapshot']}/{faiss_store.SNAPSHOT_EMBEDDINGS}"
+    np.save(current, _vectors(2))
+
+    faculty_data, index = faiss_store.load_faculty_database()
+    assert faculty_data['ids'] == [0, 1, 2, 3, 4, 6]
+    assert faculty_data['names'][-1] == "late" and index.ntotal == 6
+
+
+def test_index_type_keeps_current_kind_near_threshold(store):
+    assert faiss_store.choose_index_type(99) == "flat"
+    assert faiss_store.choose_index_type(100) == "hnsw"
+    assert faiss_store.choose_index_type(100, current="flat") == "flat"
+    assert faiss_store.choose_index_type(99, current="hnsw") == "hnsw"
+    assert faiss_store.choose_index_type(120, current="flat") == "hnsw"
+    assert faiss_store.choose_index_type(80, current="hnsw") == "flat"
+
+
+def test_add_delete_at_threshold_does_not_rebuild(store, monkeypatch):
+    vectors = _vectors(100)
+    _save(_gallery_data(99))
+
+    snapshots = []
+    monkeypatch.setattr(faiss_store, "save_faculty_database", lambda *args: snapshots.append(args) or True)
+    for _ in range(3):
+        ids = faiss_store.add_faculty_rows(["extra"], [""], vectors[99:])
+        assert faiss_store.delete_faculty_ids(ids)
+
+    assert not snapshots
+    assert faiss_store.index_kind(faiss_store.get_faculty_gallery().index) == "flat"
+
+
+def test_ivf_index_is_retrained_as_gallery_grows(store):
+    store["faiss_index_type"] = "ivf_flat"
+    vectors = _vectors(2000)
+    index = faiss_store.build_faiss_index(vectors[:80], np.arange(80))
+    assert faiss.extract_index_ivf(index).nlist == faiss_store._ivf_nlist(80)
+    assert not faiss_store.index_needs_rebuild(index, 80)
+
+    faiss_store.add_to_faiss_index(index, vectors[80:], np.arange(80, 2000))
+    assert faiss_store.index_needs_rebuild(index, 2000)
+
+
+def test_writes_update_the_live_gallery_in_place(store):
+    _save(_gallery_data(20))
+    gallery = faiss_store.get_faculty_gallery()
+    index = gallery.index
+
+    added = []
+    for i in range(5):
+        added += faiss_store.add_faculty_rows([f"new{i}"], [f"new{i}.jpg"], _vectors(1, seed=10 + i))
+    assert faiss_store.delete_faculty_ids([3, added[0]])
+
+    # Same gallery and index objects: nothing was cloned or rebuilt
+    assert faiss_store.get_faculty_gallery() is gallery and gallery.index is index
+    # The buffer grew by doubling, not by one row per add
+    assert len(gallery._buffer) == 40
+    assert len(gallery) == 23 and "p3" not in gallery.identities and "new0" not in gallery.identities
+    assert gallery.rows_for_name("new4") == [24] and gallery.has_image_file("new4.jpg")
+    assert not gallery.has_image_file("new0.jpg")
+
+    # A reload from disk (snapshot + journal) sees the same gallery
+    faiss_store.invalidate_faculty_gallery()
+    reloaded = faiss_store.get_faculty_gallery()
+    assert reloaded.identities == gallery.identities
+    np.testing.assert_allclose(reloaded.embeddings_for_name("new4"), gallery.embeddings_for_name("new4"))
+
+
+def test_journal_compaction_writes_a_compacted_snapshot(store, monkeypatch):
+    monkeypatch.setattr(faiss_store, "JOURNAL_COMPACT_ENTRIES", 3)
+    _save(_gallery_data(10))
+    faiss_store.delete_faculty_ids([0])
+    faiss_store.add_faculty_rows(["a"], [""], _vectors(1, seed=3))
+    assert faiss_store._read_journal()
+
+    # The third entry reaches the threshold: a new snapshot without tombstones, empty journal
+    faiss_store.add_faculty_rows(["b"], [""], _vectors(1, seed=4))
+    assert not faiss_store._read_journal()
+    gallery = faiss_store.get_faculty_gallery()
+    assert gallery.index.ntotal == len(gallery) == 11
+    assert faiss_store._read_manifest()['rows'] == 11
+
+
+def test_gallery_is_served_from_cache_until_the_files_change(store):
+    _save(_gallery_data(4))
+    gallery = faiss_store.get_faculty_gallery()
+    assert faiss_store.get_faculty_gallery() is gallery
+
+    # Another process appends a row to the journal
+    faiss_store._append_journal([faiss_store.journal_add(4, "other", "", _vectors(1, seed=5)[0])])
+    reloaded = faiss_store.get_faculty_gallery()
+    assert reloaded is not gallery and reloaded.version > gallery.version
+    assert "other" in reloaded.identities and "other" not in gallery.identities
+    assert faiss_store.get_faculty_gallery() is reloaded
+
+
+def test_journal_replay_skips_a_torn_trailing_line(store):
+    _save(_gallery_data(5))
+    faiss_store.add_faculty_rows(["a"], [""], _vectors(1, seed=6))
+    # The process died halfway through appending the next entry
+    with open(faiss_store.JOURNAL_FILE, "ab") as f:
+        f.write(b'{"op": "add", "id": 6, "name": "b", "emb')
+
+    faiss_store.invalidate_faculty_gallery()
+    faculty_data, index = faiss_store.load_faculty_database()
+    assert faculty_data['ids'] == [0, 1, 2, 3, 4, 5] and index.ntotal == 6
+
+    # The next append starts on a fresh line, so both entries replay
+    faiss_store.add_faculty_rows(["c"], [""], _vectors(1, seed=7))
+    faiss_store.invalidate_faculty_gallery()
+    faculty_data, _ = faiss_store.load_faculty_database()
+    assert faculty_data['names'][-2:] == ["a", "c"]
+
+
+def test_hnsw_search_never_returns_deleted_ids(store):
+    store["faiss_index_type"] = "hnsw"
+    data = _gallery_data(50)
+    _save(data)
+    query = data['embeddings'][:1]
+    # Delete the query's nearest neighbours: they stay in the HNSW graph as tombstones
+    similarities = data['embeddings'] @ query[0]
+    deleted = [int(i) for i in np.argsort(-similarities)[:5]]
+    assert faiss_store.delete_faculty_ids(deleted)
+
+    gallery = faiss_store.get_faculty_gallery()
+    assert faiss_store.index_kind(gallery.index) == "hnsw" and gallery.index.ntotal == 50
+    scores, ids = gallery.search(np.ascontiguousarray(query, dtype='float32'), 5)
+    # Over-fetched past the tombstones: k live results, none of them deleted
+    assert not set(ids[0].tolist()) & set(deleted)
+    assert -1 not in ids[0]
+    assert np.all(np.diff(scores[0]) <= 1e-6)
+
+
+def test_tombstones_past_the_limit_compact_the_index(store, monkeypatch):
+    store["faiss_index_type"] = "hnsw"
+    monkeypatch.setattr(faiss_store, "MAX_TOMBSTONES", 3)
+    _save(_gallery_data(20))
+    for faculty_id in range(3):
+        assert faiss_store.delete_faculty_ids([faculty_id])
+    assert faiss_store.get_faculty_gallery().index.ntotal == 20
+
+    # The fourth tombstone would exceed the limit: the index is rebuilt without them
+    assert faiss_store.delete_faculty_ids([3])
+    gallery = faiss_store.get_faculty_gallery()
+    assert gallery.index.ntotal == len(gallery) == 16
+    assert not faiss_store._read_journal()
+
+
+def test_ivf_pq_results_are_rescored_exactly(store, monkeypatch):
+    # A small codebook keeps training fast; the codes stay lossy
+    monkeypatch.setattr(faiss_store, "IVF_PQ_BITS", 4)
+    size = faiss_store.IVF_MIN_POINTS_PER_LIST * (1 << faiss_store.IVF_PQ_BITS)
+    vectors = _vectors(size)
+    ids = np.arange(size)
+    index = faiss_store.build_faiss_index(vectors, ids, "ivf_pq")
+    gallery = faiss_store.FacultyGallery([str(i) for i in ids], vectors, [""] * size, ids, index, version=0, next_id=size)
+    assert gallery.approximate
+
+    queries = faiss_store.normalize_embeddings(vectors[:20] + 0.05 * _vectors(20, seed=8))
+    scores, found = gallery.search(queries, 5)
+
+    # Similarities are the exact dot products with the stored rows (raw PQ scores are off
+    # by up to ~0.6 here), best first, so thresholds apply to true cosine similarities
+    np.testing.assert_allclose(scores, np.einsum('mkd,md->mk', vectors[found], queries), atol=1e-5)
+    assert np.all(np.diff(scores, axis=1) <= 1e-6)
+    assert (found[:, 0] == np.arange(20)).all()
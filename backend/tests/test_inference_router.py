@@ -0,0 +1,201 @@
+import base64
+
+import cv2
+import numpy as np
+import pytest
+
+# The routers import the model stack at module level
+pytest.importorskip("insightface")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("requests")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.inference import batcher
+from backend.inference import embeddings
+from backend.inference import face_detect
+from backend.inference import router as inference_router
+
+
+def _jpeg(width=64, height=48):
+    ok, encoded = cv2.imencode(".jpg", np.full((height, width, 3), 128, dtype=np.uint8))
+    assert ok
+    return encoded.tobytes()
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Records what the embedding endpoints pass to the embedding functions"""
+    recorded = []
+
+    def fake_batch(app, image, bboxes, landmarks=None):
+        recorded.append({'shape': image.shape, 'boxes': bboxes, 'landmarks': landmarks})
+        return [np.full(4, i, dtype=np.float32) for i in range(len(bboxes))]
+
+    def fake_single(app, image, bbox, landmarks=None):
+        recorded.append({'shape': image.shape, 'boxes': bbox, 'landmarks': landmarks})
+        return np.ones(4, dtype=np.float32)
+
+    monkeypatch.setattr(inference_router, "ensure_models_loaded", lambda *args, **kwargs: None)
+    monkeypatch.setattr(embeddings, "get_face_embeddings_batch", fake_batch)
+    monkeypatch.setattr(embeddings, "get_face_embedding", fake_single)
+    return recorded
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(inference_router.router, prefix="/inference")
+    return TestClient(app)
+
+
+LANDMARKS = [[10.0, 12.0], [30.0, 12.0], [20.0, 22.0], [12.0, 32.0], [28.0, 32.0]]
+
+
+def test_extract_embeddings_json(client, calls):
+    response = client.post("/inference/extract-embeddings", json={
+        "image_base64": base64.b64encode(_jpeg()).decode("ascii"),
+        "bboxes": [[0, 0, 20, 20], [20, 10, 40, 30]],
+        "landmarks": [LANDMARKS, None]
+    })
+    assert response.status_code == 200, response.text
+    assert response.json()["embeddings"] == [[0.0] * 4, [1.0] * 4]
+    assert calls == [{'shape': (48, 64, 3), 'boxes': [[0, 0, 20, 20], [20, 10, 40, 30]],
+                      'landmarks': [LANDMARKS, None]}]
+
+
+def test_extract_embeddings_multipart(client, calls):
+    response = client.post(
+        "/inference/extract-embeddings",
+        files={"file": ("frame.jpg", _jpeg(), "image/jpeg")},
+        data={"bboxes": "[[0, 0, 20, 20]]"}
+    )
+    assert response.status_code == 200, response.text
+    assert calls[0]['boxes'] == [[0, 0, 20, 20]] and calls[0]['landmarks'] is None
+
+
+def test_extract_embedding_json_with_landmarks(client, calls):
+    response = client.post("/inference/extract-embedding", json={
+        "image_base64": base64.b64encode(_jpeg()).decode("ascii"),
+        "bbox": [0, 0, 40, 40],
+        "landmarks": LANDMARKS
+    })
+    assert response.status_code == 200, response.text
+    assert response.json()["embedding"] == [1.0] * 4
+    assert calls[0]['landmarks'] == LANDMARKS
+
+
+def test_extract_embeddings_without_input(client, calls):
+    response = client.post("/inference/extract-embeddings", data={"bboxes": "[[0, 0, 1, 1]]"})
+    assert response.status_code == 400
+    assert not calls
+
+
+@pytest.mark.parametrize("max_side", [0, -1])
+def test_detect_faces_raw_rejects_non_positive_max_side(client, calls, max_side):
+    response = client.post(
+        f"/inference/detect-faces/raw?max_side={max_side}",
+        content=_jpeg(), headers={"Content-Type": "image/jpeg"}
+    )
+    assert response.status_code == 422
+
+
+@pytest.fixture(params=[False, True], ids=["pooled", "batched"])
+def detections(request, monkeypatch):
+    """Records the images /detect-faces runs YOLO on, with and without micro-batching"""
+    recorded = []
+    face = {'bbox': [1, 2, 30, 40], 'confidence': 0.9}
+
+    def fake_detect(yolo, image):
+        recorded.append(image.shape)
+        return [dict(face)]
+
+    class FakeBatcher:
+        async def detect(self, image):
+            return fake_detect(None, image)
+
+    monkeypatch.setattr(inference_router, "ensure_models_loaded", lambda *args, **kwargs: None)
+    monkeypatch.setattr(face_detect, "detect_faces_yolo", fake_detect)
+    monkeypatch.setattr(batcher, "batching_enabled", lambda: request.param)
+    monkeypatch.setattr(batcher, "get_detection_batcher", lambda get_model: FakeBatcher())
+    return recorded
+
+
+def test_detect_faces_json(client, detections):
+    response = client.post("/inference/detect-faces", json={"image_base64": base64.b64encode(_jpeg()).decode("ascii")})
+    assert response.status_code == 200, response.text
+    assert response.json()["faces"] == [{"bbox": [1, 2, 30, 40], "confidence": 0.9}]
+    assert detections == [(48, 64, 3)]
+
+
+def test_detect_faces_multipart(client, detections):
+    response = client.post("/inference/detect-faces", files={"file": ("frame.jpg", _jpeg(), "image/jpeg")})
+    assert response.status_code == 200, response.text
+    assert detections == [(48, 64, 3)]
+
+
+def test_detect_faces_without_input(client, detections):
+    response = client.post("/inference/detect-faces", data={"other": "x"})
+    assert response.status_code == 400
+    assert not detections
+
+
+@pytest.mark.parametrize("bboxes", ['{"a": 1}', '[1, 2]', '[[0, 0, 20]]', '[["a", 0, 1, 1]]'])
+def test_extract_embeddings_raw_rejects_malformed_bboxes(client, calls, bboxes):
+    response = client.post(
+        "/inference/extract-embeddings/raw", params={"bboxes": bboxes},
+        content=_jpeg(), headers={"Content-Type": "image/jpeg"}
+    )
+    assert response.status_code == 400
+    assert "Invalid bboxes" in response.json()["detail"]
+    assert not calls
+
+
+@pytest.mark.parametrize("fields", [
+    {"bboxes": '{"a": 1}'},
+    {"bboxes": '[1, 2]'},
+    {"bboxes": '[[0, 0, 20, 20]]', "landmarks": '[[[1, 2]]]'},
+    {"bboxes": '[[0, 0, 20, 20]]', "landmarks": '[null, null]'},
+])
+def test_extract_embeddings_multipart_rejects_malformed_boxes(client, calls, fields):
+    response = client.post(
+        "/inference/extract-embeddings",
+        files={"file": ("frame.jpg", _jpeg(), "image/jpeg")},
+        data=fields
+    )
+    assert response.status_code == 400
+    assert not calls
+
+
+def test_extract_embeddings_raw(client, calls):
+    response = client.post(
+        "/inference/extract-embeddings/raw", params={"bboxes": "[[0, 0, 20, 20]]"},
+        content=_jpeg(), headers={"Content-Type": "image/jpeg"}
+    )
+    assert response.status_code == 200, response.text
+    assert calls[0]['boxes'] == [[0, 0, 20, 20]]
+
+
+def test_extract_embedding_without_insightface_is_503(client, monkeypatch):
+    monkeypatch.setitem(inference_router.MODELS, "yolo", object())
+    monkeypatch.setitem(inference_router.MODELS, "insightface", None)
+    response = client.post("/inference/extract-embedding", json={
+        "image_base64": base64.b64encode(_jpeg()).decode("ascii"),
+        "bbox": [0, 0, 40, 40]
+    })
+    assert response.status_code == 503
+
+
+@pytest.mark.parametrize("margin_ratio, expected", [(None, {}), (0.25, {'margin_ratio': 0.25})])
+def test_get_face_embedding_threads_margin_ratio_to_the_batch_path(monkeypatch, margin_ratio, expected):
+    forwarded = []
+
+    def fake_batch(app, image, bboxes, **kwargs):
+        forwarded.append({k: v for k, v in kwargs.items() if k != 'landmarks'})
+        return [np.ones(4, dtype=np.float32)]
+
+    monkeypatch.setattr(embeddings, "get_face_embeddings_batch", fake_batch)
+    app = type("App", (), {"models": {"recognition": object()}})()
+    embeddings.get_face_embedding(app, np.zeros((48, 64, 3), np.uint8), [0, 0, 40, 40], margin_ratio=margin_ratio)
+    assert forwarded == [expected]
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+
+from backend.attendance import motion_gate
+from backend.attendance.motion_gate import MotionGate
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(motion_gate.time, "time", lambda: now[0])
+    return now
+
+
+def _frame(value=100, square=None):
+    frame = np.full((120, 160, 3), value, dtype=np.uint8)
+    if square is not None:
+        x, y = square
+        frame[y:y + 40, x:x + 40] = 255
+    return frame
+
+
+def test_unchanged_frames_are_skipped(clock):
+    gate = MotionGate(sensitivity=0.01, refresh_interval=5.0)
+
+    assert gate.should_process(_frame())  # first frame always passes
+    clock[0] += 1.0
+    assert not gate.should_process(_frame())
+    assert (gate.frames_passed, gate.frames_skipped) == (1, 1)
+
+
+def test_motion_passes_the_gate(clock):
+    gate = MotionGate(sensitivity=0.01, refresh_interval=5.0)
+    gate.should_process(_frame())
+
+    clock[0] += 0.1
+    assert gate.should_process(_frame(square=(60, 40)))
+    # The moved-to frame is the new reference
+    clock[0] += 0.1
+    assert not gate.should_process(_frame(square=(60, 40)))
+
+
+def test_a_static_scene_is_refreshed_after_the_interval(clock):
+    gate = MotionGate(sensitivity=0.01, refresh_interval=5.0)
+    gate.should_process(_frame())
+
+    clock[0] += 4.9
+    assert not gate.should_process(_frame())
+    # Forced refresh, measured from the last processed frame, not the last skipped one
+    clock[0] += 0.1
+    assert gate.should_process(_frame())
+    clock[0] += 1.0
+    assert not gate.should_process(_frame())
+
+
+def test_small_noise_does_not_count_as_motion(clock):
+    gate = MotionGate(sensitivity=0.01, refresh_interval=5.0, pixel_threshold=25)
+    gate.should_process(_frame(100))
+
+    clock[0] += 0.1
+    assert not gate.should_process(_frame(110))
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+pytest.importorskip("onnxruntime")
+
+from backend.inference.onnx_detector import OnnxYoloDetector, letterbox, nms, LETTERBOX_COLOR
+
+
+class FakeSession:
+    """Returns the same YOLOv8 output (4 + classes, anchors) for every image it is run on"""
+
+    def __init__(self, pred):
+        self.pred = np.asarray(pred, dtype=np.float32)
+        self.blob_shapes = []
+
+    def run(self, outputs, feeds):
+        blob = next(iter(feeds.values()))
+        self.blob_shapes.append(blob.shape)
+        return [np.stack([self.pred] * len(blob))]
+
+
+def _detector(pred, dynamic_batch=True, input_size=64):
+    detector = OnnxYoloDetector.__new__(OnnxYoloDetector)
+    detector.session = FakeSession(pred)
+    detector.input_name = "images"
+    detector.input_size = input_size
+    detector.dynamic_batch = dynamic_batch
+    return detector
+
+
+def _pred(*anchors):
+    """Columns of (cx, cy, w, h, class scores...) in letterboxed pixels"""
+    return np.array(anchors, dtype=np.float32).T
+
+
+def test_letterbox_keeps_aspect_ratio_and_pads_evenly():
+    image = np.zeros((100, 200, 3), dtype=np.uint8)
+    image[..., 0] = 255  # pure blue in BGR
+
+    blob, ratio, pad = letterbox(image, 64)
+
+    assert blob.shape == (3, 64, 64) and blob.dtype == np.float32
+    assert ratio == pytest.approx(0.32) and pad == (0, 16)
+    # Padding rows are the letterbox grey, the resized image is blue in RGB channel order
+    np.testing.assert_allclose(blob[:, :16], LETTERBOX_COLOR[0] / 255.0, atol=1e-6)
+    np.testing.assert_allclose(blob[:, 48:], LETTERBOX_COLOR[0] / 255.0, atol=1e-6)
+    np.testing.assert_allclose(blob[:, 16:48], np.array([0.0, 0.0, 1.0])[:, None, None] * np.ones((1, 32, 64)))
+
+
+def test_boxes_are_mapped_back_to_original_coordinates():
+    # (50, 25)-(150, 75) in a 200x100 image is (16, 24)-(48, 40) after a 0.32 scale and 16px top pad
+    detector = _detector(_pred([32, 32, 32, 16, 0.9]))
+
+    faces = detector.detect(np.zeros((100, 200, 3), dtype=np.uint8))
+
+    assert faces == [{'bbox': [50, 25, 150, 75], 'confidence': pytest.approx(0.9)}]
+
+
+def test_boxes_are_clipped_to_the_image():
+    detector = _detector(_pred([4, 20, 16, 8, 0.9]))
+
+    (face,) = detector.detect(np.zeros((100, 200, 3), dtype=np.uint8))
+
+    assert face['bbox'][0] == 0 and face['bbox'][2] == 37
+
+
+def test_postprocess_filters_by_confidence_and_suppresses_overlaps():
+    detector = _detector(_pred(
+        [32, 32, 20, 20, 0.9, 0.0],   # kept
+        [33, 32, 20, 20, 0.8, 0.0],   # same class, overlaps the first: suppressed
+        [32, 32, 20, 20, 0.0, 0.7],   # other class at the same place: kept
+        [10, 10, 8, 8, 0.3, 0.0],     # below conf
+    ))
+
+    faces = detector.detect(np.zeros((64, 64, 3), dtype=np.uint8), conf=0.5)
+
+    assert [face['confidence'] for face in faces] == pytest.approx([0.9, 0.7])
+
+
+@pytest.mark.parametrize("dynamic_batch, runs", [(True, [(2, 3, 64, 64)]), (False, [(1, 3, 64, 64)] * 2)])
+def test_detect_batch_maps_each_image_with_its_own_letterbox(dynamic_batch, runs):
+    detector = _detector(_pred([32, 32, 32, 32, 0.9]), dynamic_batch=dynamic_batch)
+
+    wide, tall = detector.detect_batch([np.zeros((100, 200, 3), np.uint8), np.zeros((200, 100, 3), np.uint8)])
+
+    assert detector.session.blob_shapes == runs
+    assert wide[0]['bbox'] == [50, 0, 150, 100]
+    assert tall[0]['bbox'] == [0, 50, 100, 150]
+
+
+def test_nms_keeps_the_best_of_overlapping_boxes():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [20, 20, 30, 30]], dtype=np.float32)
+    scores = np.array([0.6, 0.9, 0.5], dtype=np.float32)
+
+    assert nms(boxes, scores, 0.5).tolist() == [1, 2]
+    # With a threshold above their overlap (~0.68) both are kept
+    assert nms(boxes, scores, 0.7).tolist() == [1, 0, 2]
@@ -0,0 +1,86 @@
+import queue
+import threading
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+pytest.importorskip("insightface")
+
+from backend.attendance.pipeline import StreamingAttendancePipeline, put_latest
+from backend.attendance.tracker import FaceTracker
+
+
+class FakeSource:
+    """Hands out frames 1..N as fast as they are read, then idles without ending the stream"""
+
+    def __init__(self, count):
+        self.frames = [np.full((32, 32, 3), i, dtype=np.uint8) for i in range(1, count + 1)]
+        self.running = True
+        self.exhausted = threading.Event()
+
+    def read(self, after_seq, timeout=0.5):
+        if after_seq < len(self.frames):
+            return after_seq + 1, self.frames[after_seq]
+        self.exhausted.set()
+        time.sleep(0.01)
+        return after_seq, None
+
+
+def test_put_latest_drops_the_oldest_entries():
+    q = queue.Queue(maxsize=2)
+    for item in range(5):
+        put_latest(q, item)
+
+    assert [q.get_nowait(), q.get_nowait()] == [3, 4]
+
+
+def test_recognition_skips_detections_that_went_stale():
+    source = FakeSource(6)
+    first_matching = threading.Event()
+
+    def detect(frame):
+        frame_id = int(frame[0, 0, 0])
+        if frame_id == 2:
+            # Frame 1 is being recognized from here on
+            assert first_matching.wait(5)
+        return [{'bbox': [0, 0, 16, 16], 'confidence': 0.9, 'frame': frame_id}]
+
+    def embed(frame, bboxes, landmarks):
+        return [np.array([frame[0, 0, 0]], dtype=np.float32) for _ in bboxes]
+
+    matched = []
+
+    def match(embedding):
+        frame_id = int(embedding[0])
+        matched.append(frame_id)
+        if frame_id == 1:
+            first_matching.set()
+            # Recognition is slow: detection runs through every other frame meanwhile
+            assert source.exhausted.wait(5)
+            return False, None, 0.0
+        return True, "alice", 0.9
+
+    pipeline = StreamingAttendancePipeline(
+        source, None, None, match, queue_size=1, detect_func=detect, embed_func=embed,
+        tracker=FaceTracker(min_improvement=-1.0, max_embeds=100)
+    )
+
+    assert pipeline.run(timeout=5) == ("alice", 0.9)
+    # Frames 2-5 were replaced in the queue before recognition got to them
+    assert matched == [1, 6]
+    assert pipeline.frames_detected == 6 and pipeline.frames_recognized == 2
+
+
+def test_detection_errors_are_raised_from_run():
+    def detect(frame):
+        raise RuntimeError("detector crashed")
+
+    pipeline = StreamingAttendancePipeline(
+        FakeSource(3), None, None, lambda embedding: (False, None, 0.0),
+        detect_func=detect, embed_func=lambda *args: []
+    )
+
+    with pytest.raises(RuntimeError, match="detector crashed"):
+        pipeline.run(timeout=5)
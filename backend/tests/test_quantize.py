@@ -0,0 +1,87 @@
+import glob
+import os
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("insightface")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("requests")
+
+from backend.inference import model_loader
+from backend.inference import quantize
+
+
+@pytest.fixture
+def models_root(monkeypatch, tmp_path):
+    """A models dir with a YOLO export and a buffalo_l pack; quantize_dynamic just records its input"""
+    monkeypatch.setattr(model_loader, "INSIGHTFACE_ROOT", str(tmp_path))
+    monkeypatch.setattr(quantize, "QUANTIZED_DIR", str(tmp_path / "quantized"))
+    pack = tmp_path / "models" / "buffalo_l"
+    pack.mkdir(parents=True)
+    (pack / "w600k_r50.onnx").write_bytes(b"fp32")
+    (tmp_path / "yolov8s.onnx").write_bytes(b"fp32")
+    monkeypatch.setattr(model_loader, "recognition_model_path", lambda name="buffalo_l": str(tmp_path / "models" / name / "w600k_r50.onnx"))
+
+    inputs = []
+
+    def fake_quantize_dynamic(src, dst, weight_type=None):
+        assert ".int8-" not in os.path.basename(src)
+        inputs.append(src)
+        with open(dst, "wb") as f:
+            f.write(b"int8")
+
+    monkeypatch.setattr(quantize, "quantize_dynamic", fake_quantize_dynamic)
+    return SimpleNamespace(root=tmp_path, pack=pack, inputs=inputs)
+
+
+def test_quantized_variants_are_written_outside_the_pack(models_root):
+    rec = quantize.ensure_quantized(str(models_root.pack / "w600k_r50.onnx"), "int8-dynamic", "recognition")
+    det = quantize.ensure_quantized(str(models_root.root / "yolov8s.onnx"), "int8-dynamic", "detector")
+
+    assert rec == str(models_root.root / "quantized" / "buffalo_l" / "w600k_r50.int8-dynamic.onnx")
+    assert det == str(models_root.root / "quantized" / "yolov8s.int8-dynamic.onnx")
+    # FaceAnalysis loads sorted(glob('*.onnx')) of the pack and keeps the first recognizer
+    assert sorted(glob.glob(str(models_root.pack / "*.onnx"))) == [str(models_root.pack / "w600k_r50.onnx")]
+
+
+def test_ensure_quantized_is_idempotent(models_root):
+    fp32 = str(models_root.pack / "w600k_r50.onnx")
+    first = quantize.ensure_quantized(fp32, "int8-dynamic", "recognition")
+    assert quantize.ensure_quantized(fp32, "int8-dynamic", "recognition") == first
+    assert models_root.inputs == [fp32]
+
+
+def test_ensure_quantized_rejects_quantized_input(models_root):
+    out = quantize.ensure_quantized(str(models_root.pack / "w600k_r50.onnx"), "int8-dynamic", "recognition")
+    with pytest.raises(ValueError):
+        quantize.ensure_quantized(out, "int8-dynamic", "recognition")
+
+
+def test_quantized_recognition_always_starts_from_fp32(models_root, monkeypatch):
+    loaded = []
+
+    def fake_get_model(path, providers=None):
+        loaded.append(path)
+        return SimpleNamespace(model_file=path, input_mean=0.0, input_std=1.0, prepare=lambda ctx_id: None)
+
+    monkeypatch.setattr(model_loader.insightface.model_zoo, "get_model", fake_get_model)
+    fp32 = str(models_root.pack / "w600k_r50.onnx")
+    app = SimpleNamespace(models={'recognition': SimpleNamespace(model_file=fp32, input_mean=127.5, input_std=127.5)})
+
+    model_loader._load_quantized_recognition(None, app, "int8-dynamic", None)
+    # The FP32 normalization is kept on the quantized model
+    assert (app.models['recognition'].input_mean, app.models['recognition'].input_std) == (127.5, 127.5)
+    # Loading again on an app that already holds the INT8 model must not quantize that model
+    model_loader._load_quantized_recognition(None, app, "int8-dynamic", None)
+
+    assert models_root.inputs == [fp32]
+    assert app.models['recognition'].model_file == quantize.quantized_model_path(fp32, "int8-dynamic")
+    assert loaded == [app.models['recognition'].model_file] * 2
+
+
+def test_stale_quantized_models_are_removed_from_the_pack(models_root):
+    for name in ("w600k_r50.int8-dynamic.onnx", "w600k_r50.int8-dynamic.int8-dynamic.onnx"):
+        (models_root.pack / name).write_bytes(b"int8")
+    model_loader._remove_stale_quantized_models(str(models_root.pack))
+    assert sorted(os.listdir(models_root.pack)) == ["w600k_r50.onnx"]
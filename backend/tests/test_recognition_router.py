@@ -0,0 +1,131 @@
+import base64
+import io
+import zipfile
+
+import pytest
+
+# The routers import the model stack at module level
+pytest.importorskip("insightface")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("requests")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.recognition import bulk_enroll
+from backend.recognition import router as recognition_router
+
+
+@pytest.fixture
+def enrolled(monkeypatch):
+    """Captures the items the bulk endpoints hand to add_faculty_bulk"""
+    captured = []
+
+    def fake_add_faculty_bulk(yolo, app, items):
+        captured.extend(items)
+        return {'added': len(items), 'failed': 0, 'items': []}
+
+    monkeypatch.setattr(recognition_router, "ensure_models_loaded", lambda *args: None)
+    monkeypatch.setattr(bulk_enroll, "add_faculty_bulk", fake_add_faculty_bulk)
+    return captured
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(recognition_router.router, prefix="/recognition")
+    return TestClient(app)
+
+
+def test_bulk_add_image_files_with_names(client, enrolled):
+    response = client.post(
+        "/recognition/faculty/bulk-add",
+        files=[("files", ("a.jpg", b"aa", "image/jpeg")), ("files", ("b.jpg", b"bb", "image/jpeg"))],
+        data={"names": ["Alice", "Bob"]}
+    )
+    assert response.status_code == 200, response.text
+    assert [(item['name'], item['data']) for item in enrolled] == [("Alice", b"aa"), ("Bob", b"bb")]
+
+
+def test_bulk_add_zip(client, enrolled):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("Jane Doe/1.jpg", b"j1")
+        zf.writestr("John Roe.png", b"r1")
+    response = client.post(
+        "/recognition/faculty/bulk-add",
+        files=[("files", ("faculty.zip", archive.getvalue(), "application/zip"))]
+    )
+    assert response.status_code == 200, response.text
+    assert sorted(item['name'] for item in enrolled) == ["Jane Doe", "John Roe"]
+
+
+def test_bulk_add_rejects_name_count_mismatch(client, enrolled):
+    response = client.post(
+        "/recognition/faculty/bulk-add",
+        files=[("files", ("a.jpg", b"aa", "image/jpeg")), ("files", ("b.jpg", b"bb", "image/jpeg"))],
+        data={"names": ["Alice"]}
+    )
+    assert response.status_code == 400
+    assert not enrolled
+
+
+def test_bulk_add_directory_disabled_without_import_root(client, enrolled, monkeypatch, tmp_path):
+    monkeypatch.delenv(bulk_enroll.BULK_IMPORT_ROOT_ENV, raising=False)
+    response = client.post("/recognition/faculty/bulk-add-directory", json={"directory": str(tmp_path)})
+    assert response.status_code == 403
+
+
+def test_bulk_add_directory_stays_inside_import_root(client, enrolled, monkeypatch, tmp_path):
+    root = tmp_path / "imports"
+    (root / "Alice").mkdir(parents=True)
+    (root / "Alice" / "1.jpg").write_bytes(b"aa")
+    (tmp_path / "secret.jpg").write_bytes(b"ss")
+    monkeypatch.setenv(bulk_enroll.BULK_IMPORT_ROOT_ENV, str(root))
+
+    response = client.post("/recognition/faculty/bulk-add-directory", json={"directory": ".."})
+    assert response.status_code == 403
+
+    response = client.post("/recognition/faculty/bulk-add-directory", json={"directory": "."})
+    assert response.status_code == 200, response.text
+    assert [item['name'] for item in enrolled] == ["Alice"]
+
+
+@pytest.fixture
+def enrolled_single(monkeypatch):
+    """Captures the (image bytes, name) pairs /faculty/add hands to the inference pool"""
+    captured = []
+
+    async def fake_run_inference(fn, image_bytes, name, filename, **kwargs):
+        captured.append((image_bytes, name))
+        return True, f"Added {name}"
+
+    monkeypatch.setattr(recognition_router, "ensure_models_loaded", lambda *args: None)
+    monkeypatch.setattr(recognition_router, "run_inference", fake_run_inference)
+    monkeypatch.setattr(recognition_router, "persist_enrollment_image", lambda *args: None)
+    return captured
+
+
+def test_add_faculty_multipart(client, enrolled_single):
+    response = client.post(
+        "/recognition/faculty/add",
+        files={"file": ("a.jpg", b"aa", "image/jpeg")},
+        data={"name": "Alice"}
+    )
+    assert response.status_code == 200, response.text
+    assert enrolled_single == [(b"aa", "Alice")]
+
+
+def test_add_faculty_json(client, enrolled_single):
+    response = client.post(
+        "/recognition/faculty/add",
+        json={"image_base64": base64.b64encode(b"bb").decode(), "name": "Bob"}
+    )
+    assert response.status_code == 200, response.text
+    assert enrolled_single == [(b"bb", "Bob")]
+
+
+def test_add_faculty_requires_name(client, enrolled_single):
+    response = client.post("/recognition/faculty/add", files={"file": ("a.jpg", b"aa", "image/jpeg")})
+    assert response.status_code == 400
+    assert not enrolled_single
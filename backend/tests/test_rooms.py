@@ -0,0 +1,27 @@
+import pytest
+
+# The scheduler imports the model stack at module level
+pytest.importorskip("insightface")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("requests")
+
+from backend.attendance import rooms
+
+
+def test_status_of_unstarted_room_does_not_create_state():
+    scheduler = rooms.RoomScheduler(1)
+
+    status = scheduler.status("lab-2")
+
+    assert status["room_id"] == "lab-2"
+    assert status["running"] is False
+    assert scheduler.status() == []
+
+
+def test_remove_room_forgets_state():
+    scheduler = rooms.RoomScheduler(1)
+    scheduler._state("lab-2").running = True
+
+    scheduler.remove_room("lab-2")
+
+    assert scheduler.status() == []
@@ -0,0 +1,83 @@
+import pytest
+
+from backend.attendance.tracker import FaceTracker, face_score
+
+
+def _face(x, y, size=40, quality=0.5):
+    return {'bbox': [x, y, x + size, y + size], 'quality': quality}
+
+
+def test_new_faces_get_tracks_and_are_embedded_once():
+    tracker = FaceTracker()
+
+    first = tracker.update([_face(0, 0), _face(200, 0)], now=0.0)
+    for track, face, _ in first:
+        track.record(face['quality'], False, None, 0.0)
+    second = tracker.update([_face(202, 1), _face(1, 2)], now=0.1)
+
+    assert [needs for _, _, needs in first] == [True, True]
+    # One-to-one by overlap, whatever order the detector lists the faces in
+    assert [track.id for track, _, _ in second] == [first[1][0].id, first[0][0].id]
+    assert [needs for _, _, needs in second] == [False, False]
+
+
+def test_only_a_clearly_better_crop_is_re_embedded():
+    tracker = FaceTracker(min_improvement=0.05, max_embeds=2)
+    (track, face, needs), = tracker.update([_face(0, 0, quality=0.5)], now=0.0)
+    track.record(0.5, False, None, 0.0)
+
+    assert not tracker.update([_face(0, 0, quality=0.52)], now=0.1)[0][2]
+    assert tracker.update([_face(0, 0, quality=0.6)], now=0.2)[0][2]
+    track.record(0.6, False, None, 0.0)
+    # max_embeds reached: even a much better crop is not embedded again
+    assert not tracker.update([_face(0, 0, quality=0.9)], now=0.3)[0][2]
+
+
+def test_identified_tracks_are_not_embedded_again():
+    tracker = FaceTracker()
+    (track, _, _), = tracker.update([_face(0, 0, quality=0.3)], now=0.0)
+    track.record(0.3, True, "alice", 0.8)
+
+    (same, _, needs), = tracker.update([_face(0, 0, quality=0.9)], now=0.1)
+    assert same is track and same.identity == ("alice", 0.8) and not needs
+
+
+def test_fast_moves_fall_back_to_centroid_distance():
+    tracker = FaceTracker(centroid_ratio=0.5)
+    (track, _, _), = tracker.update([_face(0, 0)], now=0.0)
+
+    # No overlap with the old box, but the centroid moved less than half a box width
+    (moved, _, _), = tracker.update([_face(18, 0, size=20)], now=0.1)
+    (other, _, _), = tracker.update([_face(200, 200)], now=0.2)
+
+    assert moved is track
+    assert other is not track
+
+
+def test_tracks_expire_after_max_age():
+    tracker = FaceTracker(max_age=2.0)
+    (track, _, _), = tracker.update([_face(0, 0)], now=0.0)
+    track.record(0.5, False, None, 0.0)
+
+    assert tracker.update([_face(0, 0)], now=1.9)[0][0] is track
+    (fresh, _, needs), = tracker.update([_face(0, 0)], now=4.0)
+    assert fresh is not track and fresh.id > track.id and needs
+    assert tracker.tracks == [fresh]
+
+
+def test_empty_frames_keep_tracks_until_they_expire():
+    tracker = FaceTracker(max_age=1.0)
+    tracker.update([_face(0, 0)], now=0.0)
+
+    assert tracker.update([], now=0.5) == []
+    assert len(tracker.tracks) == 1
+    tracker.update([], now=1.5)
+    assert tracker.tracks == []
+
+
+@pytest.mark.parametrize("quality, confidence, expected", [(0.4, 0.9, 0.4), (None, 0.9, 0.9)])
+def test_score_prefers_quality_over_confidence(quality, confidence, expected):
+    face = {'bbox': [0, 0, 1, 1], 'confidence': confidence}
+    if quality is not None:
+        face['quality'] = quality
+    assert face_score(face) == expected